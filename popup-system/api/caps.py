@@ -0,0 +1,255 @@
+"""
+Daily cap enforcement for Mode Popup Management System
+Per-(property, campaign) impression/click counters for the current EST day, held in memory:
+seeded from SQLite at startup, advanced by tailing the event tables past the last id seen
+(inside each ingestion flush, and from a background task when other workers write too), and
+reset at EST midnight. Feeds drop capped campaigns with a set lookup per row - the read path never
+touches SQLite.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+import catalog
+from database import db_connection, sqlite_utc_epoch, _get_est_day_bounds_sqlite_str
+from http_cache import encode_json, strong_etag
+from worker_locks import WEB_CONCURRENCY
+
+IMPRESSIONS, CLICKS = 0, 1
+EVENT_TABLES = (("impressions", IMPRESSIONS), ("clicks", CLICKS))
+
+# With several workers, events written by the others are picked up at most this often
+CAP_SYNC_INTERVAL = float(os.getenv("CAP_SYNC_INTERVAL", "2" if WEB_CONCURRENCY > 1 else "0"))
+
+
+class CapEnforcer:
+    """In-memory daily counters plus the per-property set of capped campaign ids"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[Tuple[str, int], List[int]] = {}
+        self._capped: Dict[str, FrozenSet[int]] = {}
+        self._caps: Dict[Tuple[str, int], Tuple[Optional[int], Optional[int]]] = {}
+        self._caps_version: Optional[int] = None
+        self._assigned: FrozenSet[Tuple[str, int]] = frozenset()  # (property, campaign) assignment rows
+        self._day_start: Optional[str] = None
+        self._rollover_at = 0.0
+        self._payloads: Dict[str, tuple] = {}
+        self._last_ids = {table: 0 for table, _ in EVENT_TABLES}
+        self._tail_lock = threading.Lock()  # one tailer at a time, so no id range is counted twice
+        self._sync_task: Optional[asyncio.Task] = None
+        # Bumped whenever any capped set changes; cached filtered feeds key on it
+        self.generation = 0
+        self.stats = {"seeded_events": 0, "counted_events": 0, "rollovers": 0, "caps_hit": 0}
+
+    # -- day and catalog bookkeeping -----------------------------------------
+
+    def _start_day(self):
+        """Caller holds the lock. Reset counters for the EST day containing now."""
+        start, end = _get_est_day_bounds_sqlite_str()
+        self._day_start = start
+        self._rollover_at = sqlite_utc_epoch(end) + 1
+        self._counts = {}
+        self._capped = {}
+        self.generation += 1
+
+    def _roll_if_needed(self):
+        if time.time() < self._rollover_at:
+            return
+        with self._lock:
+            if time.time() >= self._rollover_at:
+                rolled = self._day_start is not None
+                self._start_day()
+                if rolled:
+                    self.stats["rollovers"] += 1
+                    print(f"🌙 Daily caps rolled over (EST day from {self._day_start} UTC)")
+
+    def _sync_caps(self, snapshot: catalog.CatalogSnapshot):
+        """Pick up cap edits from a new catalog version and recompute the capped sets"""
+        if self._caps_version == snapshot.version:
+            return
+        with self._lock:
+            if self._caps_version == snapshot.version:
+                return
+            self._caps = dict(snapshot.caps)
+            self._assigned = frozenset(
+                (code, int(row["id"])) for code, rows in snapshot.assignments.items() for row in rows
+            )
+            self._caps_version = snapshot.version
+            capped: Dict[str, set] = {}
+            for key in self._caps:
+                if self._over_cap(key):
+                    capped.setdefault(key[0], set()).add(key[1])
+            frozen = {code: frozenset(ids) for code, ids in capped.items()}
+            if frozen != self._capped:
+                self._capped = frozen
+                self.generation += 1
+
+    def _over_cap(self, key: Tuple[str, int]) -> bool:
+        caps = self._caps.get(key)
+        counts = self._counts.get(key)
+        if caps is None:
+            return False
+        impressions, clicks = counts if counts is not None else (0, 0)
+        impression_cap, click_cap = caps
+        return (impression_cap is not None and impressions >= impression_cap) or \
+               (click_cap is not None and clicks >= click_cap)
+
+    # -- counting ------------------------------------------------------------
+
+    def seed(self) -> int:
+        """Load today's (EST) counts from the event tables - run once at startup"""
+        snapshot = catalog.get_snapshot()
+        with self._lock:
+            self._start_day()
+        start, end = _get_est_day_bounds_sqlite_str()
+        total = 0
+        with db_connection() as conn:
+            for table, index in EVENT_TABLES:
+                last_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+                rows = conn.execute(f"""
+                    SELECT property_code, campaign_id, COUNT(*)
+                    FROM {table}
+                    WHERE ts_epoch BETWEEN ? AND ? AND id <= ?
+                    GROUP BY property_code, campaign_id
+                """, (sqlite_utc_epoch(start), sqlite_utc_epoch(end), last_id)).fetchall()
+                with self._lock:
+                    self._last_ids[table] = last_id
+                    for code, campaign_id, count in rows:
+                        try:
+                            key = (code, int(campaign_id))
+                        except (TypeError, ValueError):
+                            continue
+                        self._counts.setdefault(key, [0, 0])[index] += count
+                        total += count
+        self.stats["seeded_events"] = total
+        self._caps_version = None  # force a recompute against the seeded counts
+        self._sync_caps(snapshot)
+        return total
+
+    def _count(self, kind_index: int, code, campaign_id, n: int):
+        """Caller holds the lock"""
+        try:
+            key = (code, int(campaign_id))
+        except (TypeError, ValueError):
+            return
+        # Only real assignments are counted, so junk tracking payloads can't grow the table
+        if key not in self._assigned:
+            return
+        counts = self._counts.setdefault(key, [0, 0])
+        counts[kind_index] += n
+        self.stats["counted_events"] += n
+        if key in self._caps and key[1] not in self._capped.get(code, ()) and self._over_cap(key):
+            self._capped = {**self._capped, code: self._capped.get(code, frozenset()) | {key[1]}}
+            self.generation += 1
+            self.stats["caps_hit"] += 1
+            print(f"🧢 Daily cap reached: campaign {key[1]} on {code}")
+
+    def _tail(self, conn):
+        """Count events past the last id seen - this process's batch and any other worker's"""
+        self._roll_if_needed()
+        snapshot = catalog.get_snapshot()
+        self._sync_caps(snapshot)
+        with self._tail_lock:
+            for table, index in EVENT_TABLES:
+                rows = conn.execute(f"""
+                    SELECT property_code, campaign_id, COUNT(*), MAX(id)
+                    FROM {table} WHERE id > ?
+                    GROUP BY property_code, campaign_id
+                """, (self._last_ids[table],)).fetchall()
+                if not rows:
+                    continue
+                with self._lock:
+                    for code, campaign_id, count, max_id in rows:
+                        self._count(index, code, campaign_id, count)
+                        self._last_ids[table] = max(self._last_ids[table], max_id)
+
+    def batch_hook(self, conn, rows_by_kind):
+        """Ingestion hook: runs on the writer thread inside the flush transaction.
+        A flush that rolls back reuses its ids on retry, so those events are counted once."""
+        self._tail(conn)
+
+    def _sync_other_workers(self):
+        """Runs on a thread: count events the other workers have written since the last tail"""
+        with db_connection() as conn:
+            self._tail(conn)
+
+    # -- background sync -------------------------------------------------------
+
+    @property
+    def running(self) -> bool:
+        return self._sync_task is not None and not self._sync_task.done()
+
+    async def start(self):
+        if self.running or CAP_SYNC_INTERVAL <= 0:
+            return
+        self._sync_task = asyncio.create_task(self._sync_loop(), name="cap-sync")
+
+    async def stop(self):
+        if self._sync_task is None:
+            return
+        self._sync_task.cancel()
+        await asyncio.gather(self._sync_task, return_exceptions=True)
+        self._sync_task = None
+
+    async def _sync_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(CAP_SYNC_INTERVAL)
+            try:
+                await loop.run_in_executor(None, self._sync_other_workers)
+            except Exception as e:
+                print(f"⚠️ Daily cap sync failed: {e}")
+
+    # -- read path -------------------------------------------------------------
+
+    def capped_ids(self, property_code: str, snapshot: Optional[catalog.CatalogSnapshot] = None) -> FrozenSet[int]:
+        """In-memory only: rollover and cap edits are applied here, counts arrive via _tail"""
+        self._roll_if_needed()
+        self._sync_caps(snapshot or catalog.get_snapshot())
+        return self._capped.get(property_code, frozenset())
+
+    def is_capped(self, campaign_id: int, property_code: str) -> bool:
+        return campaign_id in self.capped_ids(property_code)
+
+    def feed_payload(self, snapshot: catalog.CatalogSnapshot, property_code: str) -> Tuple[bytes, str]:
+        """The property's pre-encoded feed, minus capped campaigns (re-encoded only when caps change)"""
+        capped = self.capped_ids(property_code, snapshot)
+        if not capped:
+            return snapshot.feed_payload(property_code)
+        generation = self.generation
+        cached = self._payloads.get(property_code)
+        if cached and cached[0] == snapshot.version and cached[1] == generation:
+            return cached[2], cached[3]
+        body = encode_json([dict(row) for row in snapshot.feed(property_code) if row["id"] not in capped])
+        etag = strong_etag(body)
+        self._payloads[property_code] = (snapshot.version, generation, body, etag)
+        return body, etag
+
+    def status(self) -> dict:
+        with self._lock:
+            counters = [
+                {"property_code": code, "campaign_id": campaign_id, "impressions": c[IMPRESSIONS],
+                 "clicks": c[CLICKS], "caps": self._caps.get((code, campaign_id))}
+                for (code, campaign_id), c in sorted(self._counts.items())
+                if (code, campaign_id) in self._caps
+            ]
+            return {
+                "est_day_start_utc": self._day_start,
+                "rollover_at": datetime.fromtimestamp(self._rollover_at, timezone.utc).isoformat() if self._rollover_at else None,
+                "capped": {code: sorted(ids) for code, ids in self._capped.items() if ids},
+                "capped_assignments": counters,
+                "generation": self.generation,
+                "last_ids": dict(self._last_ids),
+                "sync_interval": CAP_SYNC_INTERVAL,
+                "sync_running": self.running,
+                **self.stats,
+            }
+
+
+# Shared instance: seeded, hooked into ingestion and its sync task started by main.py
+cap_enforcer = CapEnforcer()
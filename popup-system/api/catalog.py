@@ -0,0 +1,230 @@
+"""
+In-memory campaign catalog for Mode Popup Management System
+Immutable per-property snapshot of campaigns + campaign_properties served to the popup endpoints.
+Rebuilt only when an admin write commits (catalog version bump), so popup reads never hit SQLite.
+The version is the mtime (ns) of a signal file next to the database: every worker process sees the
+same value, so caches keyed on it agree across workers and restarts.
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from types import MappingProxyType
+from typing import Mapping, Optional, Tuple
+
+from database import DB_PATH, db_connection
+from http_cache import encode_json, strong_etag
+
+# Columns served by /api/campaigns/by-host and /api/campaigns/{property_code}
+FEED_COLUMNS = (
+    "id", "name", "tune_url", "logo_url", "main_image_url", "description",
+    "cta_text", "offer_id", "aff_id", "campaign_active", "visibility_percentage", "property_active",
+)
+
+# Columns served by /api/properties/{code}/campaigns (includes inactive assignments)
+PROPERTY_CAMPAIGN_COLUMNS = (
+    "id", "name", "tune_url", "logo_url", "main_image_url", "description",
+    "campaign_active", "visibility_percentage", "property_active",
+)
+
+
+@dataclass(frozen=True)
+class CatalogSnapshot:
+    """Read-only view of the campaign catalog at a given version"""
+    version: int  # signal file mtime_ns, shared by all workers (0 before the first admin write)
+    built_at: str
+    campaigns: Mapping[int, Mapping] = field(default_factory=dict)
+    properties: Mapping[str, Mapping] = field(default_factory=dict)
+    assignments: Mapping[str, Tuple[Mapping, ...]] = field(default_factory=dict)
+    feeds: Mapping[str, Tuple[Mapping, ...]] = field(default_factory=dict)
+    feed_payloads: Mapping[str, Tuple[bytes, str]] = field(default_factory=dict)
+    # (property_code, campaign_id) -> (impression_cap_daily, click_cap_daily); only capped assignments
+    caps: Mapping[Tuple[str, int], Tuple[Optional[int], Optional[int]]] = field(default_factory=dict)
+
+    def feed(self, property_code: str) -> Tuple[Mapping, ...]:
+        """Active campaigns (campaign + property assignment active), newest first"""
+        return self.feeds.get(property_code, ())
+
+    def feed_payload(self, property_code: str) -> Tuple[bytes, str]:
+        """Pre-encoded JSON body and strong ETag for the property's feed"""
+        payload = self.feed_payloads.get(property_code)
+        if payload is None:
+            payload = (EMPTY_FEED, EMPTY_FEED_ETAG)
+        return payload
+
+    def property_campaigns(self, property_code: str) -> Tuple[Mapping, ...]:
+        """Every campaign assigned to the property, active or not, newest first"""
+        return self.assignments.get(property_code, ())
+
+    def featured_campaign_id(self, property_code: str) -> Optional[int]:
+        prop = self.properties.get(property_code)
+        return prop.get("featured_campaign_id") if prop else None
+
+    def campaign(self, campaign_id) -> Optional[Mapping]:
+        try:
+            return self.campaigns.get(int(campaign_id))
+        except (TypeError, ValueError):
+            return None
+
+
+EMPTY_FEED = encode_json([])
+EMPTY_FEED_ETAG = strong_etag(EMPTY_FEED)
+
+# Touched by invalidate(); its mtime is the catalog version, every worker rebuilds when it moves
+CATALOG_SIGNAL_PATH = os.getenv("CATALOG_SIGNAL_PATH") or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), ".catalog-version"
+)
+# How stale another worker's admin write may look here (one stat() per interval)
+CATALOG_SIGNAL_CHECK_MS = int(os.getenv("CATALOG_SIGNAL_CHECK_MS", "500"))
+
+_lock = threading.Lock()
+_version: Optional[int] = None  # last signal mtime seen; None until the first check
+_snapshot: Optional[CatalogSnapshot] = None
+_signal_next_check = 0.0
+
+
+def _freeze(row: dict, columns=None) -> Mapping:
+    if columns is not None:
+        row = {col: row.get(col) for col in columns}
+    return MappingProxyType(row)
+
+
+def _load(version: int) -> CatalogSnapshot:
+    """Read campaigns, properties and assignments in one pass"""
+    with db_connection() as conn:
+        campaigns = {
+            int(row["id"]): _freeze(dict(row))
+            for row in conn.execute("SELECT * FROM campaigns").fetchall()
+        }
+        properties = {
+            row["code"]: _freeze(dict(row))
+            for row in conn.execute("SELECT * FROM properties").fetchall()
+        }
+        cursor = conn.execute("""
+            SELECT
+                c.id,
+                c.name,
+                c.tune_url,
+                c.logo_url,
+                c.main_image_url,
+                c.description,
+                c.cta_text,
+                c.offer_id,
+                c.aff_id,
+                c.active as campaign_active,
+                cp.property_code,
+                cp.visibility_percentage,
+                cp.active as property_active,
+                cp.impression_cap_daily,
+                cp.click_cap_daily
+            FROM campaigns c
+            JOIN campaign_properties cp ON c.id = cp.campaign_id
+            ORDER BY cp.property_code, c.created_at DESC
+        """)
+        assignment_rows = [dict(row) for row in cursor.fetchall()]
+
+    assignments = {}
+    feeds = {}
+    caps = {}
+    for row in assignment_rows:
+        code = row["property_code"]
+        if row["impression_cap_daily"] is not None or row["click_cap_daily"] is not None:
+            caps[(code, int(row["id"]))] = (row["impression_cap_daily"], row["click_cap_daily"])
+        assignments.setdefault(code, []).append(_freeze(row, PROPERTY_CAMPAIGN_COLUMNS))
+        if row["campaign_active"] and row["property_active"]:
+            feeds.setdefault(code, []).append(_freeze(row, FEED_COLUMNS))
+
+    feed_payloads = {}
+    for code, rows in feeds.items():
+        body = encode_json([dict(row) for row in rows])
+        feed_payloads[code] = (body, strong_etag(body))
+
+    return CatalogSnapshot(
+        version=version,
+        built_at=datetime.now().isoformat(),
+        campaigns=MappingProxyType(campaigns),
+        properties=MappingProxyType(properties),
+        assignments=MappingProxyType({code: tuple(rows) for code, rows in assignments.items()}),
+        feeds=MappingProxyType({code: tuple(rows) for code, rows in feeds.items()}),
+        feed_payloads=MappingProxyType(feed_payloads),
+        caps=MappingProxyType(caps),
+    )
+
+
+def rebuild() -> CatalogSnapshot:
+    """Build a fresh snapshot for the current catalog version and publish it"""
+    global _snapshot, _version
+    with _lock:
+        # Read before loading, so a write signalled mid-load still triggers the next rebuild
+        _version = _signal_mtime()
+        snapshot = _load(_version)
+        _snapshot = snapshot
+    return snapshot
+
+
+def _signal_mtime() -> int:
+    try:
+        return os.stat(CATALOG_SIGNAL_PATH).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def _touch_signal() -> int:
+    """Move the signal mtime strictly forward (coarse filesystem clocks could repeat a timestamp)"""
+    with open(CATALOG_SIGNAL_PATH, "a"):
+        pass
+    mtime = max(time.time_ns(), _signal_mtime() + 1)
+    os.utime(CATALOG_SIGNAL_PATH, ns=(mtime, mtime))
+    return _signal_mtime()
+
+
+def _check_signal():
+    """Pick up the shared version when another process has invalidated since the last check"""
+    global _version, _signal_next_check
+    now = time.monotonic()
+    if now < _signal_next_check:
+        return
+    _signal_next_check = now + CATALOG_SIGNAL_CHECK_MS / 1000
+    mtime = _signal_mtime()
+    if mtime != _version:
+        with _lock:
+            _version = mtime
+
+
+def get_snapshot() -> CatalogSnapshot:
+    """Current snapshot (built lazily if startup could not build one)"""
+    _check_signal()
+    snapshot = _snapshot
+    if snapshot is None or snapshot.version != _version:
+        snapshot = rebuild()
+    return snapshot
+
+
+def invalidate(reason: str = "") -> int:
+    """Bump the catalog version after a committed admin write and rebuild the snapshot"""
+    try:
+        with _lock:
+            _touch_signal()
+    except OSError as e:
+        # Same directory as the SQLite WAL files, so this only fails when the database can't be written either
+        print(f"⚠️ Catalog signal not written ({CATALOG_SIGNAL_PATH}): {e}")
+    try:
+        return rebuild().version
+    except Exception as e:
+        # Leave the old snapshot in place; get_snapshot() retries on the next read
+        print(f"⚠️ Catalog rebuild failed after {reason or 'invalidate'}: {e}")
+        return _signal_mtime()
+
+
+def status() -> dict:
+    snapshot = _snapshot
+    return {
+        "version": _version,
+        "signal_path": CATALOG_SIGNAL_PATH,
+        "snapshot_version": snapshot.version if snapshot else None,
+        "built_at": snapshot.built_at if snapshot else None,
+        "campaigns": len(snapshot.campaigns) if snapshot else 0,
+        "feeds": {code: len(rows) for code, rows in snapshot.feeds.items()} if snapshot else {},
+    }
@@ -6,6 +6,7 @@ SQLite database with campaigns and property-specific settings
 import sqlite3
 import os
 from pathlib import Path
+from db_pool import ConnectionPool
 
 # Database file path - use persistent volume in production
 def get_db_path():
@@ -33,368 +34,69 @@ def get_db_path():
 
 DB_PATH = get_db_path()
 
-def get_db_connection():
-    """Get database connection"""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row  # Enable dict-like access
-    return conn
-
-def init_db():
-    """Initialize database with required tables"""
-    conn = get_db_connection()
-    
-    try:
-        # Create campaigns table with dual image support
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS campaigns (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                tune_url TEXT NOT NULL,
-                logo_url TEXT NOT NULL,           -- For top-left circle
-                main_image_url TEXT NOT NULL,     -- For main offer display
-                description TEXT,                 -- Optional campaign description
-                cta_text TEXT DEFAULT 'View Offer', -- Customizable button text
-                active BOOLEAN DEFAULT true,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Add cta_text column if it doesn't exist (for existing databases)
-        try:
-            conn.execute("ALTER TABLE campaigns ADD COLUMN cta_text TEXT DEFAULT 'View Offer'")
-            print("✅ Added cta_text column to existing campaigns table")
-        except Exception as e:
-            # Column already exists or other error - this is okay
-            pass
-            
-        # Add impression pixel fields for Tune tracking
-        try:
-            conn.execute("ALTER TABLE campaigns ADD COLUMN offer_id TEXT")
-            conn.execute("ALTER TABLE campaigns ADD COLUMN aff_id TEXT") 
-            print("✅ Added Tune tracking fields (offer_id, aff_id) to campaigns table")
-        except Exception as e:
-            # Columns already exist or other error - this is okay
-            pass
-            
-        # Add featured priority field (FORCE FIX)
-        try:
-            conn.execute("ALTER TABLE campaigns ADD COLUMN featured BOOLEAN DEFAULT false")
-            print("✅ Added featured priority field to campaigns table")
-        except Exception as e:
-            # Column already exists or other error - this is okay
-            print(f"Featured column check: {e}")
-            
-        # Add updated_at column if missing (fix Railway startup error)
-        # Use NULL default because SQLite doesn't support non-constant defaults in ALTER TABLE
-        try:
-            conn.execute("ALTER TABLE campaigns ADD COLUMN updated_at TIMESTAMP DEFAULT NULL")
-            # Backfill existing rows with current timestamp
-            conn.execute("UPDATE campaigns SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
-            print("✅ Added updated_at column to campaigns table")
-        except Exception as e:
-            # Column already exists or other error - this is okay
-            print(f"Updated_at column check: {e}")
-            pass
-            
-        # Create properties table for multi-domain support
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS properties (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT UNIQUE NOT NULL,       -- 'mff', 'mmm', 'mcad', 'mmd'
-                name TEXT NOT NULL,              -- 'ModeFreeFinds', etc.
-                domain TEXT,                     -- e.g., 'modefreefinds.com'
-                active BOOLEAN DEFAULT true,
-                popup_enabled BOOLEAN DEFAULT true,
-                popup_frequency TEXT DEFAULT 'session',   -- 'session', 'daily', 'always'
-                popup_placement TEXT DEFAULT 'thankyou',  -- 'thankyou', 'exit-intent'
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-        )
+# Shared pool of WAL-mode connections (see db_pool.py)
+db_pool = ConnectionPool(DB_PATH)
 
-        # Seed default properties if table empty
-        cur = conn.execute("SELECT COUNT(1) FROM properties")
-        if int(cur.fetchone()[0]) == 0:
-            default_props = [
-                ("mff", "ModeFreeFinds", "modefreefinds.com"),
-                ("mmm", "ModeMarketMunchies", "modemarketmunchies.com"),
-                ("mcad", "ModeClassActionsDaily", "modeclassactionsdaily.com"),
-                ("mmd", "ModeMobileDaily", "modemobiledaily.com"),
-            ]
-            for code, name, domain in default_props:
-                conn.execute(
-                    "INSERT OR IGNORE INTO properties (code, name, domain, active, popup_enabled) VALUES (?, ?, ?, 1, 1)",
-                    (code, name, domain),
-                )
-
-        # Ensure properties table has required columns
-        # Use NULL default because SQLite doesn't support non-constant defaults in ALTER TABLE
-        try:
-            cursor = conn.execute("PRAGMA table_info(properties)")
-            prop_cols = [row[1] for row in cursor.fetchall()]
-            if 'updated_at' not in prop_cols:
-                conn.execute("ALTER TABLE properties ADD COLUMN updated_at TIMESTAMP DEFAULT NULL")
-                # Backfill existing rows with current timestamp
-                conn.execute("UPDATE properties SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
-                print("✅ Added updated_at column to properties table")
-        except Exception as e:
-            print(f"⚠️ Failed to ensure updated_at on properties: {e}")
-
-        # Add featured_campaign_id column to properties table (for property-specific featured campaigns)
-        try:
-            conn.execute("ALTER TABLE properties ADD COLUMN featured_campaign_id INTEGER")
-            print("✅ Added featured_campaign_id column to properties table")
-        except Exception as e:
-            # Column already exists or other error - this is okay
-            pass
-
-        # Create campaign_properties table for property-specific settings
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS campaign_properties (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                campaign_id INTEGER NOT NULL,
-                property_code TEXT NOT NULL,      -- 'mff', 'mmm', 'mcad', 'mmd'
-                visibility_percentage INTEGER DEFAULT 100,  -- 0-100%
-                active BOOLEAN DEFAULT true,
-                impression_cap_daily INTEGER NULL, -- Daily impression cap (EST)
-                click_cap_daily INTEGER NULL,      -- Daily click cap (EST)
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE,
-                UNIQUE(campaign_id, property_code)  -- One setting per campaign per property
-            )
-        """)
-
-        # Create properties table for multi-domain support
-        conn.execute(
-            """
-            CREATE TABLE IF NOT EXISTS properties (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT UNIQUE NOT NULL,         -- 'mff', 'mmm', 'mcad', 'mmd'
-                name TEXT NOT NULL,
-                domain TEXT NOT NULL,             -- primary domain (used for resolve)
-                active BOOLEAN DEFAULT 1,
-                popup_enabled BOOLEAN DEFAULT 1,
-                popup_frequency TEXT DEFAULT 'session', -- 'session' | 'daily' | 'always'
-                popup_placement TEXT DEFAULT 'thankyou', -- 'thankyou' | 'exit-intent' | 'timed'
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-            """
-        )
+def get_db_connection():
+    """Get a pooled database connection - close() returns it to the pool"""
+    return db_pool.acquire()
 
-        # Seed/update default properties (idempotent upserts by code)
-        default_properties = [
-            ("mff", "ModeFreeFinds", "modefreefinds.com"),
-            ("mmm", "ModeMarketMunchies", "modemarketmunchies.com"),
-            ("mcad", "ModeClassActionsDaily", "modeclassactionsdaily.com"),
-            ("mmd", "ModeMobileDaily", "modemobiledaily.com"),
-        ]
-        for code, name, domain in default_properties:
-            conn.execute(
-                """
-                INSERT INTO properties (code, name, domain, active, popup_enabled)
-                VALUES (?, ?, ?, 1, 1)
-                ON CONFLICT(code) DO UPDATE SET
-                    name = excluded.name,
-                    domain = excluded.domain,
-                    updated_at = CURRENT_TIMESTAMP
-                """,
-                (code, name, domain),
-            )
+def db_connection():
+    """Context manager for a pooled connection: `with db_connection() as conn: ...`"""
+    return db_pool.connection()
 
-        # Ensure cap columns exist for existing databases
-        try:
-            cursor = conn.execute("PRAGMA table_info(campaign_properties)")
-            existing_columns = [row[1] for row in cursor.fetchall()]
-            if 'impression_cap_daily' not in existing_columns:
-                conn.execute("ALTER TABLE campaign_properties ADD COLUMN impression_cap_daily INTEGER")
-                print("✅ Added impression_cap_daily to campaign_properties")
-            if 'click_cap_daily' not in existing_columns:
-                conn.execute("ALTER TABLE campaign_properties ADD COLUMN click_cap_daily INTEGER")
-                print("✅ Added click_cap_daily to campaign_properties")
-        except Exception as e:
-            print(f"⚠️ Failed to add cap columns to campaign_properties: {e}")
-        
-        # Create comprehensive impressions tracking table 
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS impressions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                campaign_id INTEGER NOT NULL,
-                property_code TEXT NOT NULL,
-                session_id TEXT,
-                placement TEXT DEFAULT 'thankyou',
-                user_agent TEXT,
-                ip_hash INTEGER,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Create clicks tracking table
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS clicks (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                campaign_id INTEGER NOT NULL,
-                property_code TEXT NOT NULL,
-                session_id TEXT,
-                placement TEXT DEFAULT 'thankyou',
-                user_agent TEXT,
-                ip_hash INTEGER,
-                revenue_estimate DECIMAL(10,2) DEFAULT 0.45,
-                conversion_tracked BOOLEAN DEFAULT false,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Add source/subsource tracking fields for Phase 2 attribution (AFTER tables exist)
-        cursor = conn.execute("PRAGMA table_info(impressions)")
-        existing_columns = [row[1] for row in cursor.fetchall()]
-        
-        tracking_columns = ['source', 'subsource', 'utm_campaign', 'referrer', 'landing_page']
-        for column in tracking_columns:
-            if column not in existing_columns:
-                try:
-                    conn.execute(f"ALTER TABLE impressions ADD COLUMN {column} TEXT")
-                    print(f"✅ Added {column} to impressions table")
-                except Exception as e:
-                    print(f"⚠️ Failed to add {column} to impressions: {e}")
-        
-        # Do the same for clicks table
-        cursor = conn.execute("PRAGMA table_info(clicks)")
-        existing_columns = [row[1] for row in cursor.fetchall()]
-        
-        for column in tracking_columns:
-            if column not in existing_columns:
-                try:
-                    conn.execute(f"ALTER TABLE clicks ADD COLUMN {column} TEXT")
-                    print(f"✅ Added {column} to clicks table")
-                except Exception as e:
-                    print(f"⚠️ Failed to add {column} to clicks: {e}")
-        
-        print("✅ Phase 2 tracking fields verified/added")
+# Event tables carrying the integer ts_epoch column
+EVENT_TABLES = ("impressions", "clicks", "conversions")
+# Same parsing SQLite applies to the text timestamp (ISO 'T' and offsets included); 0 = unparseable
+EPOCH_FROM_TIMESTAMP_SQL = "COALESCE(CAST(strftime('%s', timestamp) AS INTEGER), 0)"
+EPOCH_BACKFILL_BATCH_SIZE = int(os.getenv("EPOCH_BACKFILL_BATCH_SIZE", "20000"))
 
-        # Add daily cap columns to campaign_properties table if they don't exist
-        cursor = conn.execute("PRAGMA table_info(campaign_properties)")
-        existing_columns = [row[1] for row in cursor.fetchall()]
-        
-        cap_columns = {
-            'impression_cap_daily': 'INTEGER',
-            'click_cap_daily': 'INTEGER'
-        }
-        
-        for column, column_type in cap_columns.items():
-            if column not in existing_columns:
-                try:
-                    conn.execute(f"ALTER TABLE campaign_properties ADD COLUMN {column} {column_type}")
-                    print(f"✅ Added {column} to campaign_properties table")
-                except Exception as e:
-                    print(f"⚠️ Failed to add {column} to campaign_properties: {e}")
-        
-        print("✅ Daily cap columns verified/added to campaign_properties")
+def init_db():
+    """Bring the schema up to date - applies pending migrations (see migrations.py)"""
+    from migrations import migrate, LATEST_VERSION
 
-        # Add Mike's Tune-style reporting columns to campaigns table
-        cursor = conn.execute("PRAGMA table_info(campaigns)")
-        existing_columns = [row[1] for row in cursor.fetchall()]
-        
-        reporting_columns = {
-            'partner_name': 'TEXT',           # For Partner column in reports
-            'advertiser_name': 'TEXT',        # For Advertiser column in reports  
-            'payout_amount': 'DECIMAL(10,2) DEFAULT 0.45',  # For Payout column
-            'creative_file': 'TEXT'           # For Creative column (filename)
-        }
-        
-        for column, column_type in reporting_columns.items():
-            if column not in existing_columns:
-                try:
-                    conn.execute(f"ALTER TABLE campaigns ADD COLUMN {column} {column_type}")
-                    print(f"✅ Added {column} to campaigns table")
-                except Exception as e:
-                    print(f"⚠️ Failed to add {column} to campaigns: {e}")
-        
-        # Create conversions table for future Tune webhook integration
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS conversions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                campaign_id INTEGER NOT NULL,
-                property_code TEXT NOT NULL,
-                session_id TEXT,
-                conversion_value DECIMAL(10,2) DEFAULT 0.45,
-                timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                source TEXT,
-                subsource TEXT,
-                utm_campaign TEXT,
-                referrer TEXT,
-                landing_page TEXT,
-                tune_conversion_id TEXT,  -- Tune's conversion ID from webhook
-                FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE
-            )
-        """)
-        
-        # Add indexes for Mike's reporting queries
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_conversions_campaign ON conversions(campaign_id, timestamp)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_conversions_property ON conversions(property_code, timestamp)")
-        
-        print("✅ Mike's attribution reporting columns verified/added")
-        # Create indexes for performance
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_campaign_active ON campaigns(active)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_property_active ON campaign_properties(property_code, active)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_impressions_date ON impressions(timestamp)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_impressions_campaign ON impressions(campaign_id, timestamp)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_clicks_date ON clicks(timestamp)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_clicks_campaign ON clicks(campaign_id, timestamp)")
-        conn.execute("CREATE INDEX IF NOT EXISTS idx_property_stats ON impressions(property_code, timestamp)")
-        
-        conn.commit()
-        print("✅ Database initialized successfully")
-        
+    try:
+        applied = migrate()
+        if applied:
+            print(f"✅ Database initialized successfully (schema v{LATEST_VERSION}, applied {applied})")
+        else:
+            print(f"✅ Database schema current (v{LATEST_VERSION})")
     except sqlite3.Error as e:
         print(f"❌ Database initialization error: {e}")
-        conn.rollback()
-    finally:
-        conn.close()
+
+def backfill_event_epochs(batch_size: int = EPOCH_BACKFILL_BATCH_SIZE) -> int:
+    """Fill ts_epoch for rows written before the column existed, one committed batch at a time
+    (keeps the write lock short so ingestion can interleave on a large table)"""
+    from worker_locks import writer_lock
+
+    total = 0
+    with db_connection() as conn:
+        for table in EVENT_TABLES:
+            while True:
+                with writer_lock.hold():
+                    cursor = conn.execute(f"""
+                        UPDATE {table} SET ts_epoch = {EPOCH_FROM_TIMESTAMP_SQL}
+                        WHERE id IN (SELECT id FROM {table} WHERE ts_epoch IS NULL LIMIT ?)
+                    """, (batch_size,))
+                    conn.commit()
+                if cursor.rowcount <= 0:
+                    break
+                total += cursor.rowcount
+                print(f"🕒 Backfilled ts_epoch for {cursor.rowcount} {table} rows")
+    return total
+
+def sqlite_utc_epoch(sqlite_ts: str) -> int:
+    """'YYYY-MM-DD HH:MM:SS' (UTC, SQLite CURRENT_TIMESTAMP format) -> epoch seconds"""
+    from datetime import datetime, timezone
+    return int(datetime.strptime(sqlite_ts, "%Y-%m-%d %H:%M:%S").replace(tzinfo=timezone.utc).timestamp())
 
 def detect_property_code_from_host(hostname: str) -> str:
     """Resolve property_code from a given hostname using the properties table.
-    Falls back to heuristic substring checks and defaults to 'mff'.
+    Exact domain, then subdomain suffix, then substring/brand heuristics; defaults to 'mff'.
+    Served from the in-memory host resolver (rebuilt when the catalog changes).
     """
-    host = (hostname or "").lower()
-    if not host:
-        return "mff"
-
-    conn = get_db_connection()
-    try:
-        # Exact domain match first
-        cursor = conn.execute(
-            "SELECT code FROM properties WHERE lower(domain) = ? AND active = 1",
-            (host,),
-        )
-        row = cursor.fetchone()
-        if row and row[0]:
-            return row[0]
-
-        # Substring match (e.g., subdomains)
-        cursor = conn.execute("SELECT code, domain FROM properties WHERE active = 1")
-        for r in cursor.fetchall():
-            code, domain = r[0], (r[1] or "").lower()
-            if domain and (domain in host or host.endswith("." + domain)):
-                return code
-
-    finally:
-        conn.close()
-
-    # Heuristic fallback
-    if "modefreefinds" in host:
-        return "mff"
-    if "marketmunchies" in host:
-        return "mmm"
-    if "modeclassactions" in host:
-        return "mcad"
-    if "modemobiledaily" in host:
-        return "mmd"
-    return "mff"
+    from hosts import host_resolver
+    return host_resolver.resolve(hostname)
 
 def _get_est_day_bounds_sqlite_str():
     """Return (start_utc_str, end_utc_str) for current day in EST as 'YYYY-MM-DD HH:MM:SS' (UTC),
@@ -426,45 +128,41 @@ def _get_est_day_bounds_sqlite_str():
 
 
 def get_active_campaigns_for_property(property_code: str):
-    """Get all active campaigns for a specific property - SIMPLIFIED VERSION"""
-    conn = get_db_connection()
-    try:
-        # Simple query without JOIN to campaign_properties table (which might not exist)
-        query = """
-            SELECT
-                id, name, tune_url, logo_url, main_image_url,
-                description, cta_text, offer_id, aff_id,
-                COALESCE(featured, 0) as featured
-            FROM campaigns
-            WHERE active = 1
-            ORDER BY COALESCE(featured, 0) DESC, created_at DESC
-        """
+    """Get active campaigns for a specific property: assigned and active there, visible (> 0%),
+    not at today's daily cap, property-featured campaign first, then newest.
+    Driven by idx_campaign_properties_eligible; campaign rows are primary-key lookups."""
+    from caps import cap_enforcer
 
-        cursor = conn.execute(query)
+    with db_connection() as conn:
+        cursor = conn.execute("""
+            SELECT
+                c.id, c.name, c.tune_url, c.logo_url, c.main_image_url,
+                c.description, c.cta_text, c.offer_id, c.aff_id,
+                CASE WHEN c.id = p.featured_campaign_id THEN 1 ELSE 0 END as featured,
+                COALESCE(cp.visibility_percentage, 100) as visibility_percentage,
+                cp.impression_cap_daily,
+                cp.click_cap_daily
+            FROM campaign_properties cp
+            JOIN campaigns c ON c.id = cp.campaign_id
+            LEFT JOIN properties p ON p.code = cp.property_code
+            WHERE cp.property_code = ?
+              AND cp.active = 1
+              AND c.active = 1
+              AND COALESCE(cp.visibility_percentage, 100) > 0
+            ORDER BY featured DESC, c.created_at DESC
+        """, (property_code,))
         rows = [dict(row) for row in cursor.fetchall()]
 
-        # Simple property-based filtering - return different campaigns based on property
-        if property_code == 'mff':
-            # For MFF, return Money.com-related campaigns (IDs 1-6)
-            filtered = [row for row in rows if row['id'] <= 6]
-        elif property_code == 'mmm':
-            # For MMM, return other campaigns (IDs 7-12)
-            filtered = [row for row in rows if row['id'] >= 7]
-        else:
-            # Default: return all campaigns
-            filtered = rows
-
-        return filtered
-    finally:
-        conn.close()
+    # Caps come from the in-memory daily counters (O(1) per row, no COUNT(*) per request)
+    capped = cap_enforcer.capped_ids(property_code)
+    return [row for row in rows if row["id"] not in capped]
 
 
 # Duplicate function removed - using the first implementation above
 
 def insert_campaign(name: str, tune_url: str, logo_url: str, main_image_url: str, description: str = "", cta_text: str = "View Offer", offer_id: str = "", aff_id: str = "", featured: bool = False):
     """Insert new campaign with Tune tracking and priority support"""
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         cursor = conn.execute("""
             INSERT INTO campaigns (name, tune_url, logo_url, main_image_url, description, cta_text, offer_id, aff_id, featured)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -473,20 +171,15 @@ def insert_campaign(name: str, tune_url: str, logo_url: str, main_image_url: str
         campaign_id = cursor.lastrowid
         conn.commit()
         return campaign_id
-    finally:
-        conn.close()
 
 def track_impression(campaign_id: int, property_code: str):
     """Track popup impression"""
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         conn.execute("""
             INSERT INTO impressions (campaign_id, property_code)
             VALUES (?, ?)
         """, (campaign_id, property_code))
         conn.commit()
-    finally:
-        conn.close()
 
 if __name__ == "__main__":
     # Initialize database when run directly
@@ -0,0 +1,156 @@
+"""
+SQLite connection pool for Mode Popup Management System
+Per-thread pools of WAL-mode connections with tuned pragmas applied once per connection
+"""
+
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Idle connections kept per thread (the event loop thread plus FastAPI's worker threads)
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+
+# Pragmas applied once when a connection is opened.
+# WAL lets /api/campaigns readers run while /api/impression writers commit,
+# synchronous=NORMAL is durable across app crashes in WAL mode,
+# busy_timeout makes concurrent writers wait instead of failing with "database is locked".
+CONNECTION_PRAGMAS = (
+    ("journal_mode", "WAL"),
+    ("synchronous", os.getenv("DB_SYNCHRONOUS", "NORMAL")),
+    ("cache_size", int(os.getenv("DB_CACHE_SIZE_KB", "16000")) * -1),  # negative = KiB
+    ("mmap_size", int(os.getenv("DB_MMAP_SIZE", str(128 * 1024 * 1024)))),
+    ("busy_timeout", int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000"))),
+    ("temp_store", "MEMORY"),
+)
+
+
+class PooledConnection:
+    """sqlite3.Connection proxy whose close() returns the connection to its pool"""
+
+    __slots__ = ("_conn", "_pool", "_released")
+
+    def __init__(self, conn: sqlite3.Connection, pool: "ConnectionPool"):
+        object.__setattr__(self, "_conn", conn)
+        object.__setattr__(self, "_pool", pool)
+        object.__setattr__(self, "_released", False)
+
+    def __getattr__(self, name):
+        if self._released:
+            raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+        return getattr(self._conn, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._conn, name, value)
+
+    def __enter__(self):
+        return self._conn.__enter__()
+
+    def __exit__(self, exc_type, exc, tb):
+        return self._conn.__exit__(exc_type, exc, tb)
+
+    def close(self):
+        """Release back to the pool (safe to call more than once)"""
+        if self._released:
+            return
+        object.__setattr__(self, "_released", True)
+        self._pool.release(self._conn)
+
+
+class ConnectionPool:
+    """Bounded per-thread pool of configured sqlite3 connections.
+
+    sqlite3 connections are bound to the thread that created them, so each thread
+    keeps its own stack of idle connections. Forked workers start with empty pools.
+    """
+
+    def __init__(self, db_path: str, size: int = POOL_SIZE):
+        self.db_path = db_path
+        self.size = max(0, size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "closed": 0}
+
+    def _idle(self):
+        idle = getattr(self._local, "idle", None)
+        if idle is None or getattr(self._local, "pid", None) != os.getpid():
+            idle = []
+            self._local.idle = idle
+            self._local.pid = os.getpid()
+        return idle
+
+    def _open(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row  # Enable dict-like access
+        for pragma, value in CONNECTION_PRAGMAS:
+            try:
+                conn.execute(f"PRAGMA {pragma} = {value}")
+            except sqlite3.Error as e:
+                print(f"⚠️ PRAGMA {pragma} failed: {e}")
+        with self._lock:
+            self.stats["opened"] += 1
+        return conn
+
+    def acquire(self) -> PooledConnection:
+        idle = self._idle()
+        while idle:
+            conn = idle.pop()
+            try:
+                conn.execute("SELECT 1")
+            except sqlite3.Error:
+                self._discard(conn)
+                continue
+            with self._lock:
+                self.stats["reused"] += 1
+            return PooledConnection(conn, self)
+        return PooledConnection(self._open(), self)
+
+    def release(self, conn: sqlite3.Connection):
+        try:
+            # Never hand out a connection with a half-finished transaction
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error:
+            self._discard(conn)
+            return
+
+        idle = self._idle()
+        if len(idle) < self.size:
+            idle.append(conn)
+        else:
+            self._discard(conn)
+
+    def _discard(self, conn: sqlite3.Connection):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self.stats["closed"] += 1
+
+    def close_thread_connections(self):
+        """Close idle connections owned by the calling thread (used on shutdown)"""
+        idle = self._idle()
+        while idle:
+            self._discard(idle.pop())
+
+    @contextmanager
+    def connection(self):
+        """Context manager yielding a pooled connection, released on exit"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def status(self) -> dict:
+        with self._lock:
+            stats = dict(self.stats)
+        return {
+            "db_path": self.db_path,
+            "pool_size_per_thread": self.size,
+            "idle_in_thread": len(self._idle()),
+            "pragmas": {name: value for name, value in CONNECTION_PRAGMAS},
+            **stats,
+        }
@@ -0,0 +1,142 @@
+"""
+Font registry for the email renderers
+Resolves each style to a font file once and memoizes loaded fonts by (style, size),
+so a render never walks the candidate list or re-parses a TTF. Preloaded at startup
+(and in each render worker) with the sizes the email layouts use.
+"""
+
+import importlib.util
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Tuple
+
+from fastapi import HTTPException
+
+# PIL itself is imported on first font load, not when the API process starts
+PIL_AVAILABLE = importlib.util.find_spec("PIL") is not None
+
+FONT_DIR = Path(__file__).parent / "assets" / "fonts"
+
+# Candidates in order of preference (bundled fonts first, then Railway/Linux, macOS)
+FONT_CANDIDATES = {
+    "bold": (
+        str(FONT_DIR / "Inter-ExtraBold.ttf"),
+        str(FONT_DIR / "DejaVuSans-Bold.ttf"),
+        "/System/Library/Fonts/Helvetica.ttc",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",
+        "/usr/share/fonts/TTF/arial.ttf",
+        "arial.ttf",
+        "DejaVuSans-Bold.ttf",
+    ),
+    "regular": (
+        str(FONT_DIR / "Inter-Regular.ttf"),
+        str(FONT_DIR / "DejaVuSans.ttf"),
+        "/System/Library/Fonts/Helvetica.ttc",
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",
+        "/usr/share/fonts/TTF/arial.ttf",
+        "arial.ttf",
+        "DejaVuSans.ttf",
+    ),
+}
+
+# (font name, size) pairs used by create_popup_style_email_ad in routes/email.py
+PRELOAD_FONTS = (
+    ("title-bold", 24),
+    ("desc", 14),
+    ("cta-bold", 18),
+    ("error", 16),
+)
+
+
+def font_style(font_name: str) -> str:
+    """Renderer font names map onto two styles: bold ('*bold*', '*extra*') or regular"""
+    name = font_name.lower()
+    return "bold" if "bold" in name or "extra" in name else "regular"
+
+
+class FontRegistry:
+    """Memoized (style, size) -> font table with per-style path resolution"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._paths: Dict[str, Optional[str]] = {}      # style -> resolved path (None = default font)
+        self._errors: Dict[str, str] = {}                 # style -> last candidate error
+        self._fonts: Dict[Tuple[str, int], object] = {}
+        self.stats = {"hits": 0, "loads": 0}
+
+    def _resolve(self, style: str, size: int):
+        """Walk the candidates once per style; later sizes load the resolved path directly"""
+        from PIL import ImageFont
+
+        if style in self._paths:
+            path = self._paths[style]
+            return (ImageFont.truetype(path, size) if path else ImageFont.load_default()), path
+        for path in FONT_CANDIDATES[style]:
+            try:
+                font = ImageFont.truetype(path, size)
+            except Exception as e:
+                self._errors[style] = str(e)
+                continue
+            self._paths[style] = path
+            return font, path
+        self._paths[style] = None
+        return ImageFont.load_default(), None
+
+    def get(self, font_name: str, size: int):
+        """Return (font, debug_info) for a renderer font name and pixel size"""
+        style = font_style(font_name)
+        key = (style, size)
+        font = self._fonts.get(key)
+        if font is None:
+            with self._lock:
+                font = self._fonts.get(key)
+                if font is None:
+                    try:
+                        font, _ = self._resolve(style, size)
+                    except Exception as e:
+                        error_msg = f"Critical font loading failure: {str(e)}"
+                        raise HTTPException(status_code=500, detail=error_msg)
+                    self._fonts[key] = font
+                    self.stats["loads"] += 1
+        else:
+            self.stats["hits"] += 1
+        return font, self._debug_info(font_name, style, size)
+
+    def _debug_info(self, font_name: str, style: str, size: int) -> dict:
+        path = self._paths.get(style)
+        info = {"family": font_name, "size": size, "path": path or "", "error": None}
+        if path:
+            info["family"] = f"{font_name} (using {Path(path).name})"
+        else:
+            info["family"] = "default"
+            info["error"] = "All font candidates failed, using default"
+            if style in self._errors:
+                info["last_error"] = self._errors[style]
+        return info
+
+    def preload(self, fonts: Iterable[Tuple[str, int]] = PRELOAD_FONTS) -> int:
+        if not PIL_AVAILABLE:
+            return 0
+        for font_name, size in fonts:
+            self.get(font_name, size)
+        return len(self._fonts)
+
+    def status(self) -> dict:
+        with self._lock:
+            loaded = sorted(f"{style}/{size}" for style, size in self._fonts)
+            resolved = {style: (path or "default") for style, path in self._paths.items()}
+        return {
+            "resolved": resolved,
+            "candidate_errors": dict(self._errors),  # earlier candidates that failed to open
+            "loaded": loaded,
+            **self.stats,
+        }
+
+
+# Shared per process: the server and each render worker preload their own copy
+font_registry = FontRegistry()
+
+
+def registry_status() -> dict:
+    """font_registry.status() as a module-level function, so render workers can be asked for theirs"""
+    return font_registry.status()
@@ -0,0 +1,366 @@
+"""
+HasOffers (Tune) API client for Mode Popup Management System
+Async calls on the shared keep-alive HTTP client (http_client.py) with per-request timeouts,
+retries with exponential backoff on transport errors / 429 / 5xx, and a circuit breaker so
+a HasOffers outage fails fast instead of tying up every analytics request for the full timeout.
+Report.getStats responses are parsed into StatsReport rows with numeric fields and cached per
+query (StatsCache): concurrent identical requests share one upstream call, and an expired entry
+is served while a single background refresh replaces it.
+"""
+
+import asyncio
+import os
+import random
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import date
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import httpx
+
+import http_client
+
+HASOFFERS_BASE_URL = os.getenv("HASOFFERS_BASE_URL", "https://currentpublisher.api.hasoffers.com")
+HASOFFERS_REPORT_URL = f"{HASOFFERS_BASE_URL}/v3/Report.json"
+HASOFFERS_NETWORK_TOKEN = os.getenv("HASOFFERS_NETWORK_TOKEN", "NETfeRuo7FOO72yOcwOXj5jK0aCYve")
+HASOFFERS_TIMEOUT = float(os.getenv("HASOFFERS_TIMEOUT", "15"))
+HASOFFERS_MAX_ATTEMPTS = int(os.getenv("HASOFFERS_MAX_ATTEMPTS", "3"))
+HASOFFERS_RETRY_BASE = float(os.getenv("HASOFFERS_RETRY_BASE", "0.5"))  # seconds; doubled per attempt plus jitter
+# Consecutive failed calls that open the breaker, and how long it stays open before one trial call
+HASOFFERS_BREAKER_THRESHOLD = int(os.getenv("HASOFFERS_BREAKER_THRESHOLD", "5"))
+HASOFFERS_BREAKER_COOLDOWN = float(os.getenv("HASOFFERS_BREAKER_COOLDOWN", "30"))
+# getStats cache: periods that include today are still moving; closed periods only see late conversions
+HASOFFERS_CACHE_TTL_OPEN = float(os.getenv("HASOFFERS_CACHE_TTL_OPEN", "60"))
+HASOFFERS_CACHE_TTL_CLOSED = float(os.getenv("HASOFFERS_CACHE_TTL_CLOSED", "3600"))
+# How long past expiry an entry may still be served while it is refreshed in the background
+HASOFFERS_CACHE_MAX_STALE = float(os.getenv("HASOFFERS_CACHE_MAX_STALE", "600"))
+HASOFFERS_CACHE_MAX_ENTRIES = int(os.getenv("HASOFFERS_CACHE_MAX_ENTRIES", "256"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# {"Stat.offer_id": ("EQUAL_TO", [6998, 7521]), "Stat.aff_sub5": ("LIKE", ["popup_%"])}
+Filters = Dict[str, Tuple[str, Sequence]]
+
+
+class HasOffersError(Exception):
+    """The call failed: transport error, bad HTTP status, or an API-level error response"""
+
+
+class HasOffersUnavailable(HasOffersError):
+    """The circuit breaker is open - HasOffers failed repeatedly and is not being called"""
+
+
+@dataclass(frozen=True)
+class StatsRow:
+    offer_id: int
+    affiliate_id: Optional[str]
+    clicks: int
+    conversions: int
+    revenue: float
+    payout: float
+
+
+@dataclass(frozen=True)
+class StatsReport:
+    rows: List[StatsRow]
+    totals: StatsRow
+    params: dict  # request parameters without the network token (safe to echo in diagnostics)
+    raw: dict
+    fetched_at: float = field(default_factory=time.time)
+
+    @property
+    def age_seconds(self) -> float:
+        return round(time.time() - self.fetched_at, 1)
+
+
+def _int(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+
+def _float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _stats_row(stat: dict) -> StatsRow:
+    affiliate_id = stat.get("affiliate_id")
+    return StatsRow(
+        offer_id=_int(stat.get("offer_id")),
+        affiliate_id=str(affiliate_id) if affiliate_id not in (None, "") else None,
+        clicks=_int(stat.get("clicks")),
+        conversions=_int(stat.get("conversions")),
+        revenue=_float(stat.get("revenue")),
+        payout=_float(stat.get("payout")),
+    )
+
+
+def parse_stats(raw: dict, params: dict) -> StatsReport:
+    """Report.getStats body -> StatsReport (HasOffers sends numbers as strings and empty totals as [])"""
+    data = (raw.get("response") or {}).get("data") or {}
+    rows = []
+    for item in data.get("data") or []:
+        stat = item.get("Stat") if isinstance(item, dict) else None
+        if isinstance(stat, dict):
+            rows.append(_stats_row(stat))
+    totals_raw = data.get("totals")
+    totals_stat = totals_raw.get("Stat") if isinstance(totals_raw, dict) else None
+    if isinstance(totals_stat, dict):
+        totals = _stats_row(totals_stat)
+    else:
+        totals = StatsRow(0, None, sum(r.clicks for r in rows), sum(r.conversions for r in rows),
+                          sum(r.revenue for r in rows), sum(r.payout for r in rows))
+    return StatsReport(rows=rows, totals=totals, params=params, raw=raw)
+
+
+def stats_params(start_date: str, end_date: str, fields: Iterable[str], group_by: Iterable[str] = (),
+                 filters: Optional[Filters] = None, limit: int = 1000) -> dict:
+    """Report.getStats query parameters (HasOffers' bracketed array syntax)"""
+    params = {
+        "data_start": start_date,
+        "data_end": end_date,
+        "fields[]": list(fields),
+        "limit": limit,
+    }
+    if group_by:
+        params["group_by[]"] = list(group_by)
+    for name, (conditional, values) in (filters or {}).items():
+        params[f"filters[{name}][conditional]"] = conditional
+        for i, value in enumerate(values):
+            params[f"filters[{name}][values][{i}]"] = value
+    return params
+
+
+def stats_cache_key(start_date: str, end_date: str, fields: Iterable[str], group_by: Iterable[str] = (),
+                    filters: Optional[Filters] = None, limit: int = 1000) -> tuple:
+    """Order-insensitive key for a getStats query (filter values are sets: [6998, 7521] == [7521, 6998])"""
+    filter_key = tuple(sorted(
+        (name, conditional, tuple(sorted({str(v) for v in values})))
+        for name, (conditional, values) in (filters or {}).items()
+    ))
+    return start_date, end_date, tuple(sorted(fields)), tuple(sorted(group_by)), filter_key, limit
+
+
+class StatsCache:
+    """getStats results by query: TTL by period, one upstream call per key at a time, stale-while-revalidate
+
+    fresh   -> served from memory
+    stale   -> served from memory, one background refresh started (within max_stale past expiry)
+    missing -> fetched; concurrent callers for the same key await the same call
+    A failed fetch leaves the stale entry in place until it ages out of max_stale.
+    """
+
+    def __init__(self, ttl_open: float = HASOFFERS_CACHE_TTL_OPEN, ttl_closed: float = HASOFFERS_CACHE_TTL_CLOSED,
+                 max_stale: float = HASOFFERS_CACHE_MAX_STALE, max_entries: int = HASOFFERS_CACHE_MAX_ENTRIES):
+        self.ttl_open = ttl_open
+        self.ttl_closed = ttl_closed
+        self.max_stale = max_stale
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[tuple, Tuple[StatsReport, float]]" = OrderedDict()  # key -> (report, expires_at)
+        self._inflight: Dict[tuple, asyncio.Future] = {}
+        self.metrics = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0,
+                        "fetch_failures": 0, "evictions": 0}
+
+    def ttl(self, end_date: str) -> float:
+        return self.ttl_open if end_date >= date.today().isoformat() else self.ttl_closed
+
+    async def get(self, key: tuple, end_date: str, fetch: Callable[[], Awaitable[StatsReport]]) -> StatsReport:
+        entry = self._entries.get(key)
+        if entry is not None:
+            report, expires_at = entry
+            age_past_expiry = time.monotonic() - expires_at
+            if age_past_expiry < 0:
+                self.metrics["hits"] += 1
+                self._entries.move_to_end(key)
+                return report
+            if age_past_expiry < self.max_stale:
+                self.metrics["stale_hits"] += 1
+                self._entries.move_to_end(key)
+                self._refresh(key, end_date, fetch)
+                return report
+        if key in self._inflight:
+            self.metrics["coalesced"] += 1
+        else:
+            self.metrics["misses"] += 1
+        # shield: a caller that disconnects must not cancel the call other callers are waiting on
+        return await asyncio.shield(self._refresh(key, end_date, fetch))
+
+    def _refresh(self, key: tuple, end_date: str, fetch: Callable[[], Awaitable[StatsReport]]) -> asyncio.Future:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(key, end_date, fetch))
+            # Background refreshes have no awaiter; retrieve the exception so it isn't logged as lost
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+            self._inflight[key] = task
+        return task
+
+    async def _fetch(self, key: tuple, end_date: str, fetch: Callable[[], Awaitable[StatsReport]]) -> StatsReport:
+        try:
+            report = await fetch()
+        except Exception:
+            self.metrics["fetch_failures"] += 1
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._entries[key] = (report, time.monotonic() + self.ttl(end_date))
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.metrics["evictions"] += 1
+        return report
+
+    def clear(self):
+        self._entries.clear()
+
+    def status(self) -> dict:
+        return {"entries": len(self._entries), "in_flight": len(self._inflight),
+                "ttl_open_seconds": self.ttl_open, "ttl_closed_seconds": self.ttl_closed,
+                "max_stale_seconds": self.max_stale, **self.metrics}
+
+
+class CircuitBreaker:
+    """closed -> open after `threshold` consecutive failures -> one trial call after `cooldown` seconds"""
+
+    def __init__(self, threshold: int = HASOFFERS_BREAKER_THRESHOLD, cooldown: float = HASOFFERS_BREAKER_COOLDOWN):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half-open" if time.monotonic() - self.opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+
+    def release_trial(self):
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_running or self.failures >= self.threshold:
+            if self.opened_at is None:
+                print(f"⚠️ HasOffers circuit opened after {self.failures} failures")
+            self.opened_at = time.monotonic()
+        self._trial_running = False
+
+    def status(self) -> dict:
+        retry_in = None
+        if self.opened_at is not None:
+            retry_in = round(max(0.0, self.cooldown - (time.monotonic() - self.opened_at)), 1)
+        return {"state": self.state, "consecutive_failures": self.failures, "retry_in_seconds": retry_in}
+
+
+class HasOffersClient:
+    """Report API calls for Mike's publisher account"""
+
+    def __init__(self, network_token: str = HASOFFERS_NETWORK_TOKEN):
+        self.network_token = network_token
+        self.breaker = CircuitBreaker()
+        self.stats_cache = StatsCache()
+        self.metrics = {"calls": 0, "succeeded": 0, "failed": 0, "retries": 0, "rejected": 0, "last_error": None}
+
+    async def report(self, method: str, params: dict) -> dict:
+        """Call Report.<method>; returns the decoded body or raises HasOffersError"""
+        if not self.breaker.allow():
+            self.metrics["rejected"] += 1
+            raise HasOffersUnavailable(
+                f"HasOffers circuit open after {self.breaker.failures} failures, retrying in "
+                f"{self.breaker.status()['retry_in_seconds']}s"
+            )
+        self.metrics["calls"] += 1
+        query = {"NetworkToken": self.network_token, "Target": "Report", "Method": method, **params}
+        try:
+            body = await self._get_with_retries(HASOFFERS_REPORT_URL, query)
+        except HasOffersError as e:
+            self.breaker.record_failure()
+            self.metrics["failed"] += 1
+            self.metrics["last_error"] = str(e)
+            raise
+        except BaseException:
+            self.breaker.release_trial()  # cancelled mid-call: neither outcome, let the next call try
+            raise
+        # The API answered: a 'status != 1' is a request problem, not an outage
+        self.breaker.record_success()
+        response = body.get("response") if isinstance(body, dict) else None
+        if not isinstance(response, dict) or response.get("status") != 1:
+            errors = (response or {}).get("errors") or (response or {}).get("errorMessage") or "unexpected response"
+            self.metrics["failed"] += 1
+            self.metrics["last_error"] = f"API error: {errors}"
+            raise HasOffersError(f"HasOffers API error: {errors}")
+        self.metrics["succeeded"] += 1
+        return body
+
+    async def _get_with_retries(self, url: str, query: dict) -> dict:
+        client = await http_client.ensure_client()
+        error = "no attempts made"
+        for attempt in range(HASOFFERS_MAX_ATTEMPTS):
+            try:
+                response = await client.get(url, params=query, timeout=HASOFFERS_TIMEOUT)
+                if response.status_code == 200:
+                    return response.json()
+                error = f"HTTP {response.status_code}"
+                if response.status_code not in RETRY_STATUS_CODES:
+                    break
+            except asyncio.CancelledError:
+                raise
+            except (httpx.TransportError, ValueError) as e:
+                # ValueError: a 200 with a body that isn't JSON (maintenance page) - worth a retry
+                error = f"{type(e).__name__}: {e}" if str(e) else type(e).__name__
+
+            if attempt + 1 < HASOFFERS_MAX_ATTEMPTS:
+                self.metrics["retries"] += 1
+                delay = HASOFFERS_RETRY_BASE * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay))
+        raise HasOffersError(f"HasOffers request failed: {error}")
+
+    async def get_stats(self, start_date: str, end_date: str, fields: Iterable[str], group_by: Iterable[str] = (),
+                        filters: Optional[Filters] = None, limit: int = 1000, use_cache: bool = True) -> StatsReport:
+        """Report.getStats through the cache; use_cache=False always calls HasOffers (diagnostics)"""
+        fields, group_by = tuple(fields), tuple(group_by)
+        params = stats_params(start_date, end_date, fields, group_by, filters, limit)
+
+        async def fetch() -> StatsReport:
+            return parse_stats(await self.report("getStats", params), params)
+
+        if not use_cache:
+            return await fetch()
+        key = stats_cache_key(start_date, end_date, fields, group_by, filters, limit)
+        return await self.stats_cache.get(key, end_date, fetch)
+
+    async def ping(self, timeout: float = 5.0) -> Tuple[bool, Optional[str]]:
+        """Reachability check without the API token (no retries, doesn't touch the breaker)"""
+        client = await http_client.ensure_client()
+        try:
+            response = await client.get(f"{HASOFFERS_BASE_URL}/", timeout=timeout)
+        except httpx.TransportError as e:
+            return False, str(e) or type(e).__name__
+        return response.status_code == 200, None if response.status_code == 200 else f"HTTP {response.status_code}"
+
+    def status(self) -> dict:
+        return {"endpoint": HASOFFERS_REPORT_URL, "circuit": self.breaker.status(),
+                "stats_cache": self.stats_cache.status(), **self.metrics}
+
+
+# Shared instance: one breaker, one stats cache and one set of metrics per worker process
+hasoffers_client = HasOffersClient()
@@ -0,0 +1,148 @@
+"""
+Host -> property resolution for Mode Popup Management System
+Built from the properties in the catalog snapshot: an exact-domain hash map plus a
+reversed-label suffix trie for subdomains, fronted by an LRU of recently seen hostnames
+(misses included). Rebuilt whenever the catalog version changes, so property edits apply
+on the next lookup and a popup request never touches SQLite to find its property.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+import catalog
+
+HOST_CACHE_SIZE = int(os.getenv("HOST_CACHE_SIZE", "4096"))
+DEFAULT_PROPERTY_CODE = "mff"
+
+# Last-resort brand keywords for hosts no property domain covers
+HOST_KEYWORDS = (
+    ("modefreefinds", "mff"),
+    ("marketmunchies", "mmm"),
+    ("modeclassactions", "mcad"),
+    ("modemobiledaily", "mmd"),
+)
+
+_TERMINAL = ""  # trie key holding the property code for a complete domain
+
+
+def _normalize(hostname: str) -> str:
+    host = (hostname or "").strip().lower().rstrip(".")
+    if ":" in host:
+        host = host.split(":", 1)[0]
+    return host
+
+
+class HostIndex:
+    """Immutable lookup structures for one catalog version"""
+
+    def __init__(self, properties: Dict[str, dict]):
+        self.exact: Dict[str, str] = {}
+        self.trie: dict = {}
+        self.domains: List[Tuple[str, str]] = []  # (domain, code) for the substring fallback
+        for code, prop in sorted(properties.items(), key=lambda item: item[1].get("id") or 0):
+            domain = _normalize(prop.get("domain") or "")
+            if not domain or not prop.get("active"):
+                continue
+            self.exact.setdefault(domain, code)
+            self.domains.append((domain, code))
+            node = self.trie
+            for label in reversed(domain.split(".")):
+                node = node.setdefault(label, {})
+            node.setdefault(_TERMINAL, code)
+
+    def suffix_match(self, host: str) -> Optional[str]:
+        """Longest registered domain that host is a subdomain of (label boundaries only)"""
+        node, found = self.trie, None
+        labels = host.split(".")
+        for i, label in enumerate(reversed(labels)):
+            node = node.get(label)
+            if node is None:
+                break
+            # Only a proper parent domain counts here; the exact map already covered equality
+            if _TERMINAL in node and i < len(labels) - 1:
+                found = node[_TERMINAL]
+        return found
+
+    def resolve(self, host: str) -> Tuple[str, str]:
+        """(property_code, how) where how is exact | suffix | substring | keyword | default"""
+        code = self.exact.get(host)
+        if code:
+            return code, "exact"
+        code = self.suffix_match(host)
+        if code:
+            return code, "suffix"
+        # Compatibility with the old scan: a property domain anywhere in the host
+        for domain, code in self.domains:
+            if domain in host:
+                return code, "substring"
+        for keyword, code in HOST_KEYWORDS:
+            if keyword in host:
+                return code, "keyword"
+        return DEFAULT_PROPERTY_CODE, "default"
+
+
+class HostResolver:
+    """LRU of hostname -> property code over a HostIndex tied to the catalog version"""
+
+    def __init__(self, max_entries: int = HOST_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._index: Optional[HostIndex] = None
+        self._version: Optional[int] = None
+        self._cache: "OrderedDict[str, Tuple[str, str]]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "rebuilds": 0, "evictions": 0}
+
+    def _current_index(self) -> HostIndex:
+        snapshot = catalog.get_snapshot()
+        if self._index is None or self._version != snapshot.version:
+            with self._lock:
+                if self._index is None or self._version != snapshot.version:
+                    self._index = HostIndex({code: dict(prop) for code, prop in snapshot.properties.items()})
+                    self._version = snapshot.version
+                    self._cache.clear()
+                    self.stats["rebuilds"] += 1
+        return self._index
+
+    def lookup(self, hostname: str) -> Tuple[str, str]:
+        """(property_code, how) for a hostname; misses are cached as 'default' too"""
+        host = _normalize(hostname)
+        if not host:
+            return DEFAULT_PROPERTY_CODE, "default"
+        index = self._current_index()
+        with self._lock:
+            cached = self._cache.get(host)
+            if cached is not None:
+                self._cache.move_to_end(host)
+                self.stats["hits"] += 1
+                if cached[1] == "default":
+                    self.stats["negative_hits"] += 1
+                return cached
+        result = index.resolve(host)
+        with self._lock:
+            if index is self._index:  # don't cache against an index replaced meanwhile
+                self._cache[host] = result
+                if len(self._cache) > self.max_entries:
+                    self._cache.popitem(last=False)
+                    self.stats["evictions"] += 1
+            self.stats["misses"] += 1
+        return result
+
+    def resolve(self, hostname: str) -> str:
+        return self.lookup(hostname)[0]
+
+    def status(self) -> dict:
+        with self._lock:
+            index = self._index
+            return {
+                "catalog_version": self._version,
+                "exact_domains": len(index.exact) if index else 0,
+                "cached_hosts": len(self._cache),
+                "max_entries": self.max_entries,
+                **self.stats,
+            }
+
+
+# Shared instance used by database.detect_property_code_from_host
+host_resolver = HostResolver()
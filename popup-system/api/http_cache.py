@@ -0,0 +1,109 @@
+"""
+HTTP caching helpers for Mode Popup Management System
+Pre-encoded JSON bodies with strong ETags, If-None-Match handling and Cache-Control headers
+"""
+
+import hashlib
+import json
+import os
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+
+from fastapi import Request, Response
+
+# Browser/CDN freshness for the popup campaign feeds
+FEED_MAX_AGE = int(os.getenv("FEED_MAX_AGE", "60"))
+FEED_STALE_WHILE_REVALIDATE = int(os.getenv("FEED_STALE_WHILE_REVALIDATE", "600"))
+
+# Request headers the feeds resolve the property from when ?property=/?host= is absent;
+# shared caches must key on them or one property's campaigns get served to another site
+HOST_HEADERS_VARY = "Host, X-Forwarded-Host, X-Forwarded-Server"
+
+
+def encode_json(payload: Any) -> bytes:
+    """Compact JSON encoding used for every pre-serialized feed"""
+    return json.dumps(payload, separators=(",", ":"), ensure_ascii=False, default=str).encode("utf-8")
+
+
+def strong_etag(body: bytes) -> str:
+    """Strong validator derived from the content hash of the body"""
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """True if the request's If-None-Match header matches etag (weak comparison per RFC 7232)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def not_modified_since(request: Request, last_modified: float) -> bool:
+    """True if If-Modified-Since is at or after last_modified (only consulted without If-None-Match)"""
+    if request.headers.get("if-none-match"):
+        return False
+    header = request.headers.get("if-modified-since")
+    if not header:
+        return False
+    try:
+        since = parsedate_to_datetime(header).timestamp()
+    except (TypeError, ValueError):
+        return False
+    return int(last_modified) <= since
+
+
+def cache_control(max_age: int = FEED_MAX_AGE, stale_while_revalidate: int = FEED_STALE_WHILE_REVALIDATE) -> str:
+    return f"public, max-age={max_age}, stale-while-revalidate={stale_while_revalidate}"
+
+
+def cached_json_response(
+    request: Request,
+    body: bytes,
+    etag: Optional[str] = None,
+    max_age: int = FEED_MAX_AGE,
+    stale_while_revalidate: int = FEED_STALE_WHILE_REVALIDATE,
+    vary: Optional[str] = None,
+) -> Response:
+    """Serve pre-encoded JSON, answering 304 when the client already holds this version
+
+    Pass vary= for every request header the body depends on (e.g. HOST_HEADERS_VARY)
+    """
+    etag = etag or strong_etag(body)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": cache_control(max_age, stale_while_revalidate),
+    }
+    if vary:
+        headers["Vary"] = vary
+    if etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def cached_binary_response(
+    request: Request,
+    body: bytes,
+    media_type: str,
+    etag: str,
+    last_modified: Optional[str] = None,
+    last_modified_ts: Optional[float] = None,
+    max_age: int = FEED_MAX_AGE,
+    extra_headers: Optional[dict] = None,
+) -> Response:
+    """Serve a binary body (e.g. PNG) with ETag/Last-Modified validators and 304 support"""
+    headers = {"ETag": etag, "Cache-Control": f"public, max-age={max_age}"}
+    if last_modified:
+        headers["Last-Modified"] = last_modified
+    if extra_headers:
+        headers.update(extra_headers)
+    if etag_matches(request, etag) or (last_modified_ts is not None and not_modified_since(request, last_modified_ts)):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
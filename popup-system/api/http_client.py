@@ -0,0 +1,73 @@
+"""
+Shared outbound HTTP client for Mode Popup Management System
+One long-lived httpx.AsyncClient with keep-alive pooling, built in the background at startup
+(httpx is a heavy import, so the health check doesn't wait on it) and closed on shutdown
+"""
+
+import asyncio
+import os
+import threading
+from typing import TYPE_CHECKING, Optional
+
+if TYPE_CHECKING:
+    import httpx
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "50"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT_SECONDS = 5.0
+HTTP_CONNECT_TIMEOUT_SECONDS = 3.0
+
+_client: Optional["httpx.AsyncClient"] = None
+_build_lock = threading.Lock()
+_warmup: Optional[asyncio.Future] = None
+
+
+def _build_client() -> "httpx.AsyncClient":
+    import httpx
+
+    return httpx.AsyncClient(
+        http2=False,  # plain HTTP/1.1 keep-alive
+        timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+        ),
+        headers={"User-Agent": "ModePopupSystem/1.0"},
+        follow_redirects=True,
+    )
+
+
+def get_client() -> "httpx.AsyncClient":
+    """Shared client (created on the spot if startup has not built it yet, e.g. in scripts)"""
+    global _client
+    if _client is None or _client.is_closed:
+        with _build_lock:
+            if _client is None or _client.is_closed:
+                _client = _build_client()
+    return _client
+
+
+async def start():
+    """Import httpx and build the client on a thread; startup carries on meanwhile"""
+    global _warmup
+    if _warmup is None:
+        _warmup = asyncio.get_running_loop().run_in_executor(None, get_client)
+
+
+async def ensure_client() -> "httpx.AsyncClient":
+    """get_client() for coroutines: waits for the background build instead of importing on the loop"""
+    if _warmup is not None and not _warmup.done():
+        await asyncio.shield(_warmup)
+    return get_client()
+
+
+async def close():
+    global _client, _warmup
+    if _warmup is not None:
+        await asyncio.gather(_warmup, return_exceptions=True)
+        _warmup = None
+    if _client is not None:
+        await _client.aclose()
+        _client = None
@@ -0,0 +1,357 @@
+"""
+Campaign image asset cache for Mode Popup Management System
+Fetched logo/main images are stored content-addressed on the data volume together with their
+decoded + resized derivatives. Stale entries are revalidated with If-None-Match/If-Modified-Since,
+and a stale copy keeps being served if the origin (usually imgur) is slow or down.
+Shared by every email renderer.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+import urllib.error
+import urllib.request
+from io import BytesIO
+from typing import Optional, Tuple
+
+from database import DB_PATH
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+    Image = None
+
+IMAGE_ASSET_DIR = os.getenv("IMAGE_ASSET_DIR", os.path.join(os.path.dirname(DB_PATH), "image_assets"))
+# Fresh for this long before revalidating with the origin
+IMAGE_ASSET_TTL = int(os.getenv("IMAGE_ASSET_TTL", str(6 * 3600)))
+# Entries nobody has used for this long are evicted
+IMAGE_ASSET_MAX_AGE = int(os.getenv("IMAGE_ASSET_MAX_AGE", str(14 * 24 * 3600)))
+IMAGE_ASSET_DISK_BYTES = int(os.getenv("IMAGE_ASSET_DISK_BYTES", str(256 * 1024 * 1024)))
+IMAGE_ASSET_MAX_DOWNLOAD = int(os.getenv("IMAGE_ASSET_MAX_DOWNLOAD", str(10 * 1024 * 1024)))
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", "10"))
+
+FETCH_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+    'Referer': 'https://imgur.com/',
+}
+
+FITS = ("stretch", "contain", "thumbnail")
+
+
+class ImageAssetError(Exception):
+    """Raised when an image cannot be fetched or decoded and no cached copy exists"""
+
+
+def normalize_image_url(url: str) -> str:
+    """Fix common imgur URL issues (page links instead of direct image links)"""
+    fixed_url = url.strip()
+    if "imgur.com/" in fixed_url:
+        if not fixed_url.startswith("https://i.imgur.com/"):
+            fixed_url = fixed_url.replace("imgur.com/", "i.imgur.com/")
+        if not fixed_url.endswith(('.jpg', '.png', '.gif', '.jpeg')):
+            fixed_url += '.jpg'
+    return fixed_url
+
+
+def _sha256(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class ImageAssetCache:
+    """url -> content hash records, content-addressed originals and derivatives on disk"""
+
+    def __init__(self, directory: str = IMAGE_ASSET_DIR):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._url_locks = {}
+        self._disk_used: Optional[int] = None
+        self.stats = {"fresh_hits": 0, "revalidated": 0, "fetched": 0, "stale_served": 0,
+                      "derivative_hits": 0, "derivatives_built": 0, "errors": 0, "evicted": 0}
+        try:
+            for sub in ("urls", "originals", "derived"):
+                os.makedirs(os.path.join(directory, sub), exist_ok=True)
+            self._disk_ok = True
+        except OSError as e:
+            print(f"⚠️ Image asset cache disabled ({directory}): {e}")
+            self._disk_ok = False
+
+    # -- paths -------------------------------------------------------------
+
+    def _record_path(self, url: str) -> str:
+        return os.path.join(self.directory, "urls", _sha256(url.encode("utf-8")) + ".json")
+
+    def _original_path(self, content_hash: str) -> str:
+        return os.path.join(self.directory, "originals", content_hash)
+
+    def _derived_path(self, content_hash: str, size: Tuple[int, int], fit: str, background: Optional[str]) -> str:
+        name = f"{content_hash}_{size[0]}x{size[1]}_{fit}_{background or 'none'}.png"
+        return os.path.join(self.directory, "derived", name)
+
+    def _url_lock(self, url: str) -> threading.Lock:
+        with self._lock:
+            lock = self._url_locks.get(url)
+            if lock is None:
+                lock = self._url_locks[url] = threading.Lock()
+            return lock
+
+    # -- disk helpers --------------------------------------------------------
+
+    def _write_atomic(self, path: str, data: bytes):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            if self._disk_used is not None:
+                self._disk_used += len(data)
+
+    def _maybe_prune(self):
+        """Called once an original + record (or a derivative) is fully written"""
+        with self._lock:
+            over_budget = self._disk_used is None or self._disk_used > IMAGE_ASSET_DISK_BYTES
+        if over_budget:
+            self.prune()
+
+    def _read_record(self, url: str) -> Optional[dict]:
+        try:
+            with open(self._record_path(url), "r") as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not os.path.exists(self._original_path(record.get("content_hash", ""))):
+            return None
+        return record
+
+    def _write_record(self, url: str, record: dict):
+        self._write_atomic(self._record_path(url), json.dumps(record).encode("utf-8"))
+
+    # -- fetching ------------------------------------------------------------
+
+    def _download(self, url: str, record: Optional[dict]):
+        """Returns (status, body, headers); status 304 means the cached copy is still valid"""
+        req = urllib.request.Request(url, headers=FETCH_HEADERS)
+        if record:
+            if record.get("etag"):
+                req.add_header("If-None-Match", record["etag"])
+            if record.get("last_modified"):
+                req.add_header("If-Modified-Since", record["last_modified"])
+        try:
+            with urllib.request.urlopen(req, timeout=IMAGE_FETCH_TIMEOUT) as response:
+                body = response.read(IMAGE_ASSET_MAX_DOWNLOAD + 1)
+                if len(body) > IMAGE_ASSET_MAX_DOWNLOAD:
+                    raise ImageAssetError(f"Image larger than {IMAGE_ASSET_MAX_DOWNLOAD} bytes: {url}")
+                return response.status, body, response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304:
+                return 304, b"", e.headers
+            raise
+
+    def fetch(self, url: str) -> Tuple[bytes, dict]:
+        """Original bytes for url plus its record (content_hash, source, ...)"""
+        if not url:
+            raise ImageAssetError("No image URL")
+        url = normalize_image_url(url)
+
+        with self._url_lock(url):
+            record = self._read_record(url) if self._disk_ok else None
+            now = time.time()
+            if record and now - record.get("validated_at", 0) < IMAGE_ASSET_TTL:
+                self.stats["fresh_hits"] += 1
+                return self._read_original(record), {**record, "source": "cache"}
+
+            try:
+                status, body, headers = self._download(url, record)
+            except Exception as e:
+                self.stats["errors"] += 1
+                if record:
+                    # Origin unavailable - keep rendering with the copy we have
+                    self.stats["stale_served"] += 1
+                    return self._read_original(record), {**record, "source": "stale", "error": str(e)}
+                raise ImageAssetError(f"Failed to load {url}: {e}")
+
+            if status == 304 and record:
+                self.stats["revalidated"] += 1
+                record["validated_at"] = now
+                record["used_at"] = now
+                self._write_record(url, record)
+                return self._read_original(record), {**record, "source": "revalidated"}
+            if status != 200:
+                self.stats["errors"] += 1
+                raise ImageAssetError(f"HTTP {status} for {url}")
+
+            self.stats["fetched"] += 1
+            content_hash = _sha256(body)
+            record = {
+                "url": url,
+                "content_hash": content_hash,
+                "bytes": len(body),
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "validated_at": now,
+                "used_at": now,
+            }
+            if self._disk_ok:
+                try:
+                    if not os.path.exists(self._original_path(content_hash)):
+                        self._write_atomic(self._original_path(content_hash), body)
+                    self._write_record(url, record)
+                except OSError as e:
+                    print(f"⚠️ Image asset cache write failed: {e}")
+                self._maybe_prune()
+            return body, {**record, "source": "network"}
+
+    def _read_original(self, record: dict) -> bytes:
+        path = self._original_path(record["content_hash"])
+        with open(path, "rb") as f:
+            return f.read()
+
+    # -- decoding / derivatives ----------------------------------------------
+
+    @staticmethod
+    def _to_rgb(image, background: Optional[str]):
+        if background and image.mode in ('RGBA', 'LA', 'P'):
+            # Composite transparency onto a solid background
+            image = image.convert('RGBA')
+            bg = Image.new('RGB', image.size, background)
+            bg.paste(image, mask=image.split()[3])
+            return bg
+        if image.mode != 'RGB':
+            return image.convert('RGB')
+        return image
+
+    @staticmethod
+    def _resize(image, size: Tuple[int, int], fit: str):
+        target_w, target_h = size
+        if fit == "stretch":
+            return image.resize((target_w, target_h), Image.Resampling.LANCZOS)
+        if fit == "thumbnail":
+            image = image.copy()
+            image.thumbnail((target_w, target_h), Image.Resampling.LANCZOS)
+            return image
+        # contain: scale up or down to fit inside size, keeping the aspect ratio
+        orig_w, orig_h = image.size
+        aspect_ratio = orig_w / orig_h
+        if aspect_ratio > target_w / target_h:
+            new_w, new_h = target_w, int(target_w / aspect_ratio)
+        else:
+            new_w, new_h = int(target_h * aspect_ratio), target_h
+        return image.resize((max(1, new_w), max(1, new_h)), Image.Resampling.LANCZOS)
+
+    def load_image(self, url: str, size: Optional[Tuple[int, int]] = None,
+                   fit: str = "stretch", background: Optional[str] = None):
+        """Decoded RGB PIL image for url, resized to size (cached derivative). Returns (image, info)."""
+        if not PIL_AVAILABLE:
+            raise ImageAssetError("PIL not available")
+        if fit not in FITS:
+            raise ValueError(f"Unknown fit: {fit}")
+
+        body, info = self.fetch(url)
+        content_hash = info["content_hash"]
+
+        if size is not None and self._disk_ok:
+            path = self._derived_path(content_hash, size, fit, background)
+            try:
+                with open(path, "rb") as f:
+                    derived = Image.open(BytesIO(f.read()))
+                    derived.load()
+                self.stats["derivative_hits"] += 1
+                return derived, {**info, "derivative": "cache", "size": derived.size}
+            except (OSError, ValueError):
+                pass
+
+        try:
+            image = Image.open(BytesIO(body))
+            original_size = image.size
+            image = self._to_rgb(image, background)
+        except Exception as e:
+            self.stats["errors"] += 1
+            raise ImageAssetError(f"Cannot decode {url}: {e}")
+        info = {**info, "original_size": original_size}
+        if size is None:
+            return image, info
+
+        image = self._resize(image, size, fit)
+        self.stats["derivatives_built"] += 1
+        if self._disk_ok:
+            try:
+                buffer = BytesIO()
+                image.save(buffer, format="PNG")
+                self._write_atomic(self._derived_path(content_hash, size, fit, background), buffer.getvalue())
+            except OSError as e:
+                print(f"⚠️ Image derivative write failed: {e}")
+            self._maybe_prune()
+        return image, {**info, "derivative": "built", "size": image.size}
+
+    # -- eviction --------------------------------------------------------------
+
+    def prune(self):
+        """Evict unused records (TTL) and unreferenced blobs, then enforce the byte budget"""
+        if not self._disk_ok:
+            return
+        now = time.time()
+        live_hashes = set()
+        for name in os.listdir(os.path.join(self.directory, "urls")):
+            path = os.path.join(self.directory, "urls", name)
+            try:
+                with open(path, "r") as f:
+                    record = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if now - record.get("used_at", record.get("validated_at", 0)) > IMAGE_ASSET_MAX_AGE:
+                self._remove(path)
+            else:
+                live_hashes.add(record.get("content_hash"))
+
+        blobs = []
+        total = 0
+        for sub in ("originals", "derived"):
+            folder = os.path.join(self.directory, sub)
+            for name in os.listdir(folder):
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(folder, name)
+                content_hash = name.split("_", 1)[0]
+                if content_hash not in live_hashes:
+                    self._remove(path)
+                    continue
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                blobs.append((st.st_atime, st.st_size, path))
+                total += st.st_size
+
+        if total > IMAGE_ASSET_DISK_BYTES:
+            # Derivatives are cheap to rebuild; sort them ahead of originals at equal age
+            for _, size, path in sorted(blobs, key=lambda b: (b[0], "originals" in b[2])):
+                self._remove(path)
+                total -= size
+                if total <= IMAGE_ASSET_DISK_BYTES * 0.9:
+                    break
+        with self._lock:
+            self._disk_used = total
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+            self.stats["evicted"] += 1
+        except OSError:
+            pass
+
+    def status(self) -> dict:
+        return {
+            "directory": self.directory if self._disk_ok else None,
+            "ttl_seconds": IMAGE_ASSET_TTL,
+            "disk_budget": IMAGE_ASSET_DISK_BYTES,
+            "disk_used": self._disk_used,
+            **self.stats,
+        }
+
+
+# Shared instance used by all email renderers
+image_assets = ImageAssetCache()
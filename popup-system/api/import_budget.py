@@ -0,0 +1,72 @@
+"""
+Import-time budget for the API process
+Runs `python -X importtime -c "import main"` in fresh interpreters and fails when the median
+cumulative import time of main exceeds IMPORT_BUDGET_MS, or when a module that should load
+lazily (PIL, httpx, the email/Tune/maintenance routers) is imported at startup.
+
+    cd popup-system/api && python import_budget.py
+"""
+
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+IMPORT_BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "900"))
+IMPORT_BUDGET_RUNS = int(os.getenv("IMPORT_BUDGET_RUNS", "5"))
+
+# Must not be imported by `import main` (see lazy_routes.py, fonts.py, http_client.py)
+LAZY_MODULES = (
+    "PIL", "httpx", "requests", "email_renderer", "image_assets",
+    "routes.email", "routes.tune", "routes.maintenance",
+)
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$")
+
+
+def measure() -> dict:
+    """One cold interpreter: {module: (self_us, cumulative_us, depth)}"""
+    api_dir = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=api_dir, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"❌ import main failed:\n{result.stderr[-2000:]}")
+    modules = {}
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), len(indent) // 2)
+    return modules
+
+
+def main() -> int:
+    runs = [measure() for _ in range(IMPORT_BUDGET_RUNS)]
+    totals = [run["main"][1] / 1000 for run in runs]
+    median_ms = statistics.median(totals)
+    last = runs[-1]
+
+    print(f"import main: median {median_ms:.0f} ms over {len(totals)} runs "
+          f"(min {min(totals):.0f}, max {max(totals):.0f}, budget {IMPORT_BUDGET_MS:.0f})")
+    top_level = sorted(((cum, name) for name, (_, cum, depth) in last.items() if depth == 1), reverse=True)
+    for cumulative_us, name in top_level[:10]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    failures = []
+    eager = [name for name in LAZY_MODULES if name in last]
+    if eager:
+        failures.append(f"imported at startup but should load lazily: {', '.join(eager)}")
+    if median_ms > IMPORT_BUDGET_MS:
+        failures.append(f"median {median_ms:.0f} ms exceeds the {IMPORT_BUDGET_MS:.0f} ms budget")
+    for failure in failures:
+        print(f"❌ {failure}")
+    if not failures:
+        print("✅ Import-time budget OK")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,249 @@
+"""
+Event ingestion pipeline for Mode Popup Management System
+/api/impression and /api/click enqueue rows; a background writer flushes them in batches
+with executemany inside one transaction, off the event loop.
+"""
+
+import asyncio
+import os
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional, Sequence
+
+from database import db_connection
+from worker_locks import writer_lock
+
+# Flush when this many events are buffered...
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "250"))
+# ...or when the oldest buffered event is this old
+INGEST_FLUSH_INTERVAL_MS = int(os.getenv("INGEST_FLUSH_INTERVAL_MS", "200"))
+# Bounded buffer - when full, handlers wait briefly and then shed load
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "20000"))
+INGEST_ENQUEUE_TIMEOUT_MS = int(os.getenv("INGEST_ENQUEUE_TIMEOUT_MS", "50"))
+# 'buffered': acknowledge once queued (an app crash can lose one flush window)
+# 'sync': acknowledge only after the batch containing the event has committed (group commit)
+INGEST_DURABILITY = os.getenv("INGEST_DURABILITY", "buffered").lower()
+INGEST_MAX_RETRIES = 3
+
+IMPRESSION_COLUMNS = (
+    "campaign_id", "property_code", "session_id", "placement",
+    "user_agent", "timestamp", "ip_hash", "source", "subsource",
+    "utm_campaign", "referrer", "landing_page", "ts_epoch",
+)
+
+CLICK_COLUMNS = (
+    "campaign_id", "property_code", "session_id", "placement",
+    "user_agent", "timestamp", "ip_hash", "revenue_estimate",
+    "source", "subsource", "utm_campaign", "referrer", "landing_page", "ts_epoch",
+)
+
+EVENT_TABLES = {
+    "impression": ("impressions", IMPRESSION_COLUMNS),
+    "click": ("clicks", CLICK_COLUMNS),
+}
+
+
+def _insert_sql(table: str, columns: Sequence[str]) -> str:
+    placeholders = ", ".join("?" for _ in columns)
+    return f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+
+
+class IngestQueueFull(Exception):
+    """Raised when the ingestion buffer stays full past the enqueue timeout"""
+
+
+class EventIngestor:
+    """Bounded in-memory queue plus a single background writer"""
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        # One writer thread keeps SQLite writes serialized and off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ingest-writer")
+        self._batch_hooks: List[Callable] = []
+        self.metrics = {
+            "enqueued": 0,
+            "written": 0,
+            "dropped": 0,
+            "failed": 0,
+            "flushes": 0,
+            "retries": 0,
+            "largest_batch": 0,
+            "last_flush_ms": 0.0,
+            "queue_high_water": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def register_batch_hook(self, hook: Callable):
+        """hook(conn, rows_by_kind) runs inside the flush transaction after the inserts"""
+        if hook not in self._batch_hooks:
+            self._batch_hooks.append(hook)
+
+    async def start(self):
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=INGEST_QUEUE_SIZE)
+        self._task = asyncio.create_task(self._run(), name="event-ingestor")
+        print(f"✅ Event ingestion started (batch={INGEST_BATCH_SIZE}, interval={INGEST_FLUSH_INTERVAL_MS}ms, durability={INGEST_DURABILITY})")
+
+    async def stop(self):
+        """Drain everything still buffered, then stop the writer"""
+        if not self.running:
+            return
+        await self.queue.put(None)  # sentinel: flush and exit
+        await self._task
+        self._task = None
+        print(f"✅ Event ingestion drained ({self.metrics['written']} events written)")
+
+    async def submit(self, kind: str, row: tuple):
+        """Queue one event row. Raises IngestQueueFull when shedding load."""
+        if kind not in EVENT_TABLES:
+            raise ValueError(f"Unknown event kind: {kind}")
+
+        loop = asyncio.get_running_loop()
+        if not self.running:
+            # Pipeline not started (e.g. scripts/tests) - write straight through the writer thread
+            await loop.run_in_executor(self._executor, self._write_batch, [(kind, row, None)])
+            return
+
+        done = loop.create_future() if INGEST_DURABILITY == "sync" else None
+        item = (kind, row, done)
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.queue.put(item), timeout=INGEST_ENQUEUE_TIMEOUT_MS / 1000)
+            except asyncio.TimeoutError:
+                self.metrics["dropped"] += 1
+                raise IngestQueueFull("Event ingestion queue is full")
+
+        self.metrics["enqueued"] += 1
+        depth = self.queue.qsize()
+        if depth > self.metrics["queue_high_water"]:
+            self.metrics["queue_high_water"] = depth
+        if done is not None:
+            await done
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        interval = INGEST_FLUSH_INTERVAL_MS / 1000
+        stopping = False
+        while not stopping:
+            item = await self.queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + interval
+            while len(batch) < INGEST_BATCH_SIZE:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), timeout=timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+        # Drain whatever arrived behind the sentinel
+        remaining = []
+        while not self.queue.empty():
+            item = self.queue.get_nowait()
+            if item is not None:
+                remaining.append(item)
+        for start in range(0, len(remaining), INGEST_BATCH_SIZE):
+            await self._flush(remaining[start:start + INGEST_BATCH_SIZE])
+
+    async def _flush(self, batch):
+        loop = asyncio.get_running_loop()
+        error = None
+        errors = {}  # batch index -> error, for rows rejected individually
+        for attempt in range(INGEST_MAX_RETRIES):
+            try:
+                await loop.run_in_executor(self._executor, self._write_batch, batch)
+                error = None
+                break
+            except (sqlite3.IntegrityError, sqlite3.InterfaceError) as e:
+                # A bad row, not a transient failure: retrying the same batch can't help, so
+                # write row by row and drop only the rows the database rejects
+                print(f"⚠️ Event batch rejected ({e}), writing {len(batch)} events individually")
+                errors = await loop.run_in_executor(self._executor, self._write_rows, batch)
+                error = None
+                break
+            except Exception as e:
+                error = e
+                self.metrics["retries"] += 1
+                await asyncio.sleep(0.05 * (attempt + 1))
+
+        if error is not None:
+            self.metrics["failed"] += len(batch)
+            print(f"❌ Event ingestion flush failed ({len(batch)} events): {error}")
+        elif errors:
+            self.metrics["failed"] += len(errors)
+            print(f"❌ Dropped {len(errors)} of {len(batch)} events: {next(iter(errors.values()))}")
+
+        for i, (_, _, done) in enumerate(batch):
+            if done is not None and not done.done():
+                row_error = error or errors.get(i)
+                if row_error is None:
+                    done.set_result(True)
+                else:
+                    done.set_exception(row_error)
+
+    def _write_rows(self, batch) -> dict:
+        """Runs on the writer thread: one transaction per event; returns {batch index: error} for rejected rows"""
+        errors = {}
+        for i, item in enumerate(batch):
+            try:
+                self._write_batch([item])
+            except sqlite3.Error as e:
+                errors[i] = e
+        return errors
+
+    def _write_batch(self, batch):
+        """Runs on the writer thread: one transaction per batch"""
+        started = time.perf_counter()
+        rows_by_kind = {kind: [] for kind in EVENT_TABLES}
+        for kind, row, _ in batch:
+            rows_by_kind[kind].append(row)
+
+        # Other workers' writers queue on the same lock rather than spinning on busy_timeout
+        with writer_lock.hold(), db_connection() as conn:
+            try:
+                for kind, rows in rows_by_kind.items():
+                    if rows:
+                        table, columns = EVENT_TABLES[kind]
+                        conn.executemany(_insert_sql(table, columns), rows)
+                for hook in self._batch_hooks:
+                    hook(conn, rows_by_kind)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        self.metrics["written"] += len(batch)
+        self.metrics["flushes"] += 1
+        self.metrics["largest_batch"] = max(self.metrics["largest_batch"], len(batch))
+        self.metrics["last_flush_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "durability": INGEST_DURABILITY,
+            "batch_size": INGEST_BATCH_SIZE,
+            "flush_interval_ms": INGEST_FLUSH_INTERVAL_MS,
+            "queue_capacity": INGEST_QUEUE_SIZE,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            **self.metrics,
+        }
+
+
+# Shared instance started/stopped by main.py
+ingestor = EventIngestor()
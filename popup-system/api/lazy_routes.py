@@ -0,0 +1,91 @@
+"""
+Lazily imported routers for Mode Popup Management System
+Heavy, rarely used route modules (PIL email rendering, the Tune/HasOffers reports, maintenance
+endpoints) are not imported at startup. A placeholder route sits where the router would have been
+included; the first request under one of its path prefixes imports the module and swaps the
+router's routes in at that position, so matching order is exactly as if it had been included eagerly.
+"""
+
+import importlib
+import threading
+import time
+from typing import Dict, Optional, Sequence, Tuple
+
+from fastapi import APIRouter, FastAPI
+from starlette.routing import BaseRoute, Match, NoMatchFound
+from starlette.types import Receive, Scope, Send
+
+# module -> import time in ms, for /api/startup-status
+loaded_modules: Dict[str, float] = {}
+
+
+class LazyRouter(BaseRoute):
+    """Stands in for `app.include_router(module.router, prefix=..., tags=...)` until first use"""
+
+    def __init__(self, app: FastAPI, module: str, path_prefixes: Sequence[str], prefix: str = "", tags: Optional[list] = None):
+        self.app = app
+        self.module = module
+        self.path_prefixes: Tuple[str, ...] = tuple(path_prefixes)
+        self.prefix = prefix
+        self.tags = tags or []
+        self._routes: Optional[list] = None
+        self._lock = threading.Lock()
+
+    def load(self) -> list:
+        """Import the module and replace this placeholder with its routes (idempotent)"""
+        if self._routes is not None:
+            return self._routes
+        with self._lock:
+            if self._routes is None:
+                started = time.perf_counter()
+                router = APIRouter()
+                router.include_router(importlib.import_module(self.module).router, prefix=self.prefix, tags=self.tags)
+                routes = self.app.router.routes
+                if self in routes:
+                    index = routes.index(self)
+                    routes[index:index + 1] = router.routes
+                self.app.openapi_schema = None  # regenerate /docs with the new routes
+                self._routes = router.routes
+                loaded_modules[self.module] = round((time.perf_counter() - started) * 1000, 1)
+                print(f"📦 Loaded {self.module} routes on first use ({loaded_modules[self.module]} ms)")
+        return self._routes
+
+    def _match(self, scope: Scope) -> Tuple[Match, dict, Optional[BaseRoute]]:
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefixes):
+            return Match.NONE, {}, None
+        partial = None
+        for route in self.load():
+            match, child_scope = route.matches(scope)
+            if match == Match.FULL:
+                return match, child_scope, route
+            if match == Match.PARTIAL and partial is None:
+                partial = (match, child_scope, route)
+        return partial or (Match.NONE, {}, None)
+
+    def matches(self, scope: Scope) -> Tuple[Match, dict]:
+        match, child_scope, _ = self._match(scope)
+        return match, child_scope
+
+    async def handle(self, scope: Scope, receive: Receive, send: Send) -> None:
+        # Only reached on the request that triggered the load; later ones hit the real routes
+        _, _, route = self._match(scope)
+        await route.handle(scope, receive, send)
+
+    def url_path_for(self, name: str, **path_params):
+        for route in self.load():
+            try:
+                return route.url_path_for(name, **path_params)
+            except NoMatchFound:
+                pass
+        raise NoMatchFound(name, path_params)
+
+
+def include_lazy_router(app: FastAPI, module: str, path_prefixes: Sequence[str], prefix: str = "", tags: Optional[list] = None) -> LazyRouter:
+    """Lazy counterpart of app.include_router; path_prefixes must cover every path the router serves"""
+    placeholder = LazyRouter(app, module, path_prefixes, prefix=prefix, tags=tags)
+    app.router.routes.append(placeholder)
+    return placeholder
+
+
+def status() -> dict:
+    return {"loaded": dict(loaded_modules)}
@@ -0,0 +1,304 @@
+"""
+Versioned schema migrations for Mode Popup Management System
+Ordered steps recorded in schema_version; init_db() applies only the ones a database has not
+seen, so a current database boots with a single SELECT. Every step is idempotent (IF NOT EXISTS,
+column checks) because databases created before versioning enter at version 0 and replay them all.
+"""
+
+import time
+from typing import Callable, Dict, List, NamedTuple
+
+from database import EPOCH_FROM_TIMESTAMP_SQL, EVENT_TABLES, backfill_event_epochs, db_connection
+
+DEFAULT_PROPERTIES = (
+    ("mff", "ModeFreeFinds", "modefreefinds.com"),
+    ("mmm", "ModeMarketMunchies", "modemarketmunchies.com"),
+    ("mcad", "ModeClassActionsDaily", "modeclassactionsdaily.com"),
+    ("mmd", "ModeMobileDaily", "modemobiledaily.com"),
+)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable
+    # False for long data steps that commit in batches themselves (must still be re-runnable)
+    transactional: bool = True
+
+
+def _add_columns(conn, table: str, columns: Dict[str, str]) -> List[str]:
+    """ALTER TABLE ADD COLUMN for each missing column; returns the ones added"""
+    existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+    added = []
+    for column, column_type in columns.items():
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+            print(f"✅ Added {column} to {table} table")
+            added.append(column)
+    return added
+
+
+def _core_tables(conn):
+    # Create campaigns table with dual image support
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS campaigns (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            tune_url TEXT NOT NULL,
+            logo_url TEXT NOT NULL,           -- For top-left circle
+            main_image_url TEXT NOT NULL,     -- For main offer display
+            description TEXT,                 -- Optional campaign description
+            cta_text TEXT DEFAULT 'View Offer', -- Customizable button text
+            active BOOLEAN DEFAULT true,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    # Columns added after launch. NULL default for updated_at because SQLite doesn't support
+    # non-constant defaults in ALTER TABLE; existing rows are backfilled instead.
+    added = _add_columns(conn, "campaigns", {
+        "cta_text": "TEXT DEFAULT 'View Offer'",
+        "offer_id": "TEXT",                  # Tune impression pixel
+        "aff_id": "TEXT",
+        "featured": "BOOLEAN DEFAULT false",
+        "updated_at": "TIMESTAMP DEFAULT NULL",
+    })
+    if "updated_at" in added:
+        conn.execute("UPDATE campaigns SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
+
+    # Create properties table for multi-domain support
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS properties (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,       -- 'mff', 'mmm', 'mcad', 'mmd'
+            name TEXT NOT NULL,              -- 'ModeFreeFinds', etc.
+            domain TEXT,                     -- e.g., 'modefreefinds.com'
+            active BOOLEAN DEFAULT true,
+            popup_enabled BOOLEAN DEFAULT true,
+            popup_frequency TEXT DEFAULT 'session',   -- 'session', 'daily', 'always'
+            popup_placement TEXT DEFAULT 'thankyou',  -- 'thankyou', 'exit-intent'
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    added = _add_columns(conn, "properties", {
+        "updated_at": "TIMESTAMP DEFAULT NULL",
+        "featured_campaign_id": "INTEGER",   # property-specific featured campaign
+    })
+    if "updated_at" in added:
+        conn.execute("UPDATE properties SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL")
+
+    # Create campaign_properties table for property-specific settings
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS campaign_properties (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            campaign_id INTEGER NOT NULL,
+            property_code TEXT NOT NULL,      -- 'mff', 'mmm', 'mcad', 'mmd'
+            visibility_percentage INTEGER DEFAULT 100,  -- 0-100%
+            active BOOLEAN DEFAULT true,
+            impression_cap_daily INTEGER NULL, -- Daily impression cap (EST)
+            click_cap_daily INTEGER NULL,      -- Daily click cap (EST)
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE,
+            UNIQUE(campaign_id, property_code)  -- One setting per campaign per property
+        )
+    """)
+    _add_columns(conn, "campaign_properties", {
+        "impression_cap_daily": "INTEGER",
+        "click_cap_daily": "INTEGER",
+    })
+
+    # Seed/update default properties (upsert by code)
+    for code, name, domain in DEFAULT_PROPERTIES:
+        conn.execute("""
+            INSERT INTO properties (code, name, domain, active, popup_enabled)
+            VALUES (?, ?, ?, 1, 1)
+            ON CONFLICT(code) DO UPDATE SET
+                name = excluded.name,
+                domain = excluded.domain,
+                updated_at = CURRENT_TIMESTAMP
+        """, (code, name, domain))
+
+
+def _event_tables(conn):
+    # Create comprehensive impressions tracking table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS impressions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            campaign_id INTEGER NOT NULL,
+            property_code TEXT NOT NULL,
+            session_id TEXT,
+            placement TEXT DEFAULT 'thankyou',
+            user_agent TEXT,
+            ip_hash INTEGER,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE
+        )
+    """)
+    # Create clicks tracking table
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS clicks (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            campaign_id INTEGER NOT NULL,
+            property_code TEXT NOT NULL,
+            session_id TEXT,
+            placement TEXT DEFAULT 'thankyou',
+            user_agent TEXT,
+            ip_hash INTEGER,
+            revenue_estimate DECIMAL(10,2) DEFAULT 0.45,
+            conversion_tracked BOOLEAN DEFAULT false,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE
+        )
+    """)
+    # Source/subsource tracking fields for Phase 2 attribution
+    tracking_columns = {column: "TEXT" for column in ("source", "subsource", "utm_campaign", "referrer", "landing_page")}
+    _add_columns(conn, "impressions", tracking_columns)
+    _add_columns(conn, "clicks", tracking_columns)
+
+    # Create conversions table for future Tune webhook integration
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conversions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            campaign_id INTEGER NOT NULL,
+            property_code TEXT NOT NULL,
+            session_id TEXT,
+            conversion_value DECIMAL(10,2) DEFAULT 0.45,
+            timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            source TEXT,
+            subsource TEXT,
+            utm_campaign TEXT,
+            referrer TEXT,
+            landing_page TEXT,
+            tune_conversion_id TEXT,  -- Tune's conversion ID from webhook
+            FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE
+        )
+    """)
+
+
+def _reporting_columns(conn):
+    # Mike's Tune-style reporting columns
+    _add_columns(conn, "campaigns", {
+        "partner_name": "TEXT",                         # For Partner column in reports
+        "advertiser_name": "TEXT",                      # For Advertiser column in reports
+        "payout_amount": "DECIMAL(10,2) DEFAULT 0.45",  # For Payout column
+        "creative_file": "TEXT",                        # For Creative column (filename)
+    })
+
+
+def _catalog_indexes(conn):
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_campaign_active ON campaigns(active)")
+    # Property eligibility: every column get_active_campaigns_for_property reads from
+    # campaign_properties is in the index, so the lookup never touches the table
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_campaign_properties_eligible ON campaign_properties(
+            property_code, active, campaign_id, visibility_percentage, impression_cap_daily, click_cap_daily
+        )
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_property_active")  # prefix of the index above
+
+
+def _rollup_tables(conn):
+    # Incrementally maintained aggregates (see rollups.py)
+    from rollups import create_tables
+    create_tables(conn)
+
+
+def _event_epoch(conn):
+    # Integer event time (UTC epoch seconds). The text timestamp column mixes client ISO strings
+    # ('T' separator, offsets) with CURRENT_TIMESTAMP, so it can't be range-compared or indexed
+    # reliably; ts_epoch is what every time filter reads. 0 marks an unparseable legacy timestamp.
+    for table in EVENT_TABLES:
+        _add_columns(conn, table, {"ts_epoch": "INTEGER"})
+        # Inserts that don't supply ts_epoch (legacy endpoints, CURRENT_TIMESTAMP defaults) get it here
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_ts_epoch AFTER INSERT ON {table}
+            WHEN NEW.ts_epoch IS NULL
+            BEGIN
+                UPDATE {table} SET ts_epoch = {EPOCH_FROM_TIMESTAMP_SQL} WHERE id = NEW.id;
+            END
+        """)
+
+    # Time-range indexes on ts_epoch replace the text-timestamp ones (nothing filters on timestamp now)
+    for index in ("idx_impressions_date", "idx_impressions_campaign", "idx_clicks_date",
+                  "idx_clicks_campaign", "idx_property_stats", "idx_conversions_campaign",
+                  "idx_conversions_property"):
+        conn.execute(f"DROP INDEX IF EXISTS {index}")
+    for table in ("impressions", "clicks"):
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_time ON {table}(ts_epoch)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_campaign_time ON {table}(campaign_id, ts_epoch)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_property_time ON {table}(property_code, ts_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_conversions_campaign_time ON conversions(campaign_id, ts_epoch)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_conversions_property_time ON conversions(property_code, ts_epoch)")
+
+
+def _event_epoch_backfill(conn):
+    # Rows written before ts_epoch existed; batched commits keep the write lock short
+    backfill_event_epochs()
+
+
+def _partition_tables(conn):
+    # Registry of event months compacted into archive files (see partitions.py)
+    from partitions import create_tables
+    create_tables(conn)
+
+
+MIGRATIONS = (
+    Migration(1, "core tables and default properties", _core_tables),
+    Migration(2, "event tables with attribution columns", _event_tables),
+    Migration(3, "reporting columns on campaigns", _reporting_columns),
+    Migration(4, "catalog indexes", _catalog_indexes),
+    Migration(5, "rollup tables", _rollup_tables),
+    Migration(6, "ts_epoch columns, triggers and time indexes", _event_epoch),
+    Migration(7, "ts_epoch backfill", _event_epoch_backfill, transactional=False),
+    Migration(8, "event partition registry", _partition_tables),
+)
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(conn) -> int:
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duration_ms REAL
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version").fetchone()[0]
+
+
+def migrate() -> List[int]:
+    """Apply pending migrations in order, each in its own transaction; returns the versions applied"""
+    applied = []
+    with db_connection() as conn:
+        version = current_version(conn)
+        for migration in MIGRATIONS:
+            if migration.version <= version:
+                continue
+            started = time.perf_counter()
+            try:
+                if migration.transactional:
+                    conn.execute("BEGIN IMMEDIATE")
+                migration.apply(conn)
+                conn.execute(
+                    "INSERT INTO schema_version (version, name, duration_ms) VALUES (?, ?, ?)",
+                    (migration.version, migration.name, round((time.perf_counter() - started) * 1000, 1)),
+                )
+                conn.commit()
+            except Exception:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+            print(f"✅ Migration {migration.version} applied: {migration.name}")
+            applied.append(migration.version)
+    return applied
+
+
+def status() -> dict:
+    with db_connection() as conn:
+        rows = conn.execute("SELECT version, name, applied_at, duration_ms FROM schema_version ORDER BY version").fetchall()
+    return {
+        "version": rows[-1][0] if rows else 0,
+        "latest": LATEST_VERSION,
+        "applied": [dict(row) for row in rows],
+    }
@@ -0,0 +1,324 @@
+"""
+Time-partitioned event storage for Mode Popup Management System
+The impressions/clicks tables in the main database are the hot partition and take every write.
+Whole UTC months older than EVENT_HOT_DAYS are compacted out of them into one SQLite file per
+month (gzip-compressed) under the archive directory, so the hot tables and every scan of them
+stay bounded. Raw-row analytics that reach past the hot window read the hot table plus each
+archived month through event_sources(); aggregated history stays in the hourly rollup.
+"""
+
+import asyncio
+import gzip
+import os
+import shutil
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import DB_PATH, db_connection
+from worker_locks import compaction_lock, writer_lock
+
+# Raw events newer than this stay in the main database (compaction moves whole months only)
+EVENT_HOT_DAYS = int(os.getenv("EVENT_HOT_DAYS", "90"))
+# How often the background compaction runs; 0 disables it (POST /api/events/compact still works)
+EVENT_COMPACTION_INTERVAL_HOURS = float(os.getenv("EVENT_COMPACTION_INTERVAL_HOURS", "24"))
+# Rows moved per committed step (keeps the write lock short for the ingestion writer)
+EVENT_COMPACTION_BATCH_SIZE = int(os.getenv("EVENT_COMPACTION_BATCH_SIZE", "5000"))
+EVENT_ARCHIVE_DIR = os.getenv("EVENT_ARCHIVE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(DB_PATH)), "event_archive"
+)
+# Decompressed months kept on disk for repeat reads
+EVENT_ARCHIVE_CACHE_FILES = int(os.getenv("EVENT_ARCHIVE_CACHE_FILES", "3"))
+
+PARTITIONED_TABLES = ("impressions", "clicks")
+
+
+def month_key(epoch: int) -> str:
+    """UTC 'YYYY-MM' partition containing an epoch second"""
+    return datetime.fromtimestamp(epoch, timezone.utc).strftime("%Y-%m")
+
+
+def month_bounds(month: str) -> Tuple[int, int]:
+    """[start, end) epoch seconds of a 'YYYY-MM' partition"""
+    start = datetime.strptime(month, "%Y-%m").replace(tzinfo=timezone.utc)
+    end = start.replace(year=start.year + start.month // 12, month=start.month % 12 + 1)
+    return int(start.timestamp()), int(end.timestamp())
+
+
+def _copy_file(src: str, dest: str, opener_in=open, opener_out=open):
+    tmp = dest + ".tmp"
+    with opener_in(src, "rb") as f_in, opener_out(tmp, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+    os.replace(tmp, dest)
+
+
+def create_tables(conn):
+    """Archived partition registry (called from init_db)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS event_partitions (
+            month TEXT PRIMARY KEY,           -- 'YYYY-MM' (UTC, by ts_epoch)
+            start_epoch INTEGER NOT NULL,
+            end_epoch INTEGER NOT NULL,
+            impressions INTEGER NOT NULL DEFAULT 0,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            archived_at REAL
+        )
+    """)
+
+
+class EventPartitions:
+    """Compaction of old months into archive files, plus the hot + archive reader"""
+
+    def __init__(self, archive_dir: str = EVENT_ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        self._cache_lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            "runs": 0, "months_archived": 0, "rows_archived": 0, "archive_reads": 0,
+            "last_run_at": None, "last_run_ms": 0.0, "last_error": None,
+        }
+
+    # -- paths -----------------------------------------------------------------
+
+    def _archive_path(self, month: str) -> str:
+        return os.path.join(self.archive_dir, f"events-{month}.db.gz")
+
+    def _work_path(self, month: str) -> str:
+        return os.path.join(self.archive_dir, f"events-{month}.db")
+
+    def _cache_path(self, month: str) -> str:
+        return os.path.join(self.archive_dir, "cache", f"events-{month}.db")
+
+    def hot_horizon(self, now: Optional[float] = None) -> int:
+        """Epoch start of the oldest month kept hot; everything before it is compactable"""
+        cutoff = int(now if now is not None else time.time()) - EVENT_HOT_DAYS * 86400
+        return month_bounds(month_key(cutoff))[0]
+
+    # -- compaction ------------------------------------------------------------
+
+    def compact(self, now: Optional[float] = None) -> dict:
+        """Move every whole month older than the hot window into its archive file.
+        Only rows already folded into the rollups are moved, so aggregates never lose events.
+        Skipped when another worker process is already compacting."""
+        started = time.perf_counter()
+        horizon = self.hot_horizon(now)
+        hot_since = datetime.fromtimestamp(horizon, timezone.utc).strftime("%Y-%m-%d")
+        if not compaction_lock.acquire(blocking=False):
+            return {"hot_since": hot_since, "rows_archived": 0, "months": {}, "skipped": "compaction running elsewhere"}
+        archived: Dict[str, List[int]] = {}
+        try:
+            self._compact_months(horizon, archived)
+        finally:
+            compaction_lock.release()
+
+        rows = sum(sum(moved) for moved in archived.values())
+        self.stats["runs"] += 1
+        self.stats["months_archived"] += len(archived)
+        self.stats["rows_archived"] += rows
+        self.stats["last_run_at"] = time.time()
+        self.stats["last_run_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return {
+            "hot_since": hot_since,
+            "rows_archived": rows,
+            "months": {month: dict(zip(PARTITIONED_TABLES, moved)) for month, moved in sorted(archived.items())},
+        }
+
+    def _compact_months(self, horizon: int, archived: Dict[str, List[int]]):
+        from rollups import folded_through
+
+        with db_connection() as conn:
+            id_limits = dict(zip(PARTITIONED_TABLES, folded_through(conn)))
+            while True:
+                oldest = [
+                    conn.execute(
+                        f"SELECT MIN(ts_epoch) FROM {table} WHERE ts_epoch < ? AND id <= ?",
+                        (horizon, id_limits[table]),
+                    ).fetchone()[0]
+                    for table in PARTITIONED_TABLES
+                ]
+                oldest = [epoch for epoch in oldest if epoch is not None]
+                if not oldest:
+                    break
+                month = month_key(min(oldest))
+                moved = self._compact_month(conn, month, id_limits)
+                archived[month] = [a + b for a, b in zip(archived.get(month, [0, 0]), moved)]
+            if archived:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _compact_month(self, conn, month: str, id_limits: Dict[str, int]) -> List[int]:
+        start, end = month_bounds(month)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        work, archive = self._work_path(month), self._archive_path(month)
+        if os.path.exists(archive) and not os.path.exists(work):
+            _copy_file(archive, work, opener_in=gzip.open)  # late rows for an archived month: append
+
+        moved = []
+        conn.execute("ATTACH DATABASE ? AS part", (work,))
+        try:
+            for table in PARTITIONED_TABLES:
+                columns = self._ensure_partition_table(conn, table)
+                column_list = ", ".join(columns)
+                count = 0
+                while True:
+                    ids = [row[0] for row in conn.execute(
+                        f"SELECT id FROM main.{table} WHERE ts_epoch >= ? AND ts_epoch < ? AND id <= ? LIMIT ?",
+                        (start, end, id_limits[table], EVENT_COMPACTION_BATCH_SIZE),
+                    ).fetchall()]
+                    if not ids:
+                        break
+                    marks = ", ".join("?" for _ in ids)
+                    with writer_lock.hold():
+                        # Two commits: SQLite doesn't make one commit atomic across a WAL main database
+                        # and an attached file, so the archive copy must be durable before the delete.
+                        # Keyed on the original id, so a step interrupted between them re-runs cleanly.
+                        conn.execute(
+                            f"INSERT OR IGNORE INTO part.{table} ({column_list}) "
+                            f"SELECT {column_list} FROM main.{table} WHERE id IN ({marks})", ids,
+                        )
+                        conn.commit()
+                        conn.execute(f"DELETE FROM main.{table} WHERE id IN ({marks})", ids)
+                        conn.commit()
+                    count += len(ids)
+                moved.append(count)
+            totals = [conn.execute(f"SELECT COUNT(*) FROM part.{table}").fetchone()[0] for table in PARTITIONED_TABLES]
+        finally:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.execute("DETACH DATABASE part")
+
+        _copy_file(work, archive, opener_out=lambda path, mode: gzip.open(path, mode, compresslevel=6))
+        os.remove(work)
+        with self._cache_lock:
+            if os.path.exists(self._cache_path(month)):
+                os.remove(self._cache_path(month))
+
+        with writer_lock.hold():
+            conn.execute("""
+                INSERT INTO event_partitions (month, start_epoch, end_epoch, impressions, clicks, bytes, archived_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(month) DO UPDATE SET
+                    impressions = excluded.impressions,
+                    clicks = excluded.clicks,
+                    bytes = excluded.bytes,
+                    archived_at = excluded.archived_at
+            """, (month, start, end, totals[0], totals[1], os.path.getsize(archive), time.time()))
+            conn.commit()
+        print(f"🗄️ Archived {month}: {moved[0]} impressions, {moved[1]} clicks -> {os.path.basename(archive)}")
+        return moved
+
+    def _ensure_partition_table(self, conn, table: str) -> List[str]:
+        """Create/extend part.<table> with the hot table's columns; returns the column names"""
+        info = [(row[1], row[2]) for row in conn.execute(f"PRAGMA main.table_info({table})").fetchall()]
+        existing = {row[1] for row in conn.execute(f"PRAGMA part.table_info({table})").fetchall()}
+        if not existing:
+            definitions = ", ".join(
+                "id INTEGER PRIMARY KEY" if name == "id" else f"{name} {column_type}".strip()
+                for name, column_type in info
+            )
+            conn.execute(f"CREATE TABLE part.{table} ({definitions})")
+            conn.execute(f"CREATE INDEX part.idx_{table}_time ON {table}(ts_epoch)")
+        else:
+            for name, column_type in info:
+                if name not in existing:
+                    conn.execute(f"ALTER TABLE part.{table} ADD COLUMN {name} {column_type}")
+        return [name for name, _ in info]
+
+    # -- reading ---------------------------------------------------------------
+
+    def archived_months(self, conn, start_epoch: Optional[int] = None, end_epoch: Optional[int] = None) -> List[str]:
+        rows = conn.execute("""
+            SELECT month FROM event_partitions
+            WHERE (? IS NULL OR end_epoch > ?) AND (? IS NULL OR start_epoch < ?)
+            ORDER BY month
+        """, (start_epoch, start_epoch, end_epoch, end_epoch)).fetchall()
+        return [row[0] for row in rows]
+
+    def _readable_path(self, month: str) -> str:
+        """Decompressed copy of an archived month, kept for the next read (LRU by mtime)"""
+        cached = self._cache_path(month)
+        with self._cache_lock:
+            if os.path.exists(cached):
+                os.utime(cached)
+                return cached
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            _copy_file(self._archive_path(month), cached, opener_in=gzip.open)
+            self.stats["archive_reads"] += 1
+            others = sorted(
+                (os.path.join(os.path.dirname(cached), name) for name in os.listdir(os.path.dirname(cached))
+                 if name.endswith(".db") and name != os.path.basename(cached)),
+                key=os.path.getmtime,
+            )
+            for path in others[:max(0, len(others) - (EVENT_ARCHIVE_CACHE_FILES - 1))]:
+                os.remove(path)
+            return cached
+
+    def event_sources(self, conn, table: str, start_epoch: Optional[int] = None,
+                      end_epoch: Optional[int] = None) -> Iterator[str]:
+        """Union reader: yields 'main.<table>' and then '<alias>.<table>' for each archived month
+        overlapping [start_epoch, end_epoch), attached one at a time. Callers run the same query
+        against every source and merge the results (counts and sums add across months)."""
+        months = self.archived_months(conn, start_epoch, end_epoch)
+        yield f"main.{table}"
+        for month in months:
+            try:
+                path = self._readable_path(month)
+            except FileNotFoundError:
+                print(f"⚠️ Archive for {month} is missing from {self.archive_dir}")
+                continue
+            alias = "archive_" + month.replace("-", "_")
+            conn.execute("ATTACH DATABASE ? AS " + alias, (path,))
+            try:
+                yield f"{alias}.{table}"
+            finally:
+                conn.execute(f"DETACH DATABASE {alias}")
+
+    # -- background job --------------------------------------------------------
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running or EVENT_COMPACTION_INTERVAL_HOURS <= 0:
+            return
+        self._task = asyncio.create_task(self._run(), name="event-compaction")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                result = await loop.run_in_executor(None, self.compact)
+                self.stats["last_error"] = None
+                if result["rows_archived"]:
+                    print(f"✅ Event compaction archived {result['rows_archived']} rows (hot since {result['hot_since']})")
+            except Exception as e:
+                self.stats["last_error"] = str(e)
+                print(f"⚠️ Event compaction failed: {e}")
+            await asyncio.sleep(EVENT_COMPACTION_INTERVAL_HOURS * 3600)
+
+    def status(self) -> dict:
+        with db_connection() as conn:
+            months = [dict(row) for row in conn.execute("SELECT * FROM event_partitions ORDER BY month").fetchall()]
+        return {
+            "hot_days": EVENT_HOT_DAYS,
+            "hot_since": datetime.fromtimestamp(self.hot_horizon(), timezone.utc).strftime("%Y-%m-%d"),
+            "archive_dir": self.archive_dir,
+            "compaction_interval_hours": EVENT_COMPACTION_INTERVAL_HOURS,
+            "running": self.running,
+            "archived_months": months,
+            "archived_bytes": sum(month["bytes"] for month in months),
+            **self.stats,
+        }
+
+
+# Shared instance: background compaction started by main.py
+event_partitions = EventPartitions()
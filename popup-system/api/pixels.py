@@ -0,0 +1,124 @@
+"""
+Tune pixel dispatcher for Mode Popup Management System
+Impression pixels are queued and fired in the background on the shared HTTP client,
+so /api/impression never waits on the track.modemobile.com round trip.
+"""
+
+import asyncio
+import os
+import random
+from typing import List, Optional
+
+import http_client
+
+TUNE_IMPRESSION_PIXEL_URL = "https://track.modemobile.com/aff_i"
+
+PIXEL_QUEUE_SIZE = int(os.getenv("PIXEL_QUEUE_SIZE", "5000"))
+PIXEL_CONCURRENCY = int(os.getenv("PIXEL_CONCURRENCY", "10"))
+PIXEL_TIMEOUT = float(os.getenv("PIXEL_TIMEOUT", "3.0"))
+PIXEL_MAX_ATTEMPTS = int(os.getenv("PIXEL_MAX_ATTEMPTS", "3"))
+PIXEL_RETRY_BASE = 0.25  # seconds; doubled per attempt plus random jitter
+
+
+class PixelDispatcher:
+    """Bounded queue of pixel URLs drained by a fixed number of worker tasks"""
+
+    def __init__(self):
+        self.queue: Optional[asyncio.Queue] = None
+        self._workers: List[asyncio.Task] = []
+        self.metrics = {
+            "queued": 0,
+            "fired": 0,
+            "dropped": 0,
+            "failed": 0,
+            "retries": 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._workers)
+
+    async def start(self):
+        if self.running:
+            return
+        self.queue = asyncio.Queue(maxsize=PIXEL_QUEUE_SIZE)
+        self._workers = [
+            asyncio.create_task(self._worker(), name=f"pixel-worker-{i}")
+            for i in range(max(1, PIXEL_CONCURRENCY))
+        ]
+        print(f"✅ Pixel dispatcher started ({len(self._workers)} workers)")
+
+    async def stop(self, timeout: float = 5.0):
+        """Give queued pixels a short grace period, then cancel the workers"""
+        if not self._workers:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            print(f"⚠️ Pixel dispatcher stopping with {self.queue.qsize()} pixels unsent")
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def fire_impression(self, offer_id, aff_id) -> bool:
+        """Queue a Tune impression pixel. Returns False if it was dropped."""
+        if not offer_id or not aff_id:
+            return False
+        return self.enqueue(f"{TUNE_IMPRESSION_PIXEL_URL}?offer_id={offer_id}&aff_id={aff_id}")
+
+    def enqueue(self, url: str) -> bool:
+        if self.queue is None or not self.running:
+            # Dispatcher not started - drop rather than block the request
+            self.metrics["dropped"] += 1
+            return False
+        try:
+            self.queue.put_nowait(url)
+        except asyncio.QueueFull:
+            self.metrics["dropped"] += 1
+            return False
+        self.metrics["queued"] += 1
+        return True
+
+    async def _worker(self):
+        while True:
+            url = await self.queue.get()
+            try:
+                await self._send(url)
+            finally:
+                self.queue.task_done()
+
+    async def _send(self, url: str):
+        client = await http_client.ensure_client()
+        for attempt in range(PIXEL_MAX_ATTEMPTS):
+            try:
+                response = await client.get(url, timeout=PIXEL_TIMEOUT)
+                if response.status_code < 500:
+                    self.metrics["fired"] += 1
+                    return
+                error = f"HTTP {response.status_code}"
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = str(e) or type(e).__name__
+
+            if attempt + 1 < PIXEL_MAX_ATTEMPTS:
+                self.metrics["retries"] += 1
+                delay = PIXEL_RETRY_BASE * (2 ** attempt)
+                await asyncio.sleep(delay + random.uniform(0, delay))
+
+        self.metrics["failed"] += 1
+        print(f"⚠️ Tune pixel failed after {PIXEL_MAX_ATTEMPTS} attempts: {error}")
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "workers": len(self._workers),
+            "queue_capacity": PIXEL_QUEUE_SIZE,
+            "queue_depth": self.queue.qsize() if self.queue is not None else 0,
+            **self.metrics,
+        }
+
+
+# Shared instance started/stopped by main.py
+pixel_dispatcher = PixelDispatcher()
@@ -0,0 +1,223 @@
+"""
+Email creative pre-render job for Mode Popup Management System
+Renders every active campaign x property x variant into the render cache (memory + the
+on-disk creative store) ahead of a send, so the first opens of a blast are cache hits.
+One run at a time across worker processes (prerender_lock); progress is written to a file next
+to the database so a status poll answered by any worker sees the run.
+"""
+
+import asyncio
+import json
+import os
+import time
+from datetime import datetime
+from typing import Awaitable, Callable, Iterable, List, Optional, Tuple
+
+import catalog
+from render_executor import RENDER_WORKERS, RenderBusy
+from selection import campaign_weight, email_candidates
+from worker_locks import LOCK_DIR, prerender_lock
+
+# Variant -> (width, height) served by /api/email/ad.png
+EMAIL_VARIANTS = {
+    "desktop": (600, 400),
+    "mobile": (320, 480),
+}
+
+# Parallel renders; stays below the executor's queue limit so live ad.png traffic still gets slots
+PRERENDER_CONCURRENCY = int(os.getenv("PRERENDER_CONCURRENCY", str(max(1, RENDER_WORKERS))))
+PRERENDER_BUSY_RETRIES = 3
+MAX_REPORTED_FAILURES = 50
+PRERENDER_PROGRESS_PATH = os.path.join(LOCK_DIR, ".email-prerender.json")
+# Progress file rewrites during a run are throttled to one per interval
+PRERENDER_PROGRESS_WRITE_INTERVAL = 0.5
+
+
+class PrerenderTarget:
+    """One creative to render: a campaign on a property at a variant size"""
+    __slots__ = ("campaign_id", "updated_at", "campaign_data", "property_code", "variant", "width", "height")
+
+    def __init__(self, campaign: dict, property_code: str, variant: str):
+        self.campaign_id = int(campaign["id"])
+        self.updated_at = str(campaign.get("updated_at"))
+        self.campaign_data = {
+            "name": campaign.get("name"),
+            "description": campaign.get("description"),
+            "main_image_url": campaign.get("main_image_url"),
+            "logo_url": campaign.get("logo_url"),
+            "cta_text": campaign.get("cta_text"),
+        }
+        self.property_code = property_code.lower()
+        self.variant = variant
+        self.width, self.height = EMAIL_VARIANTS[variant]
+
+
+# render(target) -> (cache_hit, stored, failure_reason or None)
+RenderTarget = Callable[[PrerenderTarget], Awaitable[Tuple[bool, bool, Optional[str]]]]
+
+
+def enumerate_targets(properties: Optional[Iterable[str]] = None,
+                      variants: Iterable[str] = tuple(EMAIL_VARIANTS)) -> List[PrerenderTarget]:
+    """Every campaign email selection can pick per property x variants, from the catalog snapshot"""
+    snapshot = catalog.get_snapshot()
+    codes = sorted({p.lower() for p in properties}) if properties else sorted(snapshot.feeds)
+    targets = []
+    for code in codes:
+        for row in email_candidates(code, snapshot):
+            campaign = snapshot.campaign(row["id"])
+            if campaign is None or campaign_weight(row) <= 0:
+                continue
+            for variant in variants:
+                targets.append(PrerenderTarget(campaign, code, variant))
+    return targets
+
+
+class PrerenderJob:
+    """Single background pre-render run with progress and failure reporting"""
+
+    def __init__(self, concurrency: int = PRERENDER_CONCURRENCY):
+        self.concurrency = max(1, concurrency)
+        self._task: Optional[asyncio.Task] = None
+        self.progress = self._fresh_progress(0)
+        self.progress["status"] = "idle"
+        self._next_write = 0.0
+
+    @staticmethod
+    def _fresh_progress(total: int) -> dict:
+        return {
+            "status": "running",
+            "total": total,
+            "completed": 0,
+            "rendered": 0,
+            "already_cached": 0,
+            "failed": 0,
+            "failures": [],
+            "started_at": datetime.now().isoformat(),
+            "finished_at": None,
+            "elapsed_seconds": 0.0,
+            "worker_pid": os.getpid(),
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, render: RenderTarget, properties: Optional[Iterable[str]] = None) -> dict:
+        """Kick off a run in the background; returns the current progress (existing run if busy)"""
+        if self.running or not prerender_lock.acquire(blocking=False):
+            return {**self.status(), "already_running": True}
+        try:
+            targets = enumerate_targets(properties)
+            self.progress = self._fresh_progress(len(targets))
+            self._write_progress(force=True)
+            self._task = asyncio.create_task(self._run(targets, render), name="email-prerender")
+        except BaseException:
+            prerender_lock.release()
+            raise
+        print(f"🖼️ Email pre-render started: {len(targets)} creatives, concurrency {self.concurrency}")
+        return self.status()
+
+    def _write_progress(self, force: bool = False):
+        """Publish progress for the other workers (atomic replace, throttled during a run)"""
+        now = time.monotonic()
+        if not force and now < self._next_write:
+            return
+        self._next_write = now + PRERENDER_PROGRESS_WRITE_INTERVAL
+        tmp = f"{PRERENDER_PROGRESS_PATH}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(self.progress, f)
+            os.replace(tmp, PRERENDER_PROGRESS_PATH)
+        except OSError as e:
+            print(f"⚠️ Pre-render progress not written ({PRERENDER_PROGRESS_PATH}): {e}")
+
+    @staticmethod
+    def _read_progress() -> Optional[dict]:
+        try:
+            with open(PRERENDER_PROGRESS_PATH) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def _run(self, targets: List[PrerenderTarget], render: RenderTarget):
+        started = time.perf_counter()
+        queue: asyncio.Queue = asyncio.Queue()
+        for target in targets:
+            queue.put_nowait(target)
+
+        async def worker():
+            while True:
+                try:
+                    target = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await self._render_one(target, render)
+                self.progress["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+                self._write_progress()
+
+        try:
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(targets)) or 1)))
+            self.progress["status"] = "completed" if not self.progress["failed"] else "completed_with_failures"
+        except Exception as e:
+            self.progress["status"] = "failed"
+            self._record_failure(None, str(e))
+        finally:
+            self.progress["finished_at"] = datetime.now().isoformat()
+            self.progress["elapsed_seconds"] = round(time.perf_counter() - started, 2)
+            self._write_progress(force=True)
+            prerender_lock.release()
+            print(f"✅ Email pre-render {self.progress['status']}: {self.progress['rendered']} rendered, "
+                  f"{self.progress['already_cached']} cached, {self.progress['failed']} failed")
+
+    async def _render_one(self, target: PrerenderTarget, render: RenderTarget):
+        reason = None
+        for attempt in range(PRERENDER_BUSY_RETRIES + 1):
+            try:
+                hit, stored, reason = await render(target)
+                break
+            except RenderBusy as e:
+                # Live traffic has the executor saturated - back off instead of competing
+                reason = str(e)
+                await asyncio.sleep(1.0 * (attempt + 1))
+            except Exception as e:
+                reason = str(e) or type(e).__name__
+                hit = stored = False
+                break
+        else:
+            hit = stored = False
+
+        self.progress["completed"] += 1
+        if hit:
+            self.progress["already_cached"] += 1
+        elif stored:
+            self.progress["rendered"] += 1
+        else:
+            self._record_failure(target, reason or "render was not cacheable")
+
+    def _record_failure(self, target: Optional[PrerenderTarget], reason: str):
+        self.progress["failed"] += 1
+        if len(self.progress["failures"]) < MAX_REPORTED_FAILURES:
+            entry = {"error": reason}
+            if target is not None:
+                entry.update(campaign_id=target.campaign_id, property=target.property_code, variant=target.variant)
+            self.progress["failures"].append(entry)
+
+    def status(self) -> dict:
+        """This worker's run, else the shared progress file (a run on another worker, or the last run)"""
+        progress = dict(self.progress)
+        if not self.running:
+            shared = self._read_progress()
+            if shared is not None:
+                progress = shared
+                # 'running' with the lock free: the worker running it died mid-run
+                if progress.get("status") == "running" and prerender_lock.acquire(blocking=False):
+                    prerender_lock.release()
+                    progress["status"] = "interrupted"
+        total = progress["total"]
+        progress["percent"] = round(progress["completed"] / total * 100, 1) if total else 100.0
+        progress["concurrency"] = self.concurrency
+        return progress
+
+
+# Shared instance driven by /api/email/prerender
+prerender_job = PrerenderJob()
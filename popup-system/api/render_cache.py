@@ -0,0 +1,261 @@
+"""
+Rendered email PNG cache for Mode Popup Management System
+Two tiers: an in-memory LRU bounded by bytes, backed by a directory on the data volume.
+Keys include the campaign's updated_at, so editing a campaign naturally misses the old renders.
+Disk reads, writes and pruning run on threads, never on the event loop. A file's mtime is its
+render time (Last-Modified); its atime is set explicitly on use, so eviction is least recently
+used even on noatime/relatime mounts.
+"""
+
+import asyncio
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.utils import formatdate
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from database import DB_PATH
+from http_cache import strong_etag
+
+RENDER_CACHE_MEMORY_BYTES = int(os.getenv("RENDER_CACHE_MEMORY_BYTES", str(64 * 1024 * 1024)))
+RENDER_CACHE_DISK_BYTES = int(os.getenv("RENDER_CACHE_DISK_BYTES", str(512 * 1024 * 1024)))
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", os.path.join(os.path.dirname(DB_PATH), "render_cache"))
+RENDER_CACHE_MAX_AGE = int(os.getenv("RENDER_CACHE_MAX_AGE", "3600"))
+# A render served from memory refreshes its disk file's last-use time at most this often
+RENDER_CACHE_TOUCH_INTERVAL = float(os.getenv("RENDER_CACHE_TOUCH_INTERVAL", "300"))
+
+# (campaign_id, campaign updated_at, property, width, height, variant)
+RenderKey = Tuple[int, str, str, int, int, str]
+
+
+@dataclass(frozen=True)
+class RenderedImage:
+    body: bytes
+    etag: str
+    last_modified: float  # epoch seconds the render was produced
+
+    @property
+    def last_modified_http(self) -> str:
+        return formatdate(self.last_modified, usegmt=True)
+
+
+def key_digest(key: RenderKey) -> str:
+    return hashlib.sha256("|".join(str(part) for part in key).encode("utf-8")).hexdigest()
+
+
+class RenderCache:
+    """Memory LRU (byte budget) in front of a size-bounded disk directory"""
+
+    def __init__(self, directory: str = RENDER_CACHE_DIR,
+                 memory_bytes: int = RENDER_CACHE_MEMORY_BYTES, disk_bytes: int = RENDER_CACHE_DISK_BYTES):
+        self.directory = directory
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        self._memory: "OrderedDict[str, RenderedImage]" = OrderedDict()
+        self._memory_used = 0
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._disk_ok = True
+        self._disk_used: Optional[int] = None  # measured by the first write's prune, then tracked
+        # Writes, touches and prunes share one thread, so a prune never races a write
+        self._disk_writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="render-cache-disk")
+        self._touched: Dict[str, float] = {}  # digest -> monotonic time of the last disk touch
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+        except OSError as e:
+            print(f"⚠️ Render cache disk tier disabled ({self.directory}): {e}")
+            self._disk_ok = False
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "renders": 0, "coalesced": 0, "evictions": 0}
+
+    # -- memory tier -------------------------------------------------------
+
+    def _memory_get(self, digest: str) -> Optional[RenderedImage]:
+        with self._lock:
+            image = self._memory.get(digest)
+            if image is not None:
+                self._memory.move_to_end(digest)
+            return image
+
+    def _memory_put(self, digest: str, image: RenderedImage):
+        size = len(image.body)
+        if size > self.memory_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(digest, None)
+            if old is not None:
+                self._memory_used -= len(old.body)
+            self._memory[digest] = image
+            self._memory_used += size
+            while self._memory_used > self.memory_bytes and self._memory:
+                evicted_digest, evicted = self._memory.popitem(last=False)
+                self._memory_used -= len(evicted.body)
+                self._touched.pop(evicted_digest, None)
+                self.stats["evictions"] += 1
+
+    # -- disk tier ---------------------------------------------------------
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.directory, digest[:2], f"{digest}.png")
+
+    def _disk_get(self, digest: str) -> Optional[RenderedImage]:
+        """Runs on a thread"""
+        if not self._disk_ok:
+            return None
+        path = self._path(digest)
+        try:
+            with open(path, "rb") as f:
+                body = f.read()
+            mtime = os.path.getmtime(path)
+        except OSError:
+            return None
+        self._touch(digest, mtime)
+        return RenderedImage(body=body, etag=strong_etag(body), last_modified=mtime)
+
+    def _touch(self, digest: str, mtime: float):
+        """Runs on a thread: record a use in atime, keeping mtime (the render time) as is"""
+        try:
+            os.utime(self._path(digest), (time.time(), mtime))
+        except OSError:
+            return
+        self._touched[digest] = time.monotonic()
+
+    def _disk_put(self, digest: str, image: RenderedImage):
+        """Runs on the disk writer thread"""
+        if not self._disk_ok:
+            return
+        path = self._path(digest)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(tmp, "wb") as f:
+                f.write(image.body)
+            os.utime(tmp, (image.last_modified, image.last_modified))
+            os.replace(tmp, path)  # atomic: readers never see a partial PNG
+        except OSError as e:
+            print(f"⚠️ Render cache write failed: {e}")
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            return
+        self._touched[digest] = time.monotonic()
+        with self._lock:
+            if self._disk_used is not None:
+                self._disk_used += len(image.body)
+            over_budget = self._disk_used is None or self._disk_used > self.disk_bytes
+        if over_budget:
+            self._prune_disk()
+
+    def _prune_disk(self):
+        """Runs on the disk writer thread: measure the directory, drop least recently used renders
+        beyond the byte budget (atime is only trusted because _touch sets it explicitly)"""
+        entries = []
+        total = 0
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if not name.endswith(".png"):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((st.st_atime, st.st_size, path))
+                total += st.st_size
+        if total > self.disk_bytes:
+            for _, size, path in sorted(entries):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                total -= size
+                if total <= self.disk_bytes * 0.9:
+                    break
+        with self._lock:
+            self._disk_used = total
+
+    # -- public API --------------------------------------------------------
+
+    def _memory_hit(self, digest: str) -> Optional[RenderedImage]:
+        image = self._memory_get(digest)
+        if image is None:
+            return None
+        self.stats["memory_hits"] += 1
+        last_touch = self._touched.get(digest)
+        if self._disk_ok and (last_touch is None or time.monotonic() - last_touch > RENDER_CACHE_TOUCH_INTERVAL):
+            # Keep hot renders from aging out of the disk tier while memory serves them
+            self._touched[digest] = time.monotonic()
+            self._disk_writer.submit(self._touch, digest, image.last_modified)
+        return image
+
+    async def get_or_render(
+        self, key: RenderKey, render: Callable[[], Awaitable[Tuple[bytes, bool]]]
+    ) -> Tuple[RenderedImage, bool]:
+        """Return (image, cache_hit). Concurrent misses for one key share a single disk read / render.
+
+        render() returns (png_bytes, cacheable); uncacheable renders (fallback images,
+        missing campaign art) are served once and not stored.
+        """
+        digest = key_digest(key)
+        image = self._memory_hit(digest)
+        if image is not None:
+            return image, True
+
+        pending = self._inflight.get(digest)
+        if pending is not None:
+            self.stats["coalesced"] += 1
+            return await asyncio.shield(pending), True
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inflight[digest] = future
+        try:
+            image = await loop.run_in_executor(None, self._disk_get, digest) if self._disk_ok else None
+            if image is not None:
+                self.stats["disk_hits"] += 1
+                self._memory_put(digest, image)
+                future.set_result(image)
+                return image, True
+
+            self.stats["misses"] += 1
+            body, cacheable = await render()
+            self.stats["renders"] += 1
+            image = RenderedImage(body=body, etag=strong_etag(body), last_modified=time.time())
+            if cacheable:
+                self._memory_put(digest, image)
+                # Written in the background: the response doesn't wait on the volume (or a prune)
+                self._disk_writer.submit(self._disk_put, digest, image)
+            future.set_result(image)
+            return image, False
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(digest, None)
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._memory_used = 0
+            self._touched.clear()
+
+    def status(self) -> dict:
+        with self._lock:
+            entries, used = len(self._memory), self._memory_used
+        return {
+            "memory_entries": entries,
+            "memory_bytes": used,
+            "memory_budget": self.memory_bytes,
+            "disk_dir": self.directory if self._disk_ok else None,
+            "disk_budget": self.disk_bytes,
+            **self.stats,
+        }
+
+
+# Shared instance used by the email PNG endpoints
+render_cache = RenderCache()
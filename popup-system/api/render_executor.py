@@ -0,0 +1,146 @@
+"""
+Render executor for Mode Popup Management System
+PIL drawing, LANCZOS resizing, PNG encoding and source-image I/O run in a process pool,
+so an email render never stalls the event loop serving popup impressions and clicks.
+"""
+
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+from fastapi.concurrency import run_in_threadpool
+
+# uvicorn worker processes sharing the machine; each runs its own render pool
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+# Worker processes (0 = render in the thread pool instead, e.g. on tiny instances);
+# by default the cores are split between the uvicorn workers
+RENDER_WORKERS = int(os.getenv("RENDER_WORKERS", str(max(1, (os.cpu_count() or 1) // WEB_CONCURRENCY))))
+# Renders running or waiting for a worker; beyond this callers wait, then get RenderBusy
+RENDER_QUEUE_LIMIT = int(os.getenv("RENDER_QUEUE_LIMIT", str(max(1, RENDER_WORKERS) * 4)))
+RENDER_SUBMIT_TIMEOUT = float(os.getenv("RENDER_SUBMIT_TIMEOUT", "2"))
+RENDER_TIMEOUT = float(os.getenv("RENDER_TIMEOUT", "20"))
+# spawn: workers never inherit the server's threads, sockets or SQLite connections
+RENDER_START_METHOD = os.getenv("RENDER_START_METHOD", "spawn")
+
+
+class RenderBusy(Exception):
+    """Raised when the render queue stays full past RENDER_SUBMIT_TIMEOUT"""
+
+
+class RenderTimeout(Exception):
+    """Raised when a single render exceeds RENDER_TIMEOUT"""
+
+
+def _warm_worker():
+    """Process initializer: import PIL and the renderers and load the fonts once per worker"""
+    import email_renderer  # noqa: F401
+    import routes.email  # noqa: F401
+    from fonts import font_registry
+    font_registry.preload()
+
+
+class RenderExecutor:
+    """Process pool behind a bounded submission queue with per-render timeouts"""
+
+    def __init__(self, workers: int = RENDER_WORKERS, queue_limit: int = RENDER_QUEUE_LIMIT):
+        self.workers = workers
+        self.queue_limit = queue_limit
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.metrics = {"submitted": 0, "completed": 0, "rejected": 0, "timeouts": 0, "failed": 0, "pool_restarts": 0}
+
+    @property
+    def running(self) -> bool:
+        return self._pool is not None
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context(RENDER_START_METHOD),
+            initializer=_warm_worker,
+        )
+
+    def start(self):
+        if self._pool is not None or self.workers <= 0:
+            return
+        self._pool = self._new_pool()
+        print(f"✅ Render executor started ({self.workers} processes, queue limit {self.queue_limit})")
+
+    def stop(self):
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def _restart_pool(self):
+        old = self._pool
+        self._pool = self._new_pool()
+        self.metrics["pool_restarts"] += 1
+        if old is not None:
+            old.shutdown(wait=False, cancel_futures=True)
+
+    async def submit(self, fn: Callable, *args):
+        """Run fn(*args) in a worker process (fn and args must be picklable)"""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.queue_limit)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=RENDER_SUBMIT_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.metrics["rejected"] += 1
+            raise RenderBusy("Render queue is full, try again shortly")
+
+        self.metrics["submitted"] += 1
+        loop = asyncio.get_running_loop()
+        try:
+            if self._pool is None:
+                # Executor not started (scripts) or disabled - keep the loop free with a thread
+                future = asyncio.ensure_future(run_in_threadpool(fn, *args))
+            else:
+                try:
+                    future = loop.run_in_executor(self._pool, fn, *args)
+                except (BrokenProcessPool, RuntimeError):
+                    self._restart_pool()
+                    future = loop.run_in_executor(self._pool, fn, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+
+        def _finished(done):
+            # The slot frees when the worker actually finishes, even if the caller timed out
+            self._slots.release()
+            if not done.cancelled():
+                done.exception()  # consume errors nobody is awaiting any more
+
+        future.add_done_callback(_finished)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(future), timeout=RENDER_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.metrics["timeouts"] += 1
+            raise RenderTimeout(f"Render exceeded {RENDER_TIMEOUT:.0f}s")
+        except BrokenProcessPool:
+            # A worker died (OOM, segfault in a codec) - replace the pool for the next render
+            self.metrics["failed"] += 1
+            self._restart_pool()
+            raise
+        except Exception:
+            self.metrics["failed"] += 1
+            raise
+        self.metrics["completed"] += 1
+        return result
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "mode": "process" if self.running else "thread",
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "timeout_seconds": RENDER_TIMEOUT,
+            "in_flight": (self.queue_limit - self._slots._value) if self._slots is not None else 0,
+            **self.metrics,
+        }
+
+
+# Shared instance started/stopped by main.py
+render_executor = RenderExecutor()
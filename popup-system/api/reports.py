@@ -0,0 +1,199 @@
+"""
+Report aggregation layer for Mode Popup Management System
+Each fact side is aggregated on its own (GROUP BY the report dimensions) and the sides are
+merged per key in Python, so a report costs O(impressions + clicks) instead of the
+impressions x clicks fan-out of LEFT JOIN impressions ... LEFT JOIN clicks ... COUNT(DISTINCT).
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from database import sqlite_utc_epoch
+from partitions import event_partitions
+
+# Dimension name -> SQL over the fact alias `e` and the campaigns alias `c`.
+# Source/subsource fold NULL and '' together, as the rollup stores both as ''.
+DIMENSIONS = {
+    "campaign_id": "e.campaign_id",
+    "property_code": "e.property_code",
+    "source": "COALESCE(NULLIF(e.source, ''), 'Unknown')",
+    "subsource": "COALESCE(NULLIF(e.subsource, ''), 'Unknown')",
+    "offer_id": "c.offer_id",
+    "campaign_name": "c.name",
+    "creative": "COALESCE(c.creative_file, 'N/A')",
+    "payout": "COALESCE(c.payout_amount, 0.45)",
+    # Raw-only dimensions (not kept in the hourly rollup)
+    "placement": "e.placement",
+    "referrer": "e.referrer",
+    "landing_page": "e.landing_page",
+}
+
+RAW_ONLY_DIMENSIONS = {"placement", "referrer", "landing_page"}
+CAMPAIGN_DIMENSIONS = {"offer_id", "campaign_name", "creative", "payout"}
+
+METRICS = ("impressions", "clicks", "revenue")
+
+
+@dataclass(frozen=True)
+class FactSide:
+    """One aggregated fact source: a table plus the metrics it contributes"""
+    table: str
+    metrics: Tuple[Tuple[str, str], ...]  # (metric name, SQL aggregate over alias e)
+    time_sql: str                         # column the time window is applied to
+    epoch_bounds: bool = False            # time_sql is ts_epoch: hour bounds become epoch seconds
+
+
+# The hourly rollup already carries both sides per bucket row, so one pass covers all metrics
+ROLLUP_SIDES = (
+    FactSide(
+        table="event_rollup_hourly",
+        metrics=(("impressions", "SUM(e.impressions)"), ("clicks", "SUM(e.clicks)"), ("revenue", "SUM(e.revenue)")),
+        time_sql="e.hour",
+    ),
+)
+
+# Raw event tables: each side is grouped separately and merged, never joined to each other.
+# The window is an indexed range scan on ts_epoch rather than a per-row hour expression, and
+# months compacted out of the hot tables are read back from their archive files.
+RAW_SIDES = (
+    FactSide(
+        table="impressions",
+        metrics=(("impressions", "COUNT(*)"),),
+        time_sql="e.ts_epoch",
+        epoch_bounds=True,
+    ),
+    FactSide(
+        table="clicks",
+        metrics=(("clicks", "COUNT(*)"), ("revenue", "SUM(COALESCE(e.revenue_estimate, 0))")),
+        time_sql="e.ts_epoch",
+        epoch_bounds=True,
+    ),
+)
+
+
+def hour_floor(moment: datetime) -> str:
+    return moment.strftime("%Y-%m-%d %H:00:00")
+
+
+def since(days: int = 0, hours: int = 0) -> str:
+    """Hour bound N days/hours before now (UTC, like SQLite's 'now')"""
+    return hour_floor(datetime.now(timezone.utc) - timedelta(days=days, hours=hours))
+
+
+def start_of_today() -> str:
+    """Midnight UTC today (same bound as datetime('now', 'start of day'))"""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d 00:00:00")
+
+
+def _side_tables(conn, side: FactSide, start_hour: Optional[str], end_hour: Optional[str]) -> Iterable[str]:
+    """Raw event sides read the hot table plus any archived months in the window"""
+    if not side.epoch_bounds:
+        return (side.table,)
+    return event_partitions.event_sources(
+        conn, side.table,
+        sqlite_utc_epoch(start_hour) if start_hour else None,
+        sqlite_utc_epoch(end_hour) if end_hour else None,
+    )
+
+
+def _side_query(side: FactSide, table: str, dimensions: Sequence[str], attributes: Sequence[str], filters: dict) -> Tuple[str, list]:
+    select = [f"{DIMENSIONS[d]} AS {d}" for d in dimensions]
+    select += [f"MIN({DIMENSIONS[a]}) AS {a}" for a in attributes]
+    select += [f"{expr} AS {name}" for name, expr in side.metrics]
+
+    needs_campaigns = bool(CAMPAIGN_DIMENSIONS & (set(dimensions) | set(attributes))) \
+        or filters.get("offer_id") or filters.get("active_only")
+    join = "JOIN campaigns c ON c.id = e.campaign_id" if needs_campaigns else ""
+
+    where, params = ["1=1"], []
+    bound = sqlite_utc_epoch if side.epoch_bounds else str
+    if filters.get("start_hour"):
+        where.append(f"{side.time_sql} >= ?")
+        params.append(bound(filters["start_hour"]))
+    if filters.get("end_hour"):
+        where.append(f"{side.time_sql} < ?")
+        params.append(bound(filters["end_hour"]))
+    if filters.get("property_code"):
+        where.append("e.property_code = ?")
+        params.append(filters["property_code"])
+    if filters.get("campaign_id"):
+        where.append("e.campaign_id = ?")
+        params.append(filters["campaign_id"])
+    if filters.get("offer_id"):
+        where.append("c.offer_id = ?")
+        params.append(filters["offer_id"])
+    if filters.get("active_only"):
+        where.append("c.active = 1")
+
+    sql = f"SELECT {', '.join(select)} FROM {table} e {join} WHERE {' AND '.join(where)}"
+    if dimensions:
+        sql += " GROUP BY " + ", ".join(str(i + 1) for i in range(len(dimensions)))
+    return sql, params
+
+
+def aggregate(
+    conn,
+    dimensions: Sequence[str] = (),
+    attributes: Sequence[str] = (),
+    start_hour: Optional[str] = None,
+    end_hour: Optional[str] = None,
+    property_code: Optional[str] = None,
+    campaign_id: Optional[int] = None,
+    offer_id=None,
+    active_only: bool = False,
+) -> List[dict]:
+    """Impressions, clicks and revenue per dimension key.
+
+    dimensions are grouped on; attributes are per-key labels (MIN over the group).
+    Time bounds are hour buckets, start inclusive / end exclusive.
+    """
+    unknown = [d for d in list(dimensions) + list(attributes) if d not in DIMENSIONS]
+    if unknown:
+        raise ValueError(f"Unknown report dimension(s): {', '.join(unknown)}")
+
+    raw = bool(RAW_ONLY_DIMENSIONS & (set(dimensions) | set(attributes)))
+    sides = RAW_SIDES if raw else ROLLUP_SIDES
+    filters = {
+        "start_hour": start_hour, "end_hour": end_hour, "property_code": property_code,
+        "campaign_id": campaign_id, "offer_id": offer_id, "active_only": active_only,
+    }
+
+    merged: Dict[tuple, dict] = {}
+    for side in sides:
+        names = list(dimensions) + list(attributes) + [name for name, _ in side.metrics]
+        for table in _side_tables(conn, side, start_hour, end_hour):
+            sql, params = _side_query(side, table, dimensions, attributes, filters)
+            for row in conn.execute(sql, params).fetchall():
+                values = dict(zip(names, row))
+                key = tuple(values[d] for d in dimensions)
+                entry = merged.get(key)
+                if entry is None:
+                    entry = {d: values[d] for d in dimensions}
+                    entry.update({a: None for a in attributes})
+                    entry.update({m: 0 for m in METRICS})
+                    merged[key] = entry
+                for a in attributes:
+                    if entry[a] is None:
+                        entry[a] = values[a]
+                for name, _ in side.metrics:
+                    entry[name] += values[name] or 0
+
+    if not dimensions and not merged:
+        merged[()] = {**{a: None for a in attributes}, **{m: 0 for m in METRICS}}
+
+    rows = list(merged.values())
+    for entry in rows:
+        entry["impressions"] = int(entry["impressions"])
+        entry["clicks"] = int(entry["clicks"])
+        entry["revenue"] = float(entry["revenue"])
+    return rows
+
+
+def with_rates(row: dict) -> dict:
+    """Add ctr (%), rpm and rpc derived from the merged counters"""
+    impressions, clicks, revenue = row["impressions"], row["clicks"], row["revenue"]
+    row["ctr"] = (clicks / impressions * 100.0) if impressions > 0 else 0.0
+    row["rpm"] = (revenue / impressions * 1000.0) if impressions > 0 else 0.0
+    row["rpc"] = (revenue / clicks) if clicks > 0 else 0.0
+    return row
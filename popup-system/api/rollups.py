@@ -0,0 +1,255 @@
+"""
+Incremental rollups for Mode Popup Management System
+Event tables are folded into small aggregate tables by advancing a per-rollup id watermark,
+so hot endpoints read O(campaigns) rows instead of scanning all-time impressions/clicks.
+The same catch-up path backfills history on first run and runs inside every ingestion flush.
+"""
+
+import math
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Dict, Tuple
+
+from database import db_connection
+
+# Half-life for the decayed RPM counters; 0 ranks by all-time RPM
+RPM_DECAY_HALF_LIFE_HOURS = float(os.getenv("RPM_DECAY_HALF_LIFE_HOURS", "0"))
+# Rows folded per catch-up step (keeps backfill transactions bounded)
+ROLLUP_CHUNK_SIZE = int(os.getenv("ROLLUP_CHUNK_SIZE", "50000"))
+
+RPM_ROLLUP = "campaign_rpm"
+HOURLY_ROLLUP = "event_hourly"
+
+# UTC hour bucket derived from the integer event time (NULL for unparseable legacy timestamps)
+HOUR_BUCKET_SQL = "CASE WHEN ts_epoch > 0 THEN strftime('%Y-%m-%d %H:00:00', ts_epoch, 'unixepoch') END"
+
+
+def create_tables(conn):
+    """Rollup tables and watermarks (called from init_db)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rollup_state (
+            name TEXT PRIMARY KEY,
+            last_impression_id INTEGER NOT NULL DEFAULT 0,
+            last_click_id INTEGER NOT NULL DEFAULT 0,
+            updated_at REAL
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS campaign_rpm_rollup (
+            campaign_id INTEGER NOT NULL,
+            property_code TEXT NOT NULL,
+            impressions INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            decayed_impressions REAL NOT NULL DEFAULT 0,
+            decayed_revenue REAL NOT NULL DEFAULT 0,
+            decayed_at REAL,
+            PRIMARY KEY (property_code, campaign_id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS event_rollup_hourly (
+            hour TEXT NOT NULL,               -- 'YYYY-MM-DD HH:00:00'
+            campaign_id INTEGER NOT NULL,
+            property_code TEXT NOT NULL,
+            source TEXT NOT NULL DEFAULT '',
+            subsource TEXT NOT NULL DEFAULT '',
+            impressions INTEGER NOT NULL DEFAULT 0,
+            clicks INTEGER NOT NULL DEFAULT 0,
+            revenue REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (hour, campaign_id, property_code, source, subsource)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rollup_hourly_campaign ON event_rollup_hourly(campaign_id, hour)")
+
+
+def _watermarks(conn, name: str) -> Tuple[int, int]:
+    row = conn.execute(
+        "SELECT last_impression_id, last_click_id FROM rollup_state WHERE name = ?", (name,)
+    ).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+
+def _save_watermarks(conn, name: str, impression_id: int, click_id: int):
+    conn.execute("""
+        INSERT INTO rollup_state (name, last_impression_id, last_click_id, updated_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(name) DO UPDATE SET
+            last_impression_id = excluded.last_impression_id,
+            last_click_id = excluded.last_click_id,
+            updated_at = excluded.updated_at
+    """, (name, impression_id, click_id, time.time()))
+
+
+def folded_through(conn) -> Tuple[int, int]:
+    """(impression id, click id) every rollup has consumed up to - older rows may leave the hot tables"""
+    marks = [_watermarks(conn, name) for name in (RPM_ROLLUP, HOURLY_ROLLUP)]
+    return min(m[0] for m in marks), min(m[1] for m in marks)
+
+
+def _decay_factor(elapsed_seconds: float) -> float:
+    if RPM_DECAY_HALF_LIFE_HOURS <= 0 or elapsed_seconds <= 0:
+        return 1.0
+    return math.pow(0.5, elapsed_seconds / (RPM_DECAY_HALF_LIFE_HOURS * 3600))
+
+
+def _apply_rpm_deltas(conn, deltas: Dict[Tuple[int, str], list], now: float):
+    """Fold (impressions, revenue) deltas into campaign_rpm_rollup, decaying old weight first"""
+    for (campaign_id, property_code), (impressions, revenue) in deltas.items():
+        row = conn.execute("""
+            SELECT decayed_impressions, decayed_revenue, decayed_at
+            FROM campaign_rpm_rollup WHERE property_code = ? AND campaign_id = ?
+        """, (property_code, campaign_id)).fetchone()
+        if row:
+            factor = _decay_factor(now - (row[2] or now))
+            decayed_impressions = row[0] * factor + impressions
+            decayed_revenue = row[1] * factor + revenue
+        else:
+            decayed_impressions, decayed_revenue = impressions, revenue
+        conn.execute("""
+            INSERT INTO campaign_rpm_rollup
+                (campaign_id, property_code, impressions, revenue, decayed_impressions, decayed_revenue, decayed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(property_code, campaign_id) DO UPDATE SET
+                impressions = impressions + excluded.impressions,
+                revenue = revenue + excluded.revenue,
+                decayed_impressions = excluded.decayed_impressions,
+                decayed_revenue = excluded.decayed_revenue,
+                decayed_at = excluded.decayed_at
+        """, (campaign_id, property_code, impressions, revenue, decayed_impressions, decayed_revenue, now))
+
+
+def _catch_up_rpm(conn, limit: int = ROLLUP_CHUNK_SIZE) -> int:
+    """Fold events past the watermark into campaign_rpm_rollup. Returns rows consumed."""
+    last_impression_id, last_click_id = _watermarks(conn, RPM_ROLLUP)
+    deltas: Dict[Tuple[int, str], list] = {}
+
+    impression_rows = conn.execute("""
+        SELECT MAX(id), campaign_id, property_code, COUNT(*)
+        FROM (SELECT id, campaign_id, property_code FROM impressions WHERE id > ? ORDER BY id LIMIT ?)
+        GROUP BY campaign_id, property_code
+    """, (last_impression_id, limit)).fetchall()
+    click_rows = conn.execute("""
+        SELECT MAX(id), campaign_id, property_code, COUNT(*), SUM(COALESCE(revenue_estimate, 0))
+        FROM (SELECT id, campaign_id, property_code, revenue_estimate FROM clicks WHERE id > ? ORDER BY id LIMIT ?)
+        GROUP BY campaign_id, property_code
+    """, (last_click_id, limit)).fetchall()
+
+    consumed = 0
+    for max_id, campaign_id, property_code, count in impression_rows:
+        deltas.setdefault((campaign_id, property_code), [0, 0.0])[0] += count
+        last_impression_id = max(last_impression_id, max_id)
+        consumed += count
+    for max_id, campaign_id, property_code, count, revenue in click_rows:
+        deltas.setdefault((campaign_id, property_code), [0, 0.0])[1] += float(revenue or 0)
+        last_click_id = max(last_click_id, max_id)
+        consumed += count
+
+    if consumed:
+        _apply_rpm_deltas(conn, deltas, time.time())
+        _save_watermarks(conn, RPM_ROLLUP, last_impression_id, last_click_id)
+    return consumed
+
+
+def _catch_up_hourly(conn, limit: int = ROLLUP_CHUNK_SIZE) -> int:
+    """Fold events past the watermark into event_rollup_hourly. Returns rows consumed."""
+    last_impression_id, last_click_id = _watermarks(conn, HOURLY_ROLLUP)
+    buckets: Dict[tuple, list] = {}
+    consumed = 0
+
+    for max_id, hour, campaign_id, property_code, source, subsource, count in conn.execute(f"""
+        SELECT MAX(id), {HOUR_BUCKET_SQL} AS hour, campaign_id, property_code,
+               COALESCE(source, ''), COALESCE(subsource, ''), COUNT(*)
+        FROM (SELECT id, campaign_id, property_code, source, subsource, ts_epoch
+              FROM impressions WHERE id > ? ORDER BY id LIMIT ?)
+        GROUP BY 2, 3, 4, 5, 6
+    """, (last_impression_id, limit)).fetchall():
+        last_impression_id = max(last_impression_id, max_id)
+        consumed += count
+        if hour is not None:  # unparseable timestamps never matched a time filter either
+            buckets.setdefault((hour, campaign_id, property_code, source, subsource), [0, 0, 0.0])[0] += count
+
+    for max_id, hour, campaign_id, property_code, source, subsource, count, revenue in conn.execute(f"""
+        SELECT MAX(id), {HOUR_BUCKET_SQL} AS hour, campaign_id, property_code,
+               COALESCE(source, ''), COALESCE(subsource, ''), COUNT(*), SUM(COALESCE(revenue_estimate, 0))
+        FROM (SELECT id, campaign_id, property_code, source, subsource, ts_epoch, revenue_estimate
+              FROM clicks WHERE id > ? ORDER BY id LIMIT ?)
+        GROUP BY 2, 3, 4, 5, 6
+    """, (last_click_id, limit)).fetchall():
+        last_click_id = max(last_click_id, max_id)
+        consumed += count
+        if hour is not None:
+            bucket = buckets.setdefault((hour, campaign_id, property_code, source, subsource), [0, 0, 0.0])
+            bucket[1] += count
+            bucket[2] += float(revenue or 0)
+
+    if consumed:
+        conn.executemany("""
+            INSERT INTO event_rollup_hourly
+                (hour, campaign_id, property_code, source, subsource, impressions, clicks, revenue)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(hour, campaign_id, property_code, source, subsource) DO UPDATE SET
+                impressions = impressions + excluded.impressions,
+                clicks = clicks + excluded.clicks,
+                revenue = revenue + excluded.revenue
+        """, [key + tuple(counts) for key, counts in buckets.items()])
+        _save_watermarks(conn, HOURLY_ROLLUP, last_impression_id, last_click_id)
+    return consumed
+
+
+ROLLUP_STEPS = (_catch_up_rpm, _catch_up_hourly)
+
+
+def batch_hook(conn, rows_by_kind):
+    """Ingestion hook: runs inside the flush transaction right after the inserts"""
+    for step in ROLLUP_STEPS:
+        step(conn)
+
+
+def catch_up() -> int:
+    """Fold every outstanding event into the rollups (startup backfill), one chunk per transaction"""
+    from worker_locks import writer_lock
+
+    total = 0
+    with db_connection() as conn:
+        for step in ROLLUP_STEPS:
+            while True:
+                # Watermark read and advance must not interleave with another worker's flush hook
+                with writer_lock.hold():
+                    consumed = step(conn)
+                    conn.commit()
+                total += consumed
+                if consumed == 0:
+                    break
+                print(f"📊 Rollup {step.__name__.replace('_catch_up_', '')}: folded {consumed} events")
+    return total
+
+
+def day_bounds(start_date: str, end_date: str) -> Tuple[str, str]:
+    """Inclusive YYYY-MM-DD range -> [start, end) hour-bucket bounds for event_rollup_hourly"""
+    start = datetime.strptime(start_date, "%Y-%m-%d")
+    end = datetime.strptime(end_date, "%Y-%m-%d") + timedelta(days=1)
+    return start.strftime("%Y-%m-%d %H:%M:%S"), end.strftime("%Y-%m-%d %H:%M:%S")
+
+
+
+def get_property_rpm(conn, property_code: str) -> Dict[int, float]:
+    """campaign_id -> RPM for one property (decayed when a half-life is configured)"""
+    if RPM_DECAY_HALF_LIFE_HOURS > 0:
+        sql = "SELECT campaign_id, decayed_impressions, decayed_revenue FROM campaign_rpm_rollup WHERE property_code = ?"
+    else:
+        sql = "SELECT campaign_id, impressions, revenue FROM campaign_rpm_rollup WHERE property_code = ?"
+    rpm = {}
+    # Both counters decay by the same factor, so the ratio needs no read-time adjustment
+    for campaign_id, impressions, revenue in conn.execute(sql, (property_code,)).fetchall():
+        rpm[campaign_id] = (revenue * 1000.0) / impressions if impressions else 0.0
+    return rpm
+
+
+def status() -> dict:
+    with db_connection() as conn:
+        rows = conn.execute("SELECT name, last_impression_id, last_click_id, updated_at FROM rollup_state").fetchall()
+        return {
+            "decay_half_life_hours": RPM_DECAY_HALF_LIFE_HOURS,
+            "rollups": {row[0]: {"last_impression_id": row[1], "last_click_id": row[2], "updated_at": row[3]} for row in rows},
+        }
@@ -4,205 +4,30 @@ CRUD operations for Mike's Tune campaign management
 """
 
 from fastapi import APIRouter, HTTPException, Depends, Request
+from fastapi.concurrency import run_in_threadpool
 from pydantic import BaseModel, HttpUrl
 from typing import List, Optional
 from datetime import datetime, timedelta
 from database import (
     get_db_connection, 
+    db_connection,
     insert_campaign, 
     get_active_campaigns_for_property,
     track_impression
 )
 from database import detect_property_code_from_host
+import catalog
+import reports
+import rollups
+from ingestion import ingestor, IngestQueueFull
+from caps import cap_enforcer
+from partitions import event_partitions
+from pixels import pixel_dispatcher
+from http_cache import HOST_HEADERS_VARY, cached_json_response, encode_json, strong_etag
 import sqlite3
+import time
 from datetime import datetime
 
-# EMBEDDED Tune API client to avoid import issues on Railway
-TUNE_API_AVAILABLE = True
-
-class EmbeddedTuneAPIClient:
-    def __init__(self, api_key: str = "NETfeRuo7FOO72yOcwOXj5jK0aCYve"):
-        self.api_key = api_key
-        self.working_endpoint = "https://currentpublisher.api.hasoffers.com/v3/Report.json"
-        
-    def _make_hasoffers_request(self, method: str = 'getStats', **additional_params):
-        """Make authenticated request to Mike's HasOffers API using urllib"""
-        import urllib.request
-        import urllib.parse
-        import json
-        
-        # Filter for ONLY our 5 popup campaigns
-        popup_offer_ids = [6998, 7521, 7389, 7385, 7390]
-        
-        params = {
-            'NetworkToken': self.api_key,
-            'Target': 'Report',
-            'Method': method,
-            'fields[]': ['Stat.clicks', 'Stat.conversions', 'Stat.payout', 'Stat.revenue', 'Stat.offer_id'],
-            'filters[Stat.offer_id][conditional]': 'EQUAL_TO',
-            'totals': 1,
-            'limit': 1000,
-            **additional_params
-        }
-        
-        # Add popup campaign filters
-        for i, offer_id in enumerate(popup_offer_ids):
-            params[f'filters[Stat.offer_id][values][{i}]'] = offer_id
-        params['group_by[]'] = 'Stat.offer_id'
-        
-        try:
-            # Build URL with parameters
-            query_string = urllib.parse.urlencode(params, doseq=True)
-            url = f"{self.working_endpoint}?{query_string}"
-            
-            # Make request
-            with urllib.request.urlopen(url, timeout=15) as response:
-                if response.status == 200:
-                    data = json.loads(response.read().decode())
-                    if 'response' in data and data.get('response', {}).get('status') == 1:
-                        return {
-                            'success': True,
-                            'source': 'EMBEDDED_URLLIB_API',
-                            'raw_data': data,
-                            'api_status': '✅ Embedded urllib API Working'
-                        }
-                return {'success': False, 'error': f"HTTP {response.status}", 'source': 'HTTP_ERROR'}
-        except Exception as e:
-            return {'success': False, 'error': str(e), 'source': 'CONNECTION_ERROR'}
-    
-    def get_tune_style_report(self, start_date: str = None, end_date: str = None):
-        """Generate Mike's popup campaign report with REAL HasOffers data"""
-        try:
-            # Default to last 7 days for current performance
-            if not start_date:
-                start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            if not end_date:
-                end_date = datetime.now().strftime('%Y-%m-%d')
-                
-            api_result = self._make_hasoffers_request(
-                method='getStats',
-                data_start=start_date,
-                data_end=end_date
-            )
-            
-            if not api_result.get('success'):
-                return {
-                    'success': False,
-                    'error': f"HasOffers API error: {api_result.get('error')}",
-                    'data': [],
-                    'summary': {},
-                    'source': 'Embedded HasOffers API Error'
-                }
-            
-            # Process the real data with safety checks
-            try:
-                raw_data = api_result['raw_data']
-                response_data = raw_data['response']['data']
-                
-                print(f"🔧 DEBUG: response_data type: {type(response_data)}")
-                print(f"🔧 DEBUG: response_data keys: {list(response_data.keys()) if isinstance(response_data, dict) else 'NOT_DICT'}")
-                
-                campaign_data = response_data.get('data', [])
-                print(f"🔧 DEBUG: campaign_data type: {type(campaign_data)}")
-                
-                # Check totals structure carefully
-                totals_raw = response_data.get('totals', {})
-                print(f"🔧 DEBUG: totals_raw type: {type(totals_raw)}")
-                
-                if isinstance(totals_raw, dict):
-                    totals = totals_raw.get('Stat', {})
-                    print(f"🔧 DEBUG: totals type: {type(totals)}")
-                else:
-                    print(f"🔧 DEBUG: totals_raw is not dict, it's: {totals_raw}")
-                    totals = {}
-                
-            except Exception as data_error:
-                print(f"🔧 DEBUG: Error extracting data: {data_error}")
-                return {
-                    'success': False,
-                    'error': f"Data extraction error: {str(data_error)}",
-                    'data': [],
-                    'summary': {},
-                    'source': 'Embedded Data Processing Error'
-                }
-            
-            campaign_names = {
-                6998: "Trading Tips", 7521: "Behind The Markets", 
-                7389: "Brownstone Research", 7385: "Hotsheets", 7390: "Best Gold"
-            }
-            
-            # Extract real totals
-            total_clicks = int(totals.get('clicks', 0))
-            total_conversions = int(totals.get('conversions', 0))
-            total_revenue = float(totals.get('revenue', 0))
-            total_payout = float(totals.get('payout', 0))
-            
-            # Create campaign lookup with error handling
-            campaign_lookup = {}
-            for campaign in campaign_data:
-                try:
-                    if isinstance(campaign, dict):
-                        stats = campaign.get('Stat', {})
-                        if isinstance(stats, dict):
-                            offer_id_raw = stats.get('offer_id', 0)
-                            offer_id = int(offer_id_raw) if offer_id_raw and str(offer_id_raw).strip() else 0
-                            campaign_lookup[offer_id] = stats
-                        else:
-                            print(f"🔧 DEBUG: stats is not dict: {type(stats)}")
-                    else:
-                        print(f"🔧 DEBUG: campaign is not dict: {type(campaign)}")
-                except Exception as e:
-                    print(f"🔧 DEBUG: Error processing campaign: {e}")
-                    continue
-            
-            # Build report with real per-campaign data
-            report_data = []
-            for offer_id, name in campaign_names.items():
-                campaign_stats = campaign_lookup.get(offer_id, {})
-                clicks = int(campaign_stats.get('clicks', 0))
-                conversions = int(campaign_stats.get('conversions', 0))
-                revenue = float(campaign_stats.get('revenue', 0))
-                payout = float(campaign_stats.get('payout', 0))
-                
-                impressions = clicks * 15 if clicks > 0 else 0
-                ctr = (clicks / impressions * 100) if impressions > 0 else 0
-                rpm = (revenue / impressions * 1000) if impressions > 0 else 0
-                rpc = (revenue / clicks) if clicks > 0 else 0
-                
-                report_data.append({
-                    'offer': name, 'partner': 'MFF', 'campaign': name, 'creative': 'N/A',
-                    'impressions': impressions, 'clicks': clicks, 'conversions': conversions,
-                    'payout': round(payout, 2), 'cpm': 0.0, 'revenue': round(revenue, 2),
-                    'rpm': round(rpm, 2), 'rpc': round(rpc, 2), 
-                    'profit': round(revenue - payout, 2), 'ctr': round(ctr, 2)
-                })
-            
-            return {
-                'success': True,
-                'period': f"{start_date} to {end_date} (August 2025)",
-                'data': report_data,
-                'summary': {
-                    'total_campaigns': len(report_data),
-                    'total_impressions': sum(row['impressions'] for row in report_data),
-                    'total_clicks': total_clicks,
-                    'total_conversions': total_conversions,
-                    'total_revenue': round(total_revenue, 2),
-                    'total_payout': round(total_payout, 2)
-                },
-                'source': 'EMBEDDED HasOffers API ✅',
-                'api_status': '✅ Embedded API Working!',
-                'real_totals': {
-                    'clicks': total_clicks, 'conversions': total_conversions,
-                    'revenue': total_revenue, 'payout': total_payout
-                }
-            }
-        except Exception as e:
-            return {'success': False, 'error': str(e), 'data': [], 'summary': {}, 'source': 'Embedded API Error'}
-
-# Create embedded client instance
-tune_client = EmbeddedTuneAPIClient()
-print("✅ Embedded Tune API client created successfully")
-
 router = APIRouter()
 
 @router.get("/debug-table")
@@ -289,6 +114,7 @@ async def ensure_money_campaign():
                 """
             )
         conn.commit()
+        catalog.invalidate("ensure-money")
         # Return current count for verification
         cnt = conn.execute("SELECT COUNT(*) FROM campaigns WHERE active = 1").fetchone()[0]
         return {"success": True, "message": "Money.com ensured", "active_campaigns": int(cnt)}
@@ -359,6 +185,7 @@ async def fix_missing_offer_ids():
                     errors.append({"id": campaign_id, "name": name, "error": str(e)})
         
         conn.commit()
+        catalog.invalidate("fix-missing-offer-ids")
         
         return {
             "success": True,
@@ -374,76 +201,6 @@ async def fix_missing_offer_ids():
     finally:
         conn.close()
 
-@router.get("/test-tune-api")
-async def test_tune_api():
-    """Test if Tune API is accessible from Railway"""
-    import os
-    
-    # Comprehensive file system exploration
-    current_dir = os.getcwd()
-    
-    # Check multiple possible locations for the file
-    possible_paths = [
-        "/app/popup-system/api/tune_api_integration.py",
-        "/app/api/tune_api_integration.py", 
-        "/app/tune_api_integration.py",
-        os.path.join(current_dir, "tune_api_integration.py"),
-        os.path.join(current_dir, "..", "tune_api_integration.py")
-    ]
-    
-    file_locations = {}
-    for path in possible_paths:
-        file_locations[path] = os.path.exists(path)
-    
-    # List files in current directory and parent directories
-    current_files = os.listdir(current_dir) if os.path.exists(current_dir) else []
-    parent_dir = os.path.dirname(current_dir)
-    parent_files = os.listdir(parent_dir) if os.path.exists(parent_dir) else []
-    
-    debug_info = {
-        "current_working_directory": current_dir,
-        "parent_directory": parent_dir,
-        "files_in_current_dir": current_files,
-        "files_in_parent_dir": parent_files,
-        "tune_api_available": TUNE_API_AVAILABLE,
-        "file_search_results": file_locations,
-        "tune_file_in_current": "tune_api_integration.py" in current_files,
-        "tune_file_in_parent": "tune_api_integration.py" in parent_files
-    }
-    
-    if not TUNE_API_AVAILABLE or tune_client is None:
-        return {
-            "status": "error", 
-            "message": "Tune API client not imported",
-            "debug": debug_info
-        }
-    
-    try:
-        import requests
-        # Test basic connectivity
-        response = requests.get("https://currentpublisher.api.hasoffers.com/", timeout=10)
-        
-        # Test actual Tune API call
-        tune_result = tune_client.get_stats()
-        
-        return {
-            "status": "success",
-            "tune_api_available": TUNE_API_AVAILABLE,
-            "basic_connectivity": response.status_code,
-            "tune_api_result": {
-                "success": tune_result.get('success'),
-                "source": tune_result.get('source'),
-                "error": tune_result.get('error')
-            },
-            "debug": debug_info
-        }
-    except Exception as e:
-        return {
-            "status": "error", 
-            "message": str(e),
-            "tune_api_available": TUNE_API_AVAILABLE,
-            "debug": debug_info
-        }
 
 # Pydantic models for request/response
 class CampaignCreate(BaseModel):
@@ -508,95 +265,6 @@ async def get_all_campaigns():
     finally:
         conn.close()
 
-@router.get("/analytics/tune-inspect")
-async def tune_inspect(preset: str = "last_7_days"):
-    """Diagnostic: Compare unfiltered vs sub-filtered Tune stats per affiliate.
-
-    Finance (aff_id=43045): filter Stat.aff_sub5 LIKE 'popup_%'
-    Lifestyle (aff_id=42946): filter Stat.aff_sub2 = 'perks'
-    """
-    try:
-        # Resolve dates from preset
-        if preset == "today":
-            start_date = end_date = datetime.now().strftime('%Y-%m-%d')
-        elif preset == "yesterday":
-            y = datetime.now() - timedelta(days=1)
-            start_date = end_date = y.strftime('%Y-%m-%d')
-        elif preset == "last_7_days":
-            start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        elif preset == "last_30_days":
-            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        else:
-            start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            end_date = datetime.now().strftime('%Y-%m-%d')
-
-        import urllib.request, urllib.parse, json, ssl
-        api_key = "NETfeRuo7FOO72yOcwOXj5jK0aCYve"
-        url = "https://currentpublisher.api.hasoffers.com/v3/Report.json"
-        ssl_ctx = ssl.create_default_context(); ssl_ctx.check_hostname = False; ssl_ctx.verify_mode = ssl.CERT_NONE
-
-        def call(params: dict):
-            query = urllib.parse.urlencode(params, doseq=True)
-            with urllib.request.urlopen(f"{url}?{query}", timeout=15, context=ssl_ctx) as resp:
-                data = json.loads(resp.read().decode())
-                return data
-
-        # Active offer ids
-        db_conn = get_db_connection()
-        cursor = db_conn.execute("SELECT DISTINCT offer_id, aff_id FROM campaigns WHERE active = 1 AND offer_id IS NOT NULL")
-        rows = cursor.fetchall(); db_conn.close()
-        offer_ids = [int(r[0]) for r in rows if r[0]]
-        aff_ids = sorted({str(r[1]) for r in rows if r[1]})
-
-        base = {
-            'NetworkToken': api_key,
-            'Target': 'Report',
-            'Method': 'getStats',
-            'data_start': start_date,
-            'data_end': end_date,
-            'fields[]': ['Stat.clicks','Stat.conversions','Stat.revenue','Stat.offer_id','Stat.affiliate_id'],
-            'group_by[]': ['Stat.offer_id','Stat.affiliate_id'],
-            'limit': 1000
-        }
-        # add offer filters
-        for i, oid in enumerate(offer_ids):
-            base[f'filters[Stat.offer_id][values][{i}]'] = int(oid)
-        base['filters[Stat.offer_id][conditional]'] = 'EQUAL_TO'
-
-        # Unfiltered by sub parameters, but restricted to our affiliates
-        unfiltered = dict(base)
-        unfiltered['filters[Stat.affiliate_id][conditional]'] = 'EQUAL_TO'
-        for i, aid in enumerate(aff_ids):
-            unfiltered[f'filters[Stat.affiliate_id][values][{i}]'] = aid
-        unfiltered_resp = call(unfiltered)
-
-        # Filtered calls per affiliate
-        filtered_results = []
-        for aid in aff_ids:
-            params = dict(base)
-            params['filters[Stat.affiliate_id][conditional]'] = 'EQUAL_TO'
-            params['filters[Stat.affiliate_id][values][0]'] = aid
-            if aid == '43045':
-                params['filters[Stat.aff_sub5][conditional]'] = 'LIKE'
-                params['filters[Stat.aff_sub5][values][0]'] = 'popup_%'
-            elif aid == '42946':
-                params['filters[Stat.aff_sub2][conditional]'] = 'EQUAL_TO'
-                params['filters[Stat.aff_sub2][values][0]'] = 'perks'
-            filtered_results.append({'affiliate_id': aid, 'response': call(params), 'params': params})
-
-        return {
-            'success': True,
-            'preset': preset,
-            'period': f"{start_date} to {end_date}",
-            'affiliates': aff_ids,
-            'offer_ids': offer_ids,
-            'unfiltered': {'params': unfiltered, 'raw': unfiltered_resp},
-            'filtered': filtered_results
-        }
-    except Exception as e:
-        return {'success': False, 'error': str(e)}
 
 @router.get("/analytics/local-offer-counts")
 async def local_offer_counts(preset: str = "last_7_days"):
@@ -623,44 +291,17 @@ async def local_offer_counts(preset: str = "last_7_days"):
 
         conn = get_db_connection()
         try:
-            # Impressions per offer
-            imp_cur = conn.execute(
-                """
-                SELECT c.offer_id, c.name, COUNT(*) as impressions
-                FROM impressions i
-                JOIN campaigns c ON c.id = i.campaign_id
-                WHERE DATE(i.timestamp) BETWEEN ? AND ?
-                GROUP BY c.offer_id, c.name
-                """,
-                (start_date, end_date)
-            )
-            impressions = {str(row[0]): {"offer_id": str(row[0]), "offer": row[1], "impressions": int(row[2])} for row in imp_cur.fetchall()}
-
-            # Clicks per offer
-            clk_cur = conn.execute(
-                """
-                SELECT c.offer_id, c.name, COUNT(*) as clicks, COALESCE(SUM(revenue_estimate), 0) as revenue
-                FROM clicks cl
-                JOIN campaigns c ON c.id = cl.campaign_id
-                WHERE DATE(cl.timestamp) BETWEEN ? AND ?
-                GROUP BY c.offer_id, c.name
-                """,
-                (start_date, end_date)
-            )
-            clicks = {str(row[0]): {"clicks": int(row[2]), "revenue_local": float(row[3] or 0)} for row in clk_cur.fetchall()}
-
-            # Merge
-            all_offer_ids = set(list(impressions.keys()) + list(clicks.keys()))
+            # Impressions, clicks and revenue per offer (each fact side aggregated separately)
+            start_hour, end_hour = rollups.day_bounds(start_date, end_date)
+            report = reports.aggregate(conn, ("offer_id",), attributes=("campaign_name",), start_hour=start_hour, end_hour=end_hour)
             rows = []
-            for oid in sorted(all_offer_ids):
-                base = {"offer_id": oid, "offer": impressions.get(oid, {"offer": None}).get("offer")}
-                imp = impressions.get(oid, {"impressions": 0})
-                clk = clicks.get(oid, {"clicks": 0, "revenue_local": 0.0})
+            for row in sorted(report, key=lambda r: str(r["offer_id"])):
                 rows.append({
-                    **base,
-                    "impressions": imp.get("impressions", 0),
-                    "clicks": clk.get("clicks", 0),
-                    "revenue_local": round(clk.get("revenue_local", 0.0), 2)
+                    "offer_id": str(row["offer_id"]),
+                    "offer": row["campaign_name"],
+                    "impressions": row["impressions"],
+                    "clicks": row["clicks"],
+                    "revenue_local": round(row["revenue"], 2)
                 })
 
             return {
@@ -680,10 +321,15 @@ async def local_offer_counts(preset: str = "last_7_days"):
     except Exception as e:
         return {"success": False, "error": str(e)}
 
+# RPM ordering moves with traffic, so the encoded optimized feed is reused for a short window
+OPTIMIZED_FEED_TTL = 30
+_optimized_feed_cache = {}
+
 @router.get("/campaigns/by-host-optimized", response_model=List[dict])
 async def get_campaigns_by_host_optimized(request: Request, host: Optional[str] = None, property: Optional[str] = None):
     """Get campaigns for property with Mike's optimization: Featured first, then RPM-ordered"""
     # Use explicit property parameter if provided, otherwise detect from hostname
+    vary = None
     if property and property in ['mff', 'mmm', 'mcad', 'mmd']:
         property_code = property.lower()
     else:
@@ -694,72 +340,41 @@ async def get_campaigns_by_host_optimized(request: Request, host: Optional[str]
             hostname = (forwarded or header_host or "").split(",")[0].strip().lower()
             if ":" in hostname:
                 hostname = hostname.split(":")[0]
+            vary = HOST_HEADERS_VARY  # resolved from request headers
         property_code = detect_property_code_from_host(hostname)
+
+    snapshot = catalog.get_snapshot()
+    capped = cap_enforcer.capped_ids(property_code, snapshot)
+    cache_version = (snapshot.version, cap_enforcer.generation)
+    cached = _optimized_feed_cache.get(property_code)
+    if cached and cached[0] == cache_version and cached[1] > time.time():
+        return cached_json_response(request, cached[2], cached[3], vary=vary)
     
-    conn = get_db_connection()
-    try:
-        # Get featured campaign for this property
-        cursor = conn.execute("""
-            SELECT featured_campaign_id FROM properties WHERE code = ?
-        """, (property_code,))
-        
-        featured_row = cursor.fetchone()
-        featured_campaign_id = featured_row[0] if featured_row else None
-        
-        # Get all active campaigns for this property with RPM calculation
-        cursor = conn.execute("""
-            SELECT 
-                c.id,
-                c.name,
-                c.tune_url,
-                c.logo_url,
-                c.main_image_url,
-                c.description,
-                c.cta_text,
-                c.offer_id,
-                c.aff_id,
-                c.active as campaign_active,
-                cp.visibility_percentage,
-                cp.active as property_active,
-                -- Calculate RPM (Revenue Per Mille impressions)
-                CASE 
-                    WHEN COALESCE(impressions_count.total, 0) = 0 THEN 0
-                    ELSE (COALESCE(revenue.total, 0) * 1000.0) / impressions_count.total
-                END as rpm
-            FROM campaigns c
-            JOIN campaign_properties cp ON c.id = cp.campaign_id
-            LEFT JOIN (
-                SELECT campaign_id, COUNT(*) as total
-                FROM impressions 
-                WHERE property_code = ?
-                GROUP BY campaign_id
-            ) impressions_count ON c.id = impressions_count.campaign_id
-            LEFT JOIN (
-                SELECT campaign_id, SUM(revenue_estimate) as total
-                FROM clicks 
-                WHERE property_code = ?
-                GROUP BY campaign_id
-            ) revenue ON c.id = revenue.campaign_id
-            WHERE c.active = 1 AND cp.active = 1 AND cp.property_code = ?
-            ORDER BY 
-                -- Featured campaign first
-                CASE WHEN c.id = ? THEN 0 ELSE 1 END,
-                -- Then by RPM (highest first)
-                rpm DESC,
-                -- Finally by creation date as fallback
-                c.created_at DESC
-        """, (property_code, property_code, property_code, featured_campaign_id))
-        
-        campaigns = [dict(row) for row in cursor.fetchall()]
-        
-        # Add debug info
-        for campaign in campaigns:
-            campaign['is_featured'] = campaign['id'] == featured_campaign_id
-            campaign['rpm'] = round(float(campaign.get('rpm', 0)), 2)
-        
-        return campaigns
-    finally:
-        conn.close()
+    featured_campaign_id = snapshot.featured_campaign_id(property_code)
+
+    # RPM comes from the incrementally maintained rollup - O(campaigns), not O(all-time events)
+    with db_connection() as conn:
+        rpm_by_campaign = rollups.get_property_rpm(conn, property_code)
+
+    campaigns = []
+    for row in snapshot.feed(property_code):
+        if row['id'] in capped:
+            continue
+        campaign = dict(row)
+        campaign['rpm'] = rpm_by_campaign.get(campaign['id'], 0.0)
+        campaign['is_featured'] = campaign['id'] == featured_campaign_id
+        campaigns.append(campaign)
+
+    # Featured campaign first, then by RPM (highest first); the feed is already newest-first,
+    # so the stable sort keeps creation date as the final tiebreaker
+    campaigns.sort(key=lambda c: (not c['is_featured'], -c['rpm']))
+    for campaign in campaigns:
+        campaign['rpm'] = round(float(campaign['rpm']), 2)
+
+    body = encode_json(campaigns)
+    etag = strong_etag(body)
+    _optimized_feed_cache[property_code] = (cache_version, time.time() + OPTIMIZED_FEED_TTL, body, etag)
+    return cached_json_response(request, body, etag, vary=vary)
 
 @router.get("/campaigns/by-host", response_model=List[dict])
 async def get_campaigns_by_host(request: Request, host: Optional[str] = None):
@@ -773,71 +388,21 @@ async def get_campaigns_by_host(request: Request, host: Optional[str] = None):
             hostname = hostname.split(":")[0]
 
     property_code = detect_property_code_from_host(hostname)
-    
-    # Use the same simple query as the properties endpoint that works
-    conn = get_db_connection()
-    try:
-        cursor = conn.execute("""
-            SELECT 
-                c.id,
-                c.name,
-                c.tune_url,
-                c.logo_url,
-                c.main_image_url,
-                c.description,
-                c.cta_text,
-                c.offer_id,
-                c.aff_id,
-                c.active as campaign_active,
-                cp.visibility_percentage,
-                cp.active as property_active
-            FROM campaigns c
-            JOIN campaign_properties cp ON c.id = cp.campaign_id
-            WHERE c.active = 1 AND cp.active = 1 AND cp.property_code = ?
-            ORDER BY c.created_at DESC
-        """, (property_code,))
-        
-        campaigns = [dict(row) for row in cursor.fetchall()]
-        return campaigns
-    finally:
-        conn.close()
+
+    # Pre-encoded feed from the in-memory catalog snapshot, minus campaigns at today's cap
+    body, etag = cap_enforcer.feed_payload(catalog.get_snapshot(), property_code)
+    # Resolved from request headers unless ?host= was given
+    return cached_json_response(request, body, etag, vary=None if (host or "").strip() else HOST_HEADERS_VARY)
 
 @router.get("/campaigns/{property_code}")
-async def get_campaigns_for_property(property_code: str):
+async def get_campaigns_for_property(request: Request, property_code: str):
     """Get active campaigns for specific property (for popup script)"""
     if property_code not in ['mff', 'mmm', 'mcad', 'mmd']:
         raise HTTPException(status_code=400, detail="Invalid property code")
     
-    # Use the exact same logic as the working /properties/{code}/campaigns endpoint
-    conn = get_db_connection()
-    try:
-        cursor = conn.execute("""
-            SELECT 
-                c.id,
-                c.name,
-                c.tune_url,
-                c.logo_url,
-                c.main_image_url,
-                c.description,
-                c.cta_text,
-                c.offer_id,
-                c.aff_id,
-                c.active as campaign_active,
-                cp.visibility_percentage,
-                cp.active as property_active
-            FROM campaigns c
-            JOIN campaign_properties cp ON c.id = cp.campaign_id
-            WHERE cp.property_code = ? AND c.active = 1 AND cp.active = 1
-            ORDER BY c.created_at DESC
-        """, (property_code,))
-        
-        campaigns = []
-        for row in cursor.fetchall():
-            campaigns.append(dict(row))
-        
-        return campaigns
-    finally:
-        conn.close()
+    # Pre-encoded feed from the in-memory catalog snapshot, minus campaigns at today's cap
+    body, etag = cap_enforcer.feed_payload(catalog.get_snapshot(), property_code)
+    return cached_json_response(request, body, etag)
 
 
 class PropertySetting(BaseModel):
@@ -913,6 +478,7 @@ async def upsert_campaign_properties(campaign_id: int, settings: dict):
             )
 
         conn.commit()
+        catalog.invalidate("upsert_campaign_properties")
         return {"success": True, "message": "Property settings saved"}
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Failed to save settings: {str(e)}")
@@ -934,6 +500,7 @@ async def create_campaign(campaign: CampaignCreate):
             aff_id=campaign.aff_id,
             featured=campaign.featured
         )
+        catalog.invalidate("create_campaign")
         return {"id": campaign_id, "message": "Campaign created successfully"}
     except sqlite3.Error as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
@@ -971,6 +538,7 @@ async def update_campaign(campaign_id: int, updates: CampaignUpdate):
             raise HTTPException(status_code=404, detail="Campaign not found")
         
         conn.commit()
+        catalog.invalidate("update_campaign")
         return {"message": "Campaign updated successfully"}
         
     except sqlite3.Error as e:
@@ -993,6 +561,7 @@ async def delete_campaign(campaign_id: int):
             raise HTTPException(status_code=404, detail="Campaign not found")
         
         conn.commit()
+        catalog.invalidate("delete_campaign")
         return {"message": "Campaign deactivated successfully"}
         
     except sqlite3.Error as e:
@@ -1015,6 +584,7 @@ async def hard_delete_campaign(campaign_id: int):
             raise HTTPException(status_code=404, detail="Campaign not found")
         
         conn.commit()
+        catalog.invalidate("hard_delete_campaign")
         return {"message": "Campaign permanently deleted"}
         
     except sqlite3.Error as e:
@@ -1044,77 +614,96 @@ async def get_active_campaigns_for_property(property_code: str):
         raise HTTPException(status_code=500, detail=f"Failed to fetch campaigns: {str(e)}")
 
 
+def _event_text(data: dict, field: str, default: str = "", limit: Optional[int] = None) -> str:
+    """Optional text field as str (numbers are accepted and stringified, objects are rejected)"""
+    value = data.get(field)
+    if value is None or value == "":
+        return default
+    if isinstance(value, (dict, list)):
+        raise HTTPException(status_code=400, detail=f"Invalid {field}: expected a string")
+    value = str(value)
+    return value[:limit] if limit else value
+
+
+def _event_row(kind: str, data: dict, request: Request) -> tuple:
+    """Validate a tracking payload and build the row queued for the ingestion writer
+
+    Rows are written in batches, so anything the INSERT would reject (NULLs, wrong types) must be
+    refused here - one bad row would otherwise fail the whole batch.
+    """
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Expected a JSON object")
+
+    # Basic validation
+    required_fields = ["campaign_id", "property_code"]
+    for field in required_fields:
+        if field not in data:
+            raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
+
+    campaign_id = data["campaign_id"]
+    if isinstance(campaign_id, bool):
+        raise HTTPException(status_code=400, detail="Invalid campaign_id: expected an integer")
+    try:
+        campaign_id = int(campaign_id)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid campaign_id: expected an integer")
+    property_code = _event_text(data, "property_code")
+    if not property_code:
+        raise HTTPException(status_code=400, detail="Invalid property_code: expected a non-empty string")
+
+    row = [
+        campaign_id,
+        property_code,
+        _event_text(data, "session_id"),
+        _event_text(data, "placement", "thankyou"),
+        _event_text(data, "user_agent", limit=255),  # Limit user agent length
+        _event_text(data, "timestamp", datetime.now().isoformat()),
+        hash(str(request.client.host)) if request.client else 0,  # Simple IP hash
+    ]
+    if kind == "click":
+        row.append(0.45)  # Default estimated revenue (Mike's proven CPL)
+    row.extend([
+        _event_text(data, "source", limit=100),        # Phase 2: Traffic source
+        _event_text(data, "subsource", limit=100),     # Phase 2: Traffic subsource
+        _event_text(data, "utm_campaign", limit=100),  # Phase 2: Campaign parameter
+        _event_text(data, "referrer", limit=255),      # Phase 2: Referrer URL
+        _event_text(data, "landing_page", limit=255),  # Phase 2: Landing page URL
+        int(time.time()),                              # ts_epoch: server receipt time, what reports filter on
+    ])
+    return tuple(row)
+
+
 @router.post("/impression")
 async def track_impression(request: Request):
     """Track popup impression event"""
     try:
         data = await request.json()
-        
-        # Basic validation
-        required_fields = ["campaign_id", "property_code"]
-        for field in required_fields:
-            if field not in data:
-                raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
-        
-        conn = get_db_connection()
-        
-        # Insert impression record with Phase 2 tracking
-        conn.execute("""
-            INSERT INTO impressions (
-                campaign_id, property_code, session_id, placement, 
-                user_agent, timestamp, ip_hash, source, subsource, 
-                utm_campaign, referrer, landing_page
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data["campaign_id"],
-            data["property_code"],
-            data.get("session_id", ""),
-            data.get("placement", "thankyou"),
-            data.get("user_agent", "")[:255],  # Limit user agent length
-            data.get("timestamp", datetime.now().isoformat()),
-            hash(str(request.client.host)) if request.client else 0,  # Simple IP hash
-            data.get("source", "")[:100],      # Phase 2: Traffic source
-            data.get("subsource", "")[:100],   # Phase 2: Traffic subsource
-            data.get("utm_campaign", "")[:100], # Phase 2: Campaign parameter
-            data.get("referrer", "")[:255],    # Phase 2: Referrer URL
-            data.get("landing_page", "")[:255] # Phase 2: Landing page URL
-        ))
-        
-        conn.commit()
+        row = _event_row("impression", data, request)
+
+        # Queue for the batched writer instead of INSERT + COMMIT on the event loop
+        await ingestor.submit("impression", row)
         
         # 🎯 FIRE TUNE IMPRESSION PIXEL (This was missing!)
-        # Get campaign details for Tune pixel
-        cursor = conn.execute("""
-            SELECT offer_id, aff_id FROM campaigns WHERE id = ?
-        """, (data["campaign_id"],))
-        
-        campaign_result = cursor.fetchone()
-        conn.close()
+        # Campaign details come from the in-memory catalog - no DB round trip
+        campaign = catalog.get_snapshot().campaign(row[0])
         
-        tune_pixel_fired = False
-        if campaign_result:
-            offer_id, aff_id = campaign_result
-            if offer_id and aff_id:
-                # Fire Tune impression pixel
-                import httpx
-                tune_pixel_url = f"https://track.modemobile.com/aff_i?offer_id={offer_id}&aff_id={aff_id}"
-                
-                try:
-                    async with httpx.AsyncClient() as client:
-                        await client.get(tune_pixel_url, timeout=3.0)
-                    tune_pixel_fired = True
-                except Exception as pixel_error:
-                    # Don't fail the whole request if pixel fails
-                    print(f"⚠️ Tune pixel failed: {pixel_error}")
+        tune_pixel_queued = False
+        if campaign:
+            # Fired in the background by the pixel dispatcher - the response never waits on Tune
+            tune_pixel_queued = pixel_dispatcher.fire_impression(campaign.get("offer_id"), campaign.get("aff_id"))
         
         return {
             "success": True,
             "message": "Impression tracked successfully",
-            "campaign_id": data["campaign_id"],
-            "property_code": data["property_code"],
-            "tune_pixel_fired": tune_pixel_fired
+            "campaign_id": row[0],
+            "property_code": row[1],
+            "tune_pixel_queued": tune_pixel_queued
         }
         
+    except HTTPException:
+        raise
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to track impression: {str(e)}")
 
@@ -1124,51 +713,53 @@ async def track_click(request: Request):
     """Track popup click event"""
     try:
         data = await request.json()
-        
-        # Basic validation
-        required_fields = ["campaign_id", "property_code"]
-        for field in required_fields:
-            if field not in data:
-                raise HTTPException(status_code=400, detail=f"Missing required field: {field}")
-        
-        conn = get_db_connection()
-        
-        # Insert click record with Phase 2 tracking
-        conn.execute("""
-            INSERT INTO clicks (
-                campaign_id, property_code, session_id, placement,
-                user_agent, timestamp, ip_hash, revenue_estimate,
-                source, subsource, utm_campaign, referrer, landing_page
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
-            data["campaign_id"],
-            data["property_code"],
-            data.get("session_id", ""),
-            data.get("placement", "thankyou"),
-            data.get("user_agent", "")[:255],  # Limit user agent length
-            data.get("timestamp", datetime.now().isoformat()),
-            hash(str(request.client.host)) if request.client else 0,  # Simple IP hash
-            0.45,  # Default estimated revenue (Mike's proven CPL)
-            data.get("source", "")[:100],      # Phase 2: Traffic source
-            data.get("subsource", "")[:100],   # Phase 2: Traffic subsource
-            data.get("utm_campaign", "")[:100], # Phase 2: Campaign parameter
-            data.get("referrer", "")[:255],    # Phase 2: Referrer URL
-            data.get("landing_page", "")[:255] # Phase 2: Landing page URL
-        ))
-        
-        conn.commit()
-        conn.close()
+        row = _event_row("click", data, request)
+
+        # Queue for the batched writer instead of INSERT + COMMIT on the event loop
+        await ingestor.submit("click", row)
         
         return {
             "success": True,
             "message": "Click tracked successfully",
-            "campaign_id": data["campaign_id"],
-            "property_code": data["property_code"]
+            "campaign_id": row[0],
+            "property_code": row[1]
         }
         
+    except HTTPException:
+        raise
+    except IngestQueueFull as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to track click: {str(e)}")
 
+@router.get("/ingest/stats")
+async def ingest_stats():
+    """Ingestion pipeline counters: queue depth, batches flushed, dropped/failed events"""
+    return ingestor.stats()
+
+@router.get("/pixels/stats")
+async def pixel_stats():
+    """Tune pixel dispatcher counters: queued, fired, dropped, failed"""
+    return pixel_dispatcher.stats()
+
+@router.get("/caps/status")
+async def cap_status():
+    """Daily cap counters (EST day), capped campaigns per property and next rollover"""
+    return cap_enforcer.status()
+
+@router.get("/events/partitions")
+async def event_partition_status():
+    """Hot window, archived event months (row counts, compressed size) and compaction counters"""
+    return event_partitions.status()
+
+@router.post("/events/compact")
+async def compact_events():
+    """Archive every whole month of impressions/clicks older than EVENT_HOT_DAYS now"""
+    try:
+        return {"success": True, **(await run_in_threadpool(event_partitions.compact))}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Event compaction failed: {str(e)}")
+
 @router.get("/campaigns/{campaign_id}", response_model=Campaign)
 async def get_campaign_by_id(campaign_id: int):
     """Get single campaign by ID"""
@@ -1222,6 +813,8 @@ async def get_impression_pixel(campaign_id: int):
 @router.get("/analytics/attribution")
 async def get_attribution_analytics(preset: str = "last_30_days"):
     """Phase 2: Get traffic attribution analytics - NOW USING REAL TUNE API"""
+    from routes.tune import get_tune_style_report  # lazily loaded Tune router
+
     try:
         # Get real popup campaign data from TUNE API using the selected preset
         tune_report = await get_tune_style_report(preset=preset)
@@ -1318,51 +911,53 @@ async def _get_local_attribution_analytics():
     """Fallback: Local database attribution analytics"""
     conn = get_db_connection()
     try:
+        window_start = reports.since(days=30)
+
         # Revenue by source
-        cursor = conn.execute("""
-            SELECT 
-                COALESCE(source, 'Unknown') as source,
-                COUNT(*) as clicks,
-                SUM(revenue_estimate) as estimated_revenue,
-                AVG(revenue_estimate) as avg_cpl
-            FROM clicks 
-            WHERE timestamp >= datetime('now', '-30 days')
-            GROUP BY source
-            ORDER BY estimated_revenue DESC
-        """)
-        source_data = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
+        source_data = []
+        for row in reports.aggregate(conn, ("source",), start_hour=window_start):
+            if row["clicks"] > 0:
+                source_data.append({
+                    "source": row["source"],
+                    "clicks": row["clicks"],
+                    "estimated_revenue": row["revenue"],
+                    "avg_cpl": row["revenue"] / row["clicks"]
+                })
+        source_data.sort(key=lambda item: item["estimated_revenue"], reverse=True)
         
         # Revenue by subsource
-        cursor = conn.execute("""
-            SELECT 
-                COALESCE(subsource, 'Unknown') as subsource,
-                COUNT(*) as clicks,
-                SUM(revenue_estimate) as estimated_revenue,
-                AVG(revenue_estimate) as avg_cpl
-            FROM clicks 
-            WHERE timestamp >= datetime('now', '-30 days')
-            GROUP BY subsource
-            ORDER BY estimated_revenue DESC
-        """)
-        subsource_data = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
+        subsource_data = []
+        for row in reports.aggregate(conn, ("subsource",), start_hour=window_start):
+            if row["clicks"] > 0:
+                subsource_data.append({
+                    "subsource": row["subsource"],
+                    "clicks": row["clicks"],
+                    "estimated_revenue": row["revenue"],
+                    "avg_cpl": row["revenue"] / row["clicks"]
+                })
+        subsource_data.sort(key=lambda item: item["estimated_revenue"], reverse=True)
         
-        # Campaign performance with attribution 
-        cursor = conn.execute("""
-            SELECT 
-                c.name as campaign_name,
-                COALESCE(cl.source, i.source, 'Unknown') as source,
-                COUNT(DISTINCT cl.id) as clicks,
-                COUNT(DISTINCT i.id) as impressions,
-                ROUND(CAST(COUNT(DISTINCT cl.id) AS FLOAT) / NULLIF(COUNT(DISTINCT i.id), 0) * 100, 2) as ctr,
-                SUM(cl.revenue_estimate) as estimated_revenue
-            FROM campaigns c
-            LEFT JOIN clicks cl ON c.id = cl.campaign_id AND cl.timestamp >= datetime('now', '-30 days')
-            LEFT JOIN impressions i ON c.id = i.campaign_id AND i.timestamp >= datetime('now', '-30 days')
-            WHERE c.active = 1
-            GROUP BY c.name, COALESCE(cl.source, i.source, 'Unknown')
-            ORDER BY estimated_revenue DESC NULLS LAST
-        """)
-        campaign_data = [dict(zip([col[0] for col in cursor.description], row)) for row in cursor.fetchall()]
+        # Campaign performance with attribution (active campaigns, including ones with no traffic)
+        campaign_data = []
+        seen_campaigns = set()
+        for row in reports.aggregate(conn, ("campaign_name", "source"), start_hour=window_start, active_only=True):
+            seen_campaigns.add(row["campaign_name"])
+            campaign_data.append({
+                "campaign_name": row["campaign_name"],
+                "source": row["source"],
+                "clicks": row["clicks"],
+                "impressions": row["impressions"],
+                "ctr": round(row["clicks"] / row["impressions"] * 100, 2) if row["impressions"] else None,
+                "estimated_revenue": row["revenue"] if row["clicks"] else None
+            })
+        cursor = conn.execute("SELECT DISTINCT name FROM campaigns WHERE active = 1")
+        for (name,) in cursor.fetchall():
+            if name not in seen_campaigns:
+                campaign_data.append({
+                    "campaign_name": name, "source": "Unknown", "clicks": 0, "impressions": 0,
+                    "ctr": None, "estimated_revenue": None
+                })
+        campaign_data.sort(key=lambda item: (item["estimated_revenue"] is None, -(item["estimated_revenue"] or 0)))
         
         return {
             "success": True,
@@ -1382,468 +977,8 @@ async def _get_local_attribution_analytics():
     finally:
         conn.close()
 
-@router.get("/analytics/tune-style-report")
-async def get_tune_style_report(
-    start_date: str = None,
-    end_date: str = None,
-    preset: str = None,
-    property_code: str = None,
-    campaign_id: int = None
-):
-    """Mike's preferred Tune-style reporting using REAL Tune API data"""
-    try:
-        
-        # Handle date presets first
-        if preset and not start_date and not end_date:
-            if preset == "today":
-                start_date = end_date = datetime.now().strftime('%Y-%m-%d')
-            elif preset == "yesterday":
-                yesterday = datetime.now() - timedelta(days=1)
-                start_date = end_date = yesterday.strftime('%Y-%m-%d')
-            elif preset == "last_7_days":
-                start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-                end_date = datetime.now().strftime('%Y-%m-%d')
-            elif preset == "last_30_days":
-                start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-                end_date = datetime.now().strftime('%Y-%m-%d')
-            elif preset == "this_month":
-                today = datetime.now()
-                start_date = today.replace(day=1).strftime('%Y-%m-%d')
-                end_date = today.strftime('%Y-%m-%d')
-            elif preset == "last_month":
-                today = datetime.now()
-                first_this_month = today.replace(day=1)
-                last_month = first_this_month - timedelta(days=1)
-                start_date = last_month.replace(day=1).strftime('%Y-%m-%d')
-                end_date = last_month.strftime('%Y-%m-%d')
-        
-        # Default to last 30 days if no dates provided (to match Tune API)
-        if not start_date and not end_date:
-            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-            end_date = datetime.now().strftime('%Y-%m-%d')
-        
-        # Check if Tune API is available
-        if not TUNE_API_AVAILABLE or tune_client is None:
-            return {
-                "success": False,
-                "data": [],
-                "summary": {},
-                "source": "Tune API unavailable",
-                "error": "Tune client not available"
-            }
-        
-        # 🎯 GET REAL POPUP CAMPAIGN DATA (FILTERED!)
-        try:
-            import urllib.request
-            import urllib.parse
-            import json
-            import ssl
-            
-            # Direct call to HasOffers API with popup filtering
-            api_key = "NETfeRuo7FOO72yOcwOXj5jK0aCYve"
-            url = "https://currentpublisher.api.hasoffers.com/v3/Report.json"
-            
-            # Use appropriate date range based on preset
-            if not start_date:
-                if preset == 'today':
-                    start_date = datetime.now().strftime('%Y-%m-%d')
-                elif preset == 'last_7_days':
-                    start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-                elif preset == 'last_14_days':
-                    start_date = (datetime.now() - timedelta(days=14)).strftime('%Y-%m-%d')
-                elif preset == 'last_30_days':
-                    start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
-                else:
-                    start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
-            if not end_date:
-                end_date = datetime.now().strftime('%Y-%m-%d')
-            
-            # Get ALL campaigns then filter for popup campaigns in code
-            # (API-level filtering only returns 1 campaign incorrectly)
-            # 🎯 DYNAMIC: Get all active campaign offer IDs from database (future-proof)
-            db_conn = get_db_connection()
-            try:
-                cursor = db_conn.execute("SELECT DISTINCT offer_id FROM campaigns WHERE active = 1 AND offer_id IS NOT NULL")
-                popup_offer_ids = [int(row[0]) for row in cursor.fetchall() if row[0] and str(row[0]).strip()]
-                print(f"📊 Dynamic analytics: Found {len(popup_offer_ids)} active offer IDs: {popup_offer_ids}")
-                
-                # Keep connection open for campaign data query below
-            except Exception as e:
-                print(f"❌ Database error: {e}")
-                db_conn.close()
-                raise
-            
-            params = {
-                'NetworkToken': api_key,
-                'Target': 'Report', 
-                'Method': 'getStats',
-                'data_start': start_date,
-                'data_end': end_date,
-                'fields[]': ['Stat.clicks', 'Stat.conversions', 'Stat.revenue', 'Stat.payout', 'Stat.offer_id'],
-                'group_by[]': 'Stat.offer_id',
-                'limit': 1000
-            }
-            
-            # Add affiliate filter to limit to our traffic only (critical to prevent network-wide totals)
-            affiliate_ids = []
-            try:
-                cursor = db_conn.execute("SELECT DISTINCT aff_id FROM campaigns WHERE active = 1 AND aff_id IS NOT NULL")
-                affiliate_ids = [str(row[0]) for row in cursor.fetchall() if row[0] and str(row[0]).strip()]
-            except Exception as e:
-                print(f"⚠️ Could not load affiliate_ids: {e}")
-
-            if affiliate_ids:
-                params['filters[Stat.affiliate_id][conditional]'] = 'EQUAL_TO'
-                for i, aff in enumerate(affiliate_ids):
-                    params[f'filters[Stat.affiliate_id][values][{i}]'] = aff
 
-            # No additional API filtering by sub params yet – keep simple and accurate by affiliate ID
-            
-            # Build URL
-            query_string = urllib.parse.urlencode(params, doseq=True)
-            full_url = f"{url}?{query_string}"
-            
-            # Disable SSL verification
-            ssl_context = ssl.create_default_context()
-            ssl_context.check_hostname = False
-            ssl_context.verify_mode = ssl.CERT_NONE
-            
-            # Make API call
-            with urllib.request.urlopen(full_url, timeout=15, context=ssl_context) as response:
-                if response.status == 200:
-                    api_data = json.loads(response.read().decode())
-                    
-                    if api_data.get('response', {}).get('status') == 1:
-                        # Extract ALL campaign data and filter for popup campaigns
-                        response_data = api_data.get('response', {}).get('data', {})
-                        all_campaigns = response_data.get('data', [])
-                        
-                        # Filter for popup campaigns in Python code
-                        campaigns = []
-                        for campaign in all_campaigns:
-                            offer_id_raw = campaign.get('Stat', {}).get('offer_id', 0)
-                            offer_id = int(offer_id_raw) if offer_id_raw and str(offer_id_raw).strip() else 0
-                            if offer_id in popup_offer_ids:
-                                campaigns.append(campaign)
-                        
-                        # Calculate popup totals from individual campaigns
-                        popup_clicks = 0
-                        popup_conversions = 0
-                        popup_revenue = 0.0
-                        active_campaigns = []
-                        
-                        # 🎯 DYNAMIC: Get campaign names and properties from database
-                        campaign_data = {}
-                        cursor = db_conn.execute("""
-                            SELECT c.offer_id, c.name, cp.property_code 
-                            FROM campaigns c 
-                            LEFT JOIN campaign_properties cp ON c.id = cp.campaign_id 
-                            WHERE c.active = 1 AND c.offer_id IS NOT NULL
-                        """)
-                        for offer_id, name, property_code in cursor.fetchall():
-                            if offer_id and str(offer_id).strip():
-                                campaign_data[int(offer_id)] = {
-                                    'name': name,
-                                    'property': 'MMM' if property_code == 'mmm' else 'MFF'
-                                }
-
-                        # Get REAL impressions from local DB grouped by offer_id within date range
-                        impressions_params = [start_date, end_date]
-                        impressions_filter_sql = ""
-                        if property_code:
-                            impressions_filter_sql += " AND i.property_code = ?"
-                            impressions_params.append(property_code)
-                        if campaign_id:
-                            impressions_filter_sql += " AND c.id = ?"
-                            impressions_params.append(campaign_id)
-
-                        cursor = db_conn.execute(f"""
-                            SELECT c.offer_id, COUNT(*) as impressions
-                            FROM impressions i
-                            JOIN campaigns c ON c.id = i.campaign_id
-                            WHERE DATE(i.timestamp) BETWEEN ? AND ? {impressions_filter_sql}
-                            GROUP BY c.offer_id
-                        """, impressions_params)
-                        impressions_by_offer = {int(row[0]): int(row[1]) for row in cursor.fetchall() if row[0] and str(row[0]).strip()}
-
-                        # Get LOCAL clicks from our DB grouped by offer_id within date range (align scope with impressions)
-                        clicks_params = [start_date, end_date]
-                        clicks_filter_sql = ""
-                        if property_code:
-                            clicks_filter_sql += " AND cl.property_code = ?"
-                            clicks_params.append(property_code)
-                        if campaign_id:
-                            clicks_filter_sql += " AND c.id = ?"
-                            clicks_params.append(campaign_id)
-
-                        cursor = db_conn.execute(f"""
-                            SELECT c.offer_id, COUNT(*) as clicks, COALESCE(SUM(cl.revenue_estimate), 0) as local_rev
-                            FROM clicks cl
-                            JOIN campaigns c ON c.id = cl.campaign_id
-                            WHERE DATE(cl.timestamp) BETWEEN ? AND ? {clicks_filter_sql}
-                            GROUP BY c.offer_id
-                        """, clicks_params)
-                        clicks_by_offer = {int(row[0]): {"clicks": int(row[1]), "local_rev": float(row[2] or 0)} for row in cursor.fetchall() if row[0] and str(row[0]).strip()}
-                        
-                        # Close database connection after queries complete
-                        db_conn.close()
-                        
-                        # Build combined per-offer rows using REAL impressions and TUNE clicks/revenue/payout
-                        seen_offer_ids = set()
-                        for campaign in campaigns:
-                            stats = campaign.get('Stat', {})
-                            offer_id_raw = stats.get('offer_id', 0)
-                            offer_id = int(offer_id_raw) if offer_id_raw and str(offer_id_raw).strip() else 0
-                            seen_offer_ids.add(offer_id)
-                            campaign_info = campaign_data.get(offer_id, {'name': f'Offer {offer_id}', 'property': 'Unknown'})
-                            name = campaign_info['name']
-                            partner = campaign_info['property']
-                            # Use LOCAL clicks to align with local impressions (Tune clicks are affiliate-wide)
-                            clicks_local_info = clicks_by_offer.get(offer_id, {"clicks": 0, "local_rev": 0.0})
-                            clicks = int(clicks_local_info.get('clicks', 0))
-                            conversions = int(stats.get('conversions', 0))
-                            revenue = float(stats.get('revenue', 0))
-                            payout = float(stats.get('payout', 0) or 0)
-
-                            impressions = int(impressions_by_offer.get(offer_id, 0))
-                            ctr = (clicks / impressions * 100.0) if impressions > 0 else 0.0
-                            rpm = (revenue / impressions * 1000.0) if impressions > 0 else 0.0
-                            rpc = (revenue / clicks) if clicks > 0 else 0.0
-                            profit = revenue - payout
-
-                            # Data quality guard: impressions cannot be less than clicks.
-                            # Per spec, do not fabricate values. Surface N/A and flag.
-                            data_quality = None
-                            if impressions > 0 and clicks > impressions:
-                                data_quality = "impressions_lt_clicks"
-                                ctr = None
-                                rpm = None
-
-                            popup_clicks += clicks
-                            popup_conversions += conversions
-                            popup_revenue += revenue
-
-                            active_campaigns.append({
-                                'offer': name,
-                                'partner': partner,
-                                'campaign': name,
-                                'creative': 'N/A',
-                                'impressions': impressions,
-                                'clicks': clicks,
-                                'conversions': conversions,
-                                'revenue': round(revenue, 2),
-                                'ctr': (round(ctr, 2) if isinstance(ctr, (int, float)) else None),
-                                'rpm': (round(rpm, 2) if isinstance(rpm, (int, float)) else None),
-                                'rpc': round(rpc, 2),
-                                'payout': round(payout, 2),
-                                'profit': round(profit, 2),
-                                'data_quality': data_quality
-                            })
-
-                        # Include offers with impressions but no clicks in period (if any)
-                        for offer_id, impressions in impressions_by_offer.items():
-                            if offer_id in seen_offer_ids:
-                                continue
-                            campaign_info = campaign_data.get(offer_id, {'name': f'Offer {offer_id}', 'property': 'Unknown'})
-                            name = campaign_info['name']
-                            partner = campaign_info['property']
-                            active_campaigns.append({
-                                'offer': name,
-                                'partner': partner,
-                                'campaign': name,
-                                'creative': 'N/A',
-                                'impressions': int(impressions),
-                                'clicks': int(clicks_by_offer.get(offer_id, {}).get('clicks', 0)),
-                                'conversions': 0,
-                                'revenue': 0.0,
-                                'ctr': 0.0,
-                                'rpm': 0.0,
-                                'rpc': 0.0,
-                                'payout': 0.0,
-                                'profit': 0.0
-                            })
-                        
-                        # Use calculated popup totals and return all active campaigns
-                        network_clicks = popup_clicks
-                        network_conversions = popup_conversions
-                        network_revenue = popup_revenue
-                        
-                        # Use active_campaigns list directly (now contains all 12 campaigns with proper attribution)
-                        
-                        # Determine what data we're showing
-                        if network_clicks > 0:
-                            # We have real popup campaign data
-                            source_label = "🎯 REAL HasOffers API (Popup Campaigns Filtered)"
-                            status_msg = f"✅ Real popup campaign data - {len(active_campaigns)} active campaigns"
-                        else:
-                            # No popup campaign activity
-                            source_label = "🎯 REAL HasOffers API (No Popup Activity)"
-                            status_msg = f"✅ Real API filtering worked - no popup activity in {preset}"
-                        
-                        return {
-                            "success": True,
-                            "period": f"{start_date} to {end_date}",
-                            "preset": preset or "custom",
-                            "data": active_campaigns,
-                            "summary": {
-                                'total_campaigns': len(active_campaigns),
-                                'total_impressions': sum(row.get('impressions', 0) for row in active_campaigns),
-                                'total_clicks': network_clicks,
-                                'total_conversions': network_conversions,
-                                'total_revenue': network_revenue
-                            },
-                            "source": source_label,
-                            "api_status": status_msg,
-                            "real_totals": {
-                                'clicks': network_clicks,
-                                'conversions': network_conversions,
-                                'revenue': network_revenue
-                            },
-                            "popup_campaign_count": len(active_campaigns),
-                            "debug": {
-                                "affiliate_ids": affiliate_ids,
-                                "filtered_offer_ids": popup_offer_ids
-                            }
-                        }
-                    else:
-                        raise Exception("HasOffers API returned error status")
-                else:
-                    raise Exception(f"HTTP {response.status}")
-                    
-        except Exception as api_error:
-            # Do NOT fallback. Return explicit failure so UI can show N/A.
-            return {
-                "success": False,
-                "data": [],
-                "summary": {},
-                "source": "Tune API error",
-                "error": str(api_error)
-            }
-            
-    except Exception as e:
-        # Final explicit failure
-        return {
-            "success": False,
-            "data": [],
-            "summary": {},
-            "source": "Tune API error",
-            "error": str(e)
-        }
 
-async def _get_local_tune_style_report(start_date: str, end_date: str, preset: str, property_code: str, campaign_id: int):
-    """Fallback to local database if Tune API is unavailable"""
-    conn = get_db_connection()
-    try:
-        # Build date filter
-        date_filter = ""
-        params = []
-        
-        if start_date and end_date:
-            if start_date == end_date:
-                date_filter = "AND DATE(i.timestamp) = ?"
-                params.append(start_date)
-            else:
-                date_filter = "AND DATE(i.timestamp) BETWEEN ? AND ?"
-                params.extend([start_date, end_date])
-                
-        # Build property filter
-        property_filter = ""
-        if property_code:
-            property_filter = "AND COALESCE(cl.property_code, i.property_code) = ?"
-            params.append(property_code)
-            
-        # Build campaign filter  
-        campaign_filter = ""
-        if campaign_id:
-            campaign_filter = "AND c.offer_id = ?"
-            params.append(campaign_id)
-
-        # Main query matching Mike's Tune screenshot layout
-        query = f"""
-            SELECT 
-                c.name as offer,
-                COALESCE(cl.property_code, i.property_code) as partner,
-                c.name as campaign,
-                COALESCE(c.creative_file, 'N/A') as creative,
-                COUNT(DISTINCT i.id) as impressions,
-                COUNT(DISTINCT cl.id) as clicks,
-                0 as conversions,
-                COALESCE(c.payout_amount, 0.45) as payout,
-                0.0 as cpm,
-                COALESCE(SUM(cl.revenue_estimate), 0) as revenue,
-                CASE 
-                    WHEN COUNT(DISTINCT i.id) > 0 
-                    THEN (COALESCE(SUM(cl.revenue_estimate), 0) / COUNT(DISTINCT i.id)) * 1000 
-                    ELSE 0 
-                END as rpm,
-                CASE 
-                    WHEN COUNT(DISTINCT cl.id) > 0 
-                    THEN COALESCE(SUM(cl.revenue_estimate), 0) / COUNT(DISTINCT cl.id)
-                    ELSE 0 
-                END as rpc,
-                0.0 as profit
-            FROM campaigns c
-            LEFT JOIN impressions i ON c.id = i.campaign_id
-            LEFT JOIN clicks cl ON c.id = cl.campaign_id AND i.property_code = cl.property_code
-            WHERE 1=1 {date_filter} {property_filter} {campaign_filter}
-            GROUP BY c.offer_id, COALESCE(cl.property_code, i.property_code), c.name
-            ORDER BY impressions DESC, revenue DESC
-        """
-        
-        cursor = conn.execute(query, params)
-        columns = [col[0] for col in cursor.description]
-        results = []
-        
-        for row in cursor.fetchall():
-            row_dict = dict(zip(columns, row))
-            # Format numbers nicely
-            row_dict['impressions'] = int(row_dict['impressions'])
-            row_dict['clicks'] = int(row_dict['clicks'])
-            row_dict['revenue'] = round(float(row_dict['revenue']), 2)
-            row_dict['rpm'] = round(float(row_dict['rpm']), 2)
-            row_dict['rpc'] = round(float(row_dict['rpc']), 2)
-            row_dict['payout'] = round(float(row_dict['payout']), 2)
-            # Calculate CTR (Click Through Rate)
-            row_dict['ctr'] = round((row_dict['clicks'] / row_dict['impressions'] * 100) if row_dict['impressions'] > 0 else 0, 2)
-            results.append(row_dict)
-        
-        return {
-            "success": True,
-            "period": f"{start_date} to {end_date}",
-            "preset": preset or "custom",
-            "data": results,
-            "summary": {
-                "total_campaigns": len(results),
-                "total_impressions": sum(r['impressions'] for r in results),
-                "total_clicks": sum(r['clicks'] for r in results),
-                "total_revenue": round(sum(r['revenue'] for r in results), 2),
-                "avg_ctr": round((sum(r['clicks'] for r in results) / sum(r['impressions'] for r in results) * 100) if sum(r['impressions'] for r in results) > 0 else 0, 2),
-                "avg_rpm": round(sum(r['rpm'] for r in results) / len(results) if results else 0, 2),
-                "avg_rpc": round(sum(r['rpc'] for r in results) / len(results) if results else 0, 2)
-            },
-            "source": "Local Database (Tune API unavailable)"
-        }
-        
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
-    finally:
-        conn.close()
-
-@router.get("/analytics/tune-health")
-async def tune_health():
-    """Minimal connectivity check to Tune/HasOffers API.
-
-    Returns a simple ok boolean with optional error details and a timestamp.
-    """
-    from datetime import datetime as _dt
-    try:
-        # Lightweight reachability check without API token
-        import urllib.request
-        with urllib.request.urlopen("https://currentpublisher.api.hasoffers.com/", timeout=5) as resp:
-            ok = (resp.status == 200)
-        return {"ok": bool(ok), "timestamp": _dt.now().isoformat()}
-    except Exception as e:
-        return {"ok": False, "error": str(e), "timestamp": _dt.now().isoformat()}
 
 
 @router.get("/analytics/performance-metrics")
@@ -1852,61 +987,29 @@ async def get_performance_metrics():
     conn = get_db_connection()
     try:
         # Get TODAY's metrics (actual daily data)
-        # PERFORMANCE FIX: Use timestamp comparisons instead of DATE() to use indexes
-        
-        # Count today's impressions (since midnight) - INDEX-OPTIMIZED
-        cursor = conn.execute("""
-            SELECT COUNT(*) FROM impressions 
-            WHERE timestamp >= datetime('now', 'start of day')
-        """)
-        today_impressions = cursor.fetchone()[0]
-        
-        # Count today's clicks - INDEX-OPTIMIZED
-        cursor = conn.execute("""
-            SELECT COUNT(*) FROM clicks 
-            WHERE timestamp >= datetime('now', 'start of day')
-        """)
-        today_clicks = cursor.fetchone()[0]
-        
-        # Sum today's revenue - INDEX-OPTIMIZED
-        cursor = conn.execute("""
-            SELECT COALESCE(SUM(revenue_estimate), 0) FROM clicks 
-            WHERE timestamp >= datetime('now', 'start of day')
-        """)
-        today_revenue = cursor.fetchone()[0]
+        today_start = reports.start_of_today()
+        today = reports.aggregate(conn, start_hour=today_start)[0]
         
         today_data = {
-            'today_impressions': today_impressions,
-            'today_clicks': today_clicks, 
-            'today_revenue': today_revenue
+            'today_impressions': today['impressions'],
+            'today_clicks': today['clicks'], 
+            'today_revenue': today['revenue']
         }
         
-        # Get best performing campaign (today) - INDEX-OPTIMIZED
-        cursor = conn.execute("""
-            SELECT 
-                c.name,
-                COUNT(DISTINCT i.id) as impressions,
-                COUNT(DISTINCT cl.id) as clicks,
-                SUM(cl.revenue_estimate) as revenue
-            FROM campaigns c
-            LEFT JOIN impressions i ON c.id = i.campaign_id
-                AND i.timestamp >= datetime('now', 'start of day')
-            LEFT JOIN clicks cl ON c.id = cl.campaign_id 
-                AND cl.timestamp >= datetime('now', 'start of day')
-                AND i.property_code = cl.property_code
-            WHERE i.id IS NOT NULL
-            GROUP BY c.offer_id, c.name
-            ORDER BY revenue DESC, impressions DESC
-            LIMIT 1
-        """)
-        best_campaign_row = cursor.fetchone()
+        # Get best performing campaign (today)
+        candidates = [
+            row for row in reports.aggregate(conn, ("offer_id", "campaign_name"), start_hour=today_start)
+            if row["impressions"] > 0
+        ]
+        candidates.sort(key=lambda r: (r["revenue"], r["impressions"]), reverse=True)
         best_campaign = {}
-        if best_campaign_row:
+        if candidates:
+            best = candidates[0]
             best_campaign = {
-                "name": best_campaign_row[0],
-                "impressions": int(best_campaign_row[1] or 0),
-                "clicks": int(best_campaign_row[2] or 0),
-                "revenue": round(float(best_campaign_row[3] or 0), 2)
+                "name": best["campaign_name"],
+                "impressions": best["impressions"],
+                "clicks": best["clicks"],
+                "revenue": round(best["revenue"], 2)
             }
         
         return {
@@ -1971,6 +1074,7 @@ async def fix_missing_offer_ids():
                 })
         
         conn.commit()
+        catalog.invalidate("fix-offer-ids")
         
         return {
             "success": True,
@@ -1998,20 +1102,10 @@ async def get_referrer_analytics(days: int = 30, limit: int = 50):
 
     safe_days = max(1, min(int(days), 365))
     safe_limit = max(1, min(int(limit), 500))
-    window = f'-{safe_days} days'
+    window_start = int(time.time()) - safe_days * 86400
 
     conn = get_db_connection()
     try:
-        cursor = conn.execute(
-            """
-            SELECT referrer, landing_page, property_code, campaign_id, timestamp
-            FROM impressions
-            WHERE referrer IS NOT NULL AND referrer <> ''
-              AND timestamp >= datetime('now', ?)
-            """,
-            (window,),
-        )
-
         host_stats = defaultdict(lambda: {
             'impressions': 0,
             'properties': set(),
@@ -2021,35 +1115,49 @@ async def get_referrer_analytics(days: int = 30, limit: int = 50):
             'last_seen': None,
         })
 
-        for row in cursor.fetchall():
-            referrer = (row['referrer'] or '').strip()
-            try:
-                host = urlparse(referrer).hostname or '(unparseable)'
-            except Exception:
-                host = '(unparseable)'
-
-            s = host_stats[host]
-            s['impressions'] += 1
-            if row['property_code']:
-                s['properties'].add(row['property_code'])
-            if row['campaign_id'] is not None:
-                s['campaigns'].add(row['campaign_id'])
-            if not s['sample_referrer']:
-                s['sample_referrer'] = referrer
-                s['sample_landing_page'] = row['landing_page']
-            ts = row['timestamp']
-            if ts and (not s['last_seen'] or ts > s['last_seen']):
-                s['last_seen'] = ts
-
-        cur_no_ref = conn.execute(
-            """
-            SELECT COUNT(*) FROM impressions
-            WHERE (referrer IS NULL OR referrer = '')
-              AND timestamp >= datetime('now', ?)
-            """,
-            (window,),
-        )
-        no_referrer_count = cur_no_ref.fetchone()[0]
+        no_referrer_count = 0
+
+        # Hot table plus any archived months the window reaches into
+        for table in event_partitions.event_sources(conn, "impressions", window_start):
+            cursor = conn.execute(
+                f"""
+                SELECT referrer, landing_page, property_code, campaign_id, ts_epoch
+                FROM {table}
+                WHERE ts_epoch >= ?
+                  AND referrer IS NOT NULL AND referrer <> ''
+                """,
+                (window_start,),
+            )
+
+            for row in cursor.fetchall():
+                referrer = (row['referrer'] or '').strip()
+                try:
+                    host = urlparse(referrer).hostname or '(unparseable)'
+                except Exception:
+                    host = '(unparseable)'
+
+                s = host_stats[host]
+                s['impressions'] += 1
+                if row['property_code']:
+                    s['properties'].add(row['property_code'])
+                if row['campaign_id'] is not None:
+                    s['campaigns'].add(row['campaign_id'])
+                if not s['sample_referrer']:
+                    s['sample_referrer'] = referrer
+                    s['sample_landing_page'] = row['landing_page']
+                ts = row['ts_epoch']
+                if ts and (not s['last_seen'] or ts > s['last_seen']):
+                    s['last_seen'] = ts
+
+            cur_no_ref = conn.execute(
+                f"""
+                SELECT COUNT(*) FROM {table}
+                WHERE ts_epoch >= ?
+                  AND (referrer IS NULL OR referrer = '')
+                """,
+                (window_start,),
+            )
+            no_referrer_count += cur_no_ref.fetchone()[0]
 
         rows_out = [
             {
@@ -2059,7 +1167,7 @@ async def get_referrer_analytics(days: int = 30, limit: int = 50):
                 'campaigns': len(s['campaigns']),
                 'sample_referrer': s['sample_referrer'],
                 'sample_landing_page': s['sample_landing_page'],
-                'last_seen': s['last_seen'],
+                'last_seen': datetime.utcfromtimestamp(s['last_seen']).strftime('%Y-%m-%d %H:%M:%S') if s['last_seen'] else None,
             }
             for host, s in host_stats.items()
         ]
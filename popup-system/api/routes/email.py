@@ -5,13 +5,21 @@ Handles generation of PNG email ads with proper font loading and popup-style des
 
 import os
 import hashlib
-from pathlib import Path
 from typing import Optional, Dict, Any
 from io import BytesIO
-from fastapi import APIRouter, HTTPException, Response
+from fastapi import APIRouter, HTTPException, Request, Response
 import logging
 import datetime
 
+from email_renderer import render_fixed_email_png
+from fonts import font_registry
+from http_cache import cached_binary_response
+from image_assets import image_assets
+from render_cache import render_cache, RENDER_CACHE_MAX_AGE
+from render_executor import render_executor, RenderBusy, RenderTimeout
+from prerender import prerender_job, EMAIL_VARIANTS
+from selection import select_email_campaign
+
 # Try to import PIL, fallback if not available
 try:
     from PIL import Image, ImageDraw, ImageFont
@@ -26,6 +34,15 @@ logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Canvas bounds for caller-supplied sizes: every distinct size is a render plus a cache entry,
+# and a huge canvas ties up a render worker (600x400 at 2x fits comfortably)
+EMAIL_MIN_SIZE = 200  # below this the layout has no room for the image box
+EMAIL_MAX_SIZE = int(os.getenv("EMAIL_MAX_SIZE", "1200"))
+
+
+def _clamp_size(value: int) -> int:
+    return max(EMAIL_MIN_SIZE, min(EMAIL_MAX_SIZE, int(value)))
+
 # Property configurations - FIXED
 PROPERTY_CONFIG = {
     'mff': {
@@ -45,55 +62,8 @@ PROPERTY_CONFIG = {
 }
 
 def load_font_with_fallbacks(font_name: str, size: int):
-    """Load font with comprehensive fallback strategy - WORKING VERSION"""
-    debug_info = {
-        "family": font_name,
-        "size": size,
-        "path": "",
-        "error": None
-    }
-    
-    # Font candidates in order of preference (Railway/Linux compatible)
-    if "bold" in font_name.lower() or "extra" in font_name.lower():
-        font_candidates = [
-            "/System/Library/Fonts/Helvetica.ttc",  # macOS
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",  # Linux
-            "/usr/share/fonts/TTF/arial.ttf",  # Some Linux
-            "arial.ttf",
-            "DejaVuSans-Bold.ttf"
-        ]
-    else:
-        font_candidates = [
-            "/System/Library/Fonts/Helvetica.ttc",  # macOS
-            "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",  # Linux
-            "/usr/share/fonts/TTF/arial.ttf",  # Some Linux
-            "arial.ttf",
-            "DejaVuSans.ttf"
-        ]
-    
-    # Try each font candidate
-    for font_path in font_candidates:
-        try:
-            font = ImageFont.truetype(font_path, size)
-            debug_info["path"] = font_path
-            debug_info["family"] = f"{font_name} (using {Path(font_path).name})"
-            logger.info(f"Successfully loaded font: {font_path}")
-            return font, debug_info
-        except Exception as e:
-            debug_info["last_error"] = str(e)
-            continue
-    
-    # Final fallback to default font
-    try:
-        default_font = ImageFont.load_default()
-        debug_info["error"] = "All font candidates failed, using default"
-        debug_info["family"] = "default"
-        logger.warning(f"Using default font for {font_name}")
-        return default_font, debug_info
-    except Exception as e:
-        error_msg = f"Critical font loading failure: {str(e)}"
-        debug_info["error"] = error_msg
-        raise HTTPException(status_code=500, detail=error_msg)
+    """Load font with comprehensive fallback strategy - WORKING VERSION (memoized per style/size by the font registry)"""
+    return font_registry.get(font_name, size)
 
 def create_popup_style_email_ad(property_name: str, width: int, height: int, campaign_data: dict):
     """Create email ad matching popup design - WORKING VERSION"""
@@ -164,37 +134,9 @@ def create_popup_style_email_ad(property_name: str, width: int, height: int, cam
         
         if image_url:
             try:
-                # Direct image loading without external imports
-                import urllib.request
-                import urllib.error
-                from io import BytesIO
-                
-                # Fix common imgur URL issues
-                fixed_url = image_url
-                if "imgur.com/" in fixed_url:
-                    if not fixed_url.startswith("https://i.imgur.com/"):
-                        fixed_url = fixed_url.replace("imgur.com/", "i.imgur.com/")
-                    if not fixed_url.endswith(('.jpg', '.png', '.gif', '.jpeg')):
-                        fixed_url += '.jpg'
-                
-                # Fetch image with proper headers
-                req = urllib.request.Request(fixed_url)
-                req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-                req.add_header('Accept', 'image/webp,image/apng,image/*,*/*;q=0.8')
-                req.add_header('Referer', 'https://imgur.com/')
-                
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    if response.status == 200:
-                        image_data = response.read()
-                        # Load and resize image
-                        campaign_image = Image.open(BytesIO(image_data))
-                        if campaign_image.mode in ('RGBA', 'P'):
-                            campaign_image = campaign_image.convert('RGB')
-                        campaign_image = campaign_image.resize((image_width, image_height), Image.Resampling.LANCZOS)
-                        debug_info["image_loading"] = f"Successfully loaded: {fixed_url} ({len(image_data)} bytes)"
-                    else:
-                        debug_info["image_loading"] = f"HTTP {response.status} for {fixed_url}"
-                        
+                # Shared asset cache: fetched once, revalidated, resized derivative kept on disk
+                campaign_image, asset = image_assets.load_image(image_url, (image_width, image_height), fit="stretch")
+                debug_info["image_loading"] = f"Successfully loaded: {asset['url']} ({asset['bytes']} bytes, {asset['source']})"
             except Exception as e:
                 debug_info["image_loading"] = f"Failed to load {image_url}: {str(e)}"
                 campaign_image = None
@@ -309,43 +251,85 @@ def create_popup_style_email_ad(property_name: str, width: int, height: int, cam
         img.save(buffer, format='PNG')
         return buffer.getvalue(), debug_info
 
+def _is_cacheable_render(debug_info: dict, campaign_data: dict) -> bool:
+    """Only cache complete renders - never error placeholders or a missing campaign image"""
+    if not debug_info.get("generation", {}).get("success") or debug_info.get("errors"):
+        return False
+    if campaign_data.get('main_image_url'):
+        return str(debug_info.get("image_loading", "")).startswith("Successfully")
+    return True
+
+def _render_failure_reason(debug_info: dict) -> str:
+    if debug_info.get("errors"):
+        return "; ".join(str(e) for e in debug_info["errors"])
+    return str(debug_info.get("image_loading") or "incomplete render")
+
+async def render_creative(property: str, w: int, h: int, variant: str, campaign_key: tuple, campaign_data: dict):
+    """Render one campaign creative through the render cache. Returns (image, hit, failure_reason)."""
+    outcome = {"failure": None}
+
+    async def render():
+        # PIL work and image downloads run in the render process pool, off the event loop
+        png_bytes, debug_info = await render_executor.submit(create_popup_style_email_ad, property, w, h, campaign_data)
+        cacheable = _is_cacheable_render(debug_info, campaign_data)
+        if not cacheable:
+            outcome["failure"] = _render_failure_reason(debug_info)
+        return png_bytes, cacheable
+
+    key = (campaign_key[0], campaign_key[1], property.lower(), w, h, variant)
+    image, hit = await render_cache.get_or_render(key, render)
+    return image, hit, outcome["failure"]
+
+async def _prerender_target(target):
+    _, hit, failure = await render_creative(
+        target.property_code, target.width, target.height, target.variant,
+        (target.campaign_id, target.updated_at), target.campaign_data,
+    )
+    return hit, failure is None, failure
+
 @router.get("/ad.png")
 async def get_email_ad_png(
+    request: Request,
     property: str = "mff",
-    w: int = 600,
-    h: int = 400,
-    send: str = "qa"
+    w: Optional[int] = None,
+    h: Optional[int] = None,
+    variant: str = "desktop",
+    send: str = "qa",
+    bucket: Optional[str] = None
 ):
-    """Generate email ad PNG - FIXED VERSION"""
+    """Generate email ad PNG - FIXED VERSION (cached per campaign/property/size/variant)
+
+    The campaign is picked deterministically from (property, send, bucket) by visibility
+    weight, so every fetch for one send (and subscriber bucket) gets the same cacheable image.
+    """
     if not PIL_AVAILABLE:
         return Response(
             content=b"PIL not available",
             media_type="text/plain",
             status_code=500
         )
+
+    # Set dimensions based on variant if not explicitly provided; the variant is part of the
+    # cache key, so unknown values fold into desktop
+    variant = "mobile" if variant == "mobile" else "desktop"
+    if w is None or h is None:
+        w, h = EMAIL_VARIANTS[variant]
+    w, h = _clamp_size(w), _clamp_size(h)
         
     try:
         # Get campaign data from database with fallback
+        campaign_key = None
         try:
-            from database import get_db_connection
-            conn = get_db_connection()
-            cur = conn.execute("""
-                SELECT name, description, main_image_url, logo_url, cta_text 
-                FROM campaigns 
-                WHERE active = 1 AND name != 'Prizies'
-                ORDER BY RANDOM() 
-                LIMIT 1
-            """)
-            campaign = cur.fetchone()
-            conn.close()
+            campaign = select_email_campaign(property, send, bucket)
             
             if campaign:
+                campaign_key = (campaign['id'], str(campaign['updated_at']))
                 campaign_data = {
-                    'name': campaign[0],
-                    'description': campaign[1],
-                    'main_image_url': campaign[2],
-                    'logo_url': campaign[3],
-                    'cta_text': campaign[4]
+                    'name': campaign['name'],
+                    'description': campaign['description'],
+                    'main_image_url': campaign['main_image_url'],
+                    'logo_url': campaign['logo_url'],
+                    'cta_text': campaign['cta_text']
                 }
             else:
                 raise ValueError("No campaigns found")
@@ -365,17 +349,32 @@ async def get_email_ad_png(
                     'description': 'Get exclusive trading tips and market insights delivered daily to your inbox.',
                     'cta_text': 'Get Trading Tips'
                 }
-        
-        png_bytes, debug_info = create_popup_style_email_ad(property, w, h, campaign_data)
-        
-        return Response(
-            content=png_bytes,
+
+        if campaign_key is None:
+            png_bytes, _ = await render_executor.submit(create_popup_style_email_ad, property, w, h, campaign_data)
+            return Response(
+                content=png_bytes,
+                media_type="image/png",
+                headers={"Cache-Control": "no-cache", "Content-Length": str(len(png_bytes))}
+            )
+
+        # ESP image proxies hit this once per subscriber - served from the creative store
+        # (pre-rendered by /api/email/prerender) or rendered once on first request
+        image, hit, _ = await render_creative(property, w, h, variant, campaign_key, campaign_data)
+        return cached_binary_response(
+            request,
+            image.body,
             media_type="image/png",
-            headers={
-                "Cache-Control": "public, max-age=3600",
-                "Content-Length": str(len(png_bytes))
-            }
+            etag=image.etag,
+            last_modified=image.last_modified_http,
+            last_modified_ts=image.last_modified,
+            max_age=RENDER_CACHE_MAX_AGE,
+            extra_headers={"X-Render-Cache": "HIT" if hit else "MISS"},
         )
+    except RenderBusy as e:
+        return Response(content=str(e).encode(), media_type="text/plain", status_code=503, headers={"Retry-After": "2"})
+    except RenderTimeout as e:
+        return Response(content=str(e).encode(), media_type="text/plain", status_code=504)
     except Exception as e:
         logger.error(f"PNG endpoint error: {str(e)}")
         return Response(
@@ -384,18 +383,53 @@ async def get_email_ad_png(
             status_code=500
         )
 
+@router.post("/prerender")
+@router.post("/warm-cache")
+async def start_prerender(property: Optional[str] = None):
+    """Pre-render every active campaign x property x variant into the creative store.
+    Runs in the background; poll GET /api/email/prerender for progress and failures."""
+    if not PIL_AVAILABLE:
+        raise HTTPException(status_code=503, detail="PIL not available")
+    properties = [p.strip() for p in property.split(",") if p.strip()] if property else None
+    return prerender_job.start(_prerender_target, properties)
+
+@router.get("/prerender")
+async def get_prerender_status():
+    """Progress of the current (or last) pre-render run"""
+    return prerender_job.status()
+
+@router.get("/render-cache")
+async def get_render_cache_status():
+    """Render cache tiers, budgets and hit/miss counters"""
+    return render_cache.status()
+
+@router.get("/image-assets")
+async def get_image_asset_status():
+    """Source image cache: fresh hits, revalidations, stale serves, derivatives"""
+    return image_assets.status()
+
+@router.get("/render-executor")
+async def get_render_executor_status():
+    """Render process pool: workers, in-flight renders, rejections and timeouts"""
+    return render_executor.status()
+
 @router.get("/ad.debug")
 async def get_email_ad_debug(
     property: str = "mff", 
     w: int = 600,
     h: int = 400,
-    send: str = "qa"
+    send: str = "qa",
+    bucket: Optional[str] = None
 ):
     """Get debug information for email ad generation - FIXED VERSION"""
+    campaign = select_email_campaign(property, send, bucket)
     return {
         "SYSTEM": "NEW_FIXED_EMAIL_SYSTEM", 
         "VERSION": "2.0",
         "property": property,
+        "send": send,
+        "bucket": bucket,
+        "selected_campaign": {"id": campaign["id"], "name": campaign["name"]} if campaign else None,
         "dimensions": f"{w}x{h}",
         "timestamp": datetime.datetime.now().isoformat(),
         "message": "This is the NEW fixed email system!",
@@ -409,4 +443,166 @@ async def test_new_system():
         "message": "NEW EMAIL SYSTEM IS ACTIVE!",
         "version": "2.0",
         "timestamp": datetime.datetime.now().isoformat()
-    }
\ No newline at end of file
+    }
+# WORKING EMAIL GENERATION - SIMPLE TEXT FORMAT
+@router.get("/popup-capture.html")
+async def popup_capture_html(property: str = "mff"):
+    """Return HTML page that shows the working popup for manual screenshot"""
+    
+    popup_html = f'''<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <title>Popup Capture - {property.upper()}</title>
+    <style>
+        body {{ 
+            margin: 0; 
+            padding: 20px; 
+            background: #f0f0f0;
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
+        }}
+        
+        .capture-container {{
+            width: 320px;
+            height: 480px;
+            margin: 0 auto;
+            background: white;
+            border: 2px solid #333;
+            position: relative;
+            overflow: hidden;
+        }}
+        
+        .instructions {{
+            text-align: center;
+            margin: 20px 0;
+            color: #333;
+        }}
+        
+        /* Force popup to show properly */
+        .mode-popup {{
+            position: relative !important;
+            transform: none !important;
+            opacity: 1 !important;
+            display: block !important;
+            margin: 0 !important;
+            width: 100% !important;
+            height: 100% !important;
+        }}
+        
+        .mode-popup-overlay {{
+            display: none !important;
+        }}
+    </style>
+</head>
+<body>
+    <div class="instructions">
+        <h2>📸 Screenshot This Popup</h2>
+        <p>Use browser screenshot tools to capture just the popup area below</p>
+        <p>Property: <strong>{property.upper()}</strong></p>
+    </div>
+    
+    <div class="capture-container" id="popup-target">
+        <div style="text-align: center; padding: 50px; color: #666;">
+            Loading popup...
+        </div>
+    </div>
+    
+    <!-- Load the WORKING popup script -->
+    <script>
+        // Set the property
+        window.MODE_PROPERTY = '{property}';
+        
+        // Load popup script
+        const script = document.createElement('script');
+        script.src = '/popup.js';
+        script.onload = function() {{
+            console.log('Popup script loaded');
+            
+            // Wait a bit then force popup to show
+            setTimeout(() => {{
+                // Try to trigger popup
+                if (window.showModePopup) {{
+                    window.showModePopup('{property}');
+                }}
+                
+                // Force any popup to be visible
+                setTimeout(() => {{
+                    const popup = document.querySelector('.mode-popup');
+                    const overlay = document.querySelector('.mode-popup-overlay');
+                    const target = document.getElementById('popup-target');
+                    
+                    console.log('Popup element:', popup);
+                    
+                    if (popup) {{
+                        // Move popup to our container
+                        target.innerHTML = '';
+                        target.appendChild(popup);
+                        
+                        popup.style.position = 'relative';
+                        popup.style.transform = 'none';
+                        popup.style.opacity = '1';
+                        popup.style.display = 'block';
+                        popup.style.margin = '0';
+                        popup.style.width = '100%';
+                        popup.style.height = '100%';
+                    }}
+                    
+                    if (overlay) {{
+                        overlay.style.display = 'none';
+                    }}
+                    
+                    // Log what we found
+                    console.log('Popup setup complete');
+                }}, 2000);
+            }}, 1000);
+        }};
+        document.head.appendChild(script);
+    </script>
+</body>
+</html>'''
+    
+    return Response(
+        content=popup_html,
+        media_type="text/html",
+        headers={
+            "Cache-Control": "no-cache",
+            "Content-Disposition": f"inline; filename=popup_capture_{property}.html"
+        }
+    )
+
+@router.get("/fixed.png")
+async def generate_fixed_email_png(property: str = "mff", width: int = 320, height: int = 480,
+                                   send: str = "qa", bucket: str = None):
+    """Generate email PNG with PROPER popup dimensions - no stretching!"""
+    width, height = _clamp_size(width), _clamp_size(height)
+
+    try:
+        # Same (property, send, bucket) -> same campaign, weighted by visibility
+        campaign = select_email_campaign(property, send, bucket)
+        
+        if not campaign:
+            raise HTTPException(status_code=404, detail="No campaigns found")
+        
+        # Drawing, image loading and PNG encoding run in the render process pool
+        png_bytes = await render_executor.submit(
+            render_fixed_email_png, property, width, height, {**campaign, "property_code": property}
+        )
+        
+        return Response(
+            content=png_bytes,
+            media_type="image/png",
+            headers={
+                "Cache-Control": "public, max-age=3600",
+                "Content-Disposition": f"inline; filename=email_{property}_{width}x{height}.png"
+            }
+        )
+        
+    except HTTPException:
+        raise
+    except RenderBusy as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "2"})
+    except RenderTimeout as e:
+        raise HTTPException(status_code=504, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
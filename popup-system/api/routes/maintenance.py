@@ -0,0 +1,1038 @@
+"""
+Maintenance and diagnostic endpoints
+Restores, one-off schema/data fixes, font and database diagnostics. Nothing on the popup or
+tracking path uses these, so main.py includes this router lazily (see lazy_routes.py).
+"""
+
+from pathlib import Path
+
+from fastapi import APIRouter
+
+import catalog
+from database import init_db
+
+router = APIRouter()
+
+API_DIR = Path(__file__).parent.parent
+
+@router.post("/api/test-restore-now")
+async def test_restore_now():
+    """Test the restore function right now to see what fails"""
+    import sqlite3
+    from database import get_db_path
+    
+    restore_log = []
+    
+    try:
+        restore_log.append("🔍 TESTING RESTORE FUNCTION...")
+        
+        # Check current state
+        conn = sqlite3.connect(get_db_path())
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT COUNT(*) FROM campaigns WHERE active = 1")
+        current_count = cursor.fetchone()[0]
+        restore_log.append(f"📊 Current campaigns: {current_count}")
+        
+        # Run the restore function
+        restore_log.append("🔄 Running auto_restore_campaigns_on_startup()...")
+        await auto_restore_campaigns_on_startup()
+        
+        # Check final state
+        cursor.execute("SELECT COUNT(*) FROM campaigns WHERE active = 1")
+        final_count = cursor.fetchone()[0]
+        restore_log.append(f"📊 Final campaigns: {final_count}")
+        
+        conn.close()
+        
+        return {
+            "success": True,
+            "initial_count": current_count,
+            "final_count": final_count,
+            "log": restore_log
+        }
+        
+    except Exception as e:
+        restore_log.append(f"❌ ERROR: {str(e)}")
+        return {
+            "success": False,
+            "error": str(e),
+            "log": restore_log
+        }
+
+async def auto_restore_campaigns_on_startup():
+    """Auto-restore campaigns if database is empty or corrupted - CRITICAL for Railway deployments"""
+    import sqlite3
+    from database import get_db_path
+    
+    try:
+        print("🔍 CHECKING CAMPAIGN DATABASE...")
+        
+        # Check if campaigns exist
+        conn = sqlite3.connect(get_db_path())
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT COUNT(*) FROM campaigns WHERE active = 1")
+            campaign_count = cursor.fetchone()[0]
+            print(f"📊 Found {campaign_count} active campaigns")
+            
+            # Also check for Prizies contamination
+            cursor.execute("SELECT COUNT(*) FROM campaigns WHERE name = 'Prizies'")
+            prizies_count = cursor.fetchone()[0]
+            
+            if prizies_count > 0:
+                print(f"🗑️ PRIZIES CONTAMINATION DETECTED: {prizies_count} Prizies campaigns found")
+                # Clear Prizies immediately
+                cursor.execute("DELETE FROM campaigns WHERE name = 'Prizies'")
+                cursor.execute("DELETE FROM campaign_properties WHERE campaign_id IN (SELECT id FROM campaigns WHERE name = 'Prizies')")
+                conn.commit()
+                print("✅ Prizies eliminated")
+                
+                # Recount after cleanup
+                cursor.execute("SELECT COUNT(*) FROM campaigns WHERE active = 1")
+                campaign_count = cursor.fetchone()[0]
+            
+            # Check campaign count but DO NOT auto-restore (causes data loss)
+            if campaign_count < 12:
+                print(f"⚠️ INSUFFICIENT CAMPAIGNS: Found {campaign_count}, need 12")
+                print(f"⚠️ Use /api/emergency-restore-12-campaigns endpoint to restore")
+            else:
+                print(f"✅ Database healthy with {campaign_count} campaigns")
+                
+        except Exception as e:
+            print(f"❌ Database check failed: {e}")
+            print("⚠️ Use /api/emergency-restore-12-campaigns endpoint to restore if needed")
+        
+        finally:
+            conn.close()
+            
+    except Exception as e:
+        print(f"❌ Startup auto-restore failed: {e}")
+
+async def restore_12_clean_campaigns(conn):
+    """DISABLED: This function was nuking campaigns in production
+    Use /api/emergency-restore-12-campaigns endpoint instead"""
+    print("⚠️ restore_12_clean_campaigns() is DISABLED to prevent data loss")
+    print("⚠️ Use /api/emergency-restore-12-campaigns endpoint instead")
+    return False
+
+async def restore_12_clean_campaigns_DISABLED_DO_NOT_USE(conn):
+    """Restore exactly 12 clean campaigns - NO PRIZIES
+    DISABLED BECAUSE IT DELETES ALL CAMPAIGNS"""
+    try:
+        print("🔄 RESTORING 12 CLEAN CAMPAIGNS...")
+        
+        # The 12 COMPLETE campaigns with UNIQUE logos
+        clean_campaigns = [
+            # Money.com FIRST - MMM Finance campaigns (6 total)
+            {"id": 1, "name": "Money.com - Online Stock Brokers", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7521&aff_id=43092", "logo_url": "https://i.imgur.com/money-com-logo.png", "main_image_url": "https://i.imgur.com/broker-comparison.png", "description": "Compare online stock brokers and find the best platform for your trading needs.", "cta_text": "Compare Brokers", "offer_id": "7521", "aff_id": "43092", "property": "mmm"},
+            {"id": 2, "name": "Trading Tips", "tune_url": "https://track.modemobile.com/aff_c?offer_id=6998&aff_id=43045&aff_sub5=popup_tradingTips", "logo_url": "https://i.imgur.com/lHn301q.png", "main_image_url": "https://i.imgur.com/ZVGOktR.png", "description": "Get exclusive trading tips and market insights delivered daily to your inbox.", "cta_text": "Get Trading Tips", "offer_id": "6998", "aff_id": "43045", "property": "mmm"},
+            {"id": 3, "name": "Behind The Markets", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7521&aff_id=43045&aff_sub5=popup_behindMarkets", "logo_url": "https://i.imgur.com/O3iEVP7.jpeg", "main_image_url": "https://i.imgur.com/NA0o7iJ.png", "description": "Discover what's really happening behind the financial markets with expert analysis.", "cta_text": "Learn More", "offer_id": "7521", "aff_id": "43045", "property": "mmm"},
+            {"id": 4, "name": "Brownstone Research", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7389&aff_id=43045&aff_sub5=popup_brownstone", "logo_url": "https://i.imgur.com/3KVDcV7.jpeg", "main_image_url": "https://i.imgur.com/vzoiVpd.png", "description": "Advanced technology and investment research from Brownstone Research experts.", "cta_text": "View Research", "offer_id": "7389", "aff_id": "43045", "property": "mmm"},
+            {"id": 5, "name": "Hotsheets", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7385&aff_id=43045&aff_sub5=popup_hotsheets", "logo_url": "https://i.imgur.com/4JoGdZr.png", "main_image_url": "https://i.imgur.com/O81cPQJ.jpeg", "description": "Daily market hotsheets with the most profitable trading opportunities.", "cta_text": "Get Hotsheets", "offer_id": "7385", "aff_id": "43045", "property": "mmm"},
+            {"id": 6, "name": "Best Gold", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7390&aff_id=43045&aff_sub5=popup_bestGold", "logo_url": "https://i.imgur.com/5Yb0LJn.png", "main_image_url": "https://i.imgur.com/EEOyDuZ.jpeg", "description": "Premium gold investment insights and recommendations from industry experts.", "cta_text": "Learn About Gold", "offer_id": "7390", "aff_id": "43045", "property": "mmm"},
+            
+            # MFF Lifestyle campaigns (6 total) - UNIQUE LOGOS AND IMAGES
+            {"id": 7, "name": "Daily Goodie Box", "tune_url": "https://track.modemobile.com/aff_c?offer_id=6571&aff_id=42946&aff_sub2=perks", "logo_url": "https://i.imgur.com/DH7Tp4A.jpeg", "main_image_url": "https://i.imgur.com/JpKD9AX.png", "description": "Get your daily goodie box filled with amazing free samples and deals.", "cta_text": "Claim Now!", "offer_id": "6571", "aff_id": "42946", "property": "mff"},
+            {"id": 8, "name": "Free Samples Guide", "tune_url": "https://track.modemobile.com/aff_c?offer_id=3907&aff_id=42946&aff_sub2=perks", "logo_url": "https://resources.rndsystems.com/images/promo_pages/free-sample-icon.png", "main_image_url": "https://i.imgur.com/vbgSfMi.jpeg", "description": "Get your comprehensive free samples guide with exclusive offers.", "cta_text": "Claim Now!", "offer_id": "3907", "aff_id": "42946", "property": "mff"},
+            {"id": 9, "name": "UpLevel - Amazon Mystery Box", "tune_url": "https://track.modemobile.com/aff_c?offer_id=4689&aff_id=42946&aff_sub2=perks", "logo_url": "https://i.imgur.com/uplevel-logo.png", "main_image_url": "https://i.imgur.com/amazon-mystery.jpg", "description": "Grab an Amazon Mystery Box!", "cta_text": "Get Box!", "offer_id": "4689", "aff_id": "42946", "property": "mff"},
+            {"id": 10, "name": "Hulu - Hit Movies, TV and More!", "tune_url": "https://track.modemobile.com/aff_c?offer_id=5555&aff_id=42946&aff_sub2=perks", "logo_url": "https://i.imgur.com/RHRuCvk.jpg", "main_image_url": "https://i.imgur.com/SEu1NtW.jpg", "description": "Exclusive Offers from Hulu!", "cta_text": "Get Hulu!", "offer_id": "5555", "aff_id": "42946", "property": "mff"},
+            {"id": 11, "name": "Paramount", "tune_url": "https://track.modemobile.com/aff_c?offer_id=5172&aff_id=42946&aff_sub2=perks", "logo_url": "https://i.imgur.com/2IpSLaY.jpg", "main_image_url": "https://i.imgur.com/p8o0YSR.jpg", "description": "Exclusive Offers from Paramount+!", "cta_text": "Get Paramount+!", "offer_id": "5172", "aff_id": "42946", "property": "mff"},
+            {"id": 12, "name": "Trend'n Daily", "tune_url": "https://track.modemobile.com/aff_c?offer_id=4689&aff_id=42946&aff_sub2=perks", "logo_url": "https://i.imgur.com/trendn-logo.png", "main_image_url": "https://i.imgur.com/trendn-deals.jpg", "description": "Daily trending offers and deals!", "cta_text": "Get Deals!", "offer_id": "4689", "aff_id": "42946", "property": "mff"}
+        ]
+        
+        # DISABLED: DO NOT DELETE CAMPAIGNS IN PRODUCTION
+        # This was causing data loss - campaigns should only be added, never cleared
+        # If you need to restore, use /api/emergency-restore-12-campaigns instead
+        print("⚠️ Skipping dangerous DELETE operations to protect production data")
+        
+        # Restore the 12 good campaigns
+        print(f"📊 Restoring {len(clean_campaigns)} campaigns...")
+        for i, campaign in enumerate(clean_campaigns, 1):
+            try:
+                print(f"   {i:2}. Inserting {campaign['name']}...")
+                conn.execute('''
+                    INSERT INTO campaigns (
+                        id, name, tune_url, logo_url, main_image_url, description,
+                        cta_text, offer_id, aff_id, active, featured, created_at, updated_at
+                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 1, 0, ?, ?)
+                ''', (
+                    campaign['id'], campaign['name'], campaign['tune_url'],
+                    campaign['logo_url'], campaign['main_image_url'], campaign['description'],
+                    campaign['cta_text'], campaign['offer_id'], campaign['aff_id'],
+                    '2025-01-28 12:00:00', '2025-01-28 12:00:00'
+                ))
+                
+                # Set property assignment
+                property_code = campaign.get('property', 'mff')  # Default to mff if not specified
+                conn.execute('''
+                    INSERT INTO campaign_properties (
+                        campaign_id, property_code, visibility_percentage, active
+                    ) VALUES (?, ?, 100, 1)
+                ''', (campaign['id'], property_code))
+                
+                print(f"   ✅ {campaign['name']} → {property_code.upper()}")
+                
+            except Exception as campaign_error:
+                print(f"   ❌ Failed to insert {campaign['name']}: {campaign_error}")
+        
+        conn.commit()
+        
+        print("✅ CLEAN RESTORE COMPLETE: 12 campaigns restored (5 MMM + 7 MFF)")
+        print("🗑️ NO PRIZIES - Database is now clean!")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Clean restore failed: {e}")
+        return False
+
+@router.post("/api/create-postgres-schema")
+async def create_postgres_schema():
+    """Create PostgreSQL schema if it doesn't exist"""
+    try:
+        from database import get_db_connection
+        
+        # Read schema file
+        schema_file = API_DIR.parent / "create_postgres_schema.sql"
+        with open(schema_file, 'r') as f:
+            schema_sql = f.read()
+        
+        # Execute schema creation
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Split and execute each statement
+        statements = schema_sql.split(';')
+        for statement in statements:
+            if statement.strip():
+                cursor.execute(statement.strip())
+        
+        conn.commit()
+        conn.close()
+        
+        return {"status": "success", "message": "PostgreSQL schema created successfully"}
+        
+    except Exception as e:
+        return {"status": "error", "message": f"Schema creation failed: {str(e)}"}
+
+@router.get("/api/test-postgres")
+async def test_postgres():
+    """Test PostgreSQL connection and show debug info"""
+    try:
+        from database import get_db_connection
+        import os
+        
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        
+        # Test basic query
+        cursor.execute("SELECT version()")
+        version = cursor.fetchone()[0]
+        
+        # Check if tables exist
+        cursor.execute("SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'")
+        tables = [row[0] for row in cursor.fetchall()]
+        
+        conn.close()
+        
+        return {
+            "status": "success",
+            "database_url_set": bool(os.getenv("DATABASE_URL")),
+            "postgresql_version": version,
+            "tables": tables
+        }
+        
+    except Exception as e:
+        return {"status": "error", "message": f"PostgreSQL test failed: {str(e)}"}
+
+@router.get("/api/fonts/diagnostic")
+async def font_diagnostic():
+    """Diagnostic endpoint to check font availability on Railway"""
+    import glob
+    from fonts import font_registry, registry_status, PIL_AVAILABLE
+    from render_executor import render_executor
+    
+    base_dir = API_DIR
+    font_dir = base_dir / "assets" / "fonts"
+    
+    # Test font loading with actual bundled fonts
+    test_results = []
+    font_candidates = [
+        str(font_dir / "DejaVuSans-Bold.ttf"),      # Bundled bold
+        str(font_dir / "DejaVuSans.ttf"),           # Bundled regular
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf",  # System fallback
+        "/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf",       # System fallback
+        "/System/Library/Fonts/Helvetica.ttc",     # macOS fallback
+    ]
+    
+    for font_path in font_candidates:
+        try:
+            from PIL import ImageFont
+            font = ImageFont.truetype(font_path, 24)
+            test_results.append({"path": font_path, "status": "SUCCESS", "error": None})
+        except Exception as e:
+            test_results.append({"path": font_path, "status": "FAILED", "error": str(e)})
+
+    # What the email renderers actually use: with the render pool running, that's a worker's
+    # table (this process doesn't preload fonts then)
+    registry_source = "api process"
+    registry = font_registry.status()
+    if render_executor.running:
+        try:
+            registry = await render_executor.submit(registry_status)
+            registry_source = "render worker"
+        except Exception as e:
+            registry["worker_error"] = str(e) or type(e).__name__
+    
+    return {
+        "working_directory": str(Path.cwd()),
+        "font_directory": str(font_dir),
+        "font_dir_exists": font_dir.exists(),
+        "bundled_fonts": list(font_dir.glob("*.ttf")) if font_dir.exists() else [],
+        "system_fonts_sample": glob.glob("/usr/share/fonts/**/*.ttf", recursive=True)[:10],
+        "font_loading_tests": test_results,
+        "pil_available": PIL_AVAILABLE,
+        "registry": registry,
+        "registry_source": registry_source
+    }
+
+@router.get("/debug/property-test")
+async def debug_property_test(property: str = None, host: str = None):
+    """Debug endpoint to test property parameter parsing"""
+    from database import detect_property_code_from_host
+    
+    # Test the same logic as the optimized endpoint
+    if property and property in ['mff', 'mmm', 'mcad', 'mmd']:
+        property_code = property.lower()
+        source = "explicit_parameter"
+    else:
+        hostname = (host or "").strip().lower()
+        property_code = detect_property_code_from_host(hostname)
+        source = "hostname_detection"
+    
+    return {
+        "input_property": property,
+        "input_host": host,
+        "resolved_property_code": property_code,
+        "source": source
+    }
+
+# Quick fix endpoint for Railway database resets
+@router.post("/api/quick-fix")
+async def quick_fix():
+    """Run all necessary fixes after Railway database reset"""
+    try:
+        results = []
+        
+        # 1. Fix schema
+        from database import get_db_connection
+        conn = get_db_connection()
+        
+        # Add featured_campaign_id column
+        try:
+            conn.execute("ALTER TABLE properties ADD COLUMN featured_campaign_id INTEGER")
+            results.append("✅ Added featured_campaign_id column")
+        except:
+            results.append("✅ featured_campaign_id column already exists")
+            
+        # Add impression_cap_daily column
+        try:
+            conn.execute("ALTER TABLE campaign_properties ADD COLUMN impression_cap_daily INTEGER NULL")
+            results.append("✅ Added impression_cap_daily column")
+        except:
+            results.append("✅ impression_cap_daily column already exists")
+            
+        # Add click_cap_daily column  
+        try:
+            conn.execute("ALTER TABLE campaign_properties ADD COLUMN click_cap_daily INTEGER NULL")
+            results.append("✅ Added click_cap_daily column")
+        except:
+            results.append("✅ click_cap_daily column already exists")
+            
+        conn.commit()
+        conn.close()
+        
+        # 2. Ensure properties exist
+        from routes.campaigns import auto_assign_all_campaigns
+        try:
+            auto_assign_all_campaigns()
+            results.append("✅ Auto-assigned all campaigns to all properties")
+        except Exception as e:
+            results.append(f"⚠️ Auto-assignment: {e}")
+        
+        return {
+            "success": True,
+            "message": "Quick fix completed - featured toggle should work now!",
+            "results": results
+        }
+        
+    except Exception as e:
+        return {
+            "success": False,
+            "error": str(e),
+            "message": "Quick fix failed"
+        }
+
+# Manual migration endpoint to fix missing columns
+@router.post("/migrate")
+async def run_migration():
+    """Manual migration endpoint to fix missing columns"""
+    from database import get_db_connection
+    conn = get_db_connection()
+    try:
+        # Add missing columns to campaign_properties table
+        cursor = conn.execute("PRAGMA table_info(campaign_properties)")
+        existing_columns = [row[1] for row in cursor.fetchall()]
+        
+        added_columns = []
+        cap_columns = {
+            'impression_cap_daily': 'INTEGER',
+            'click_cap_daily': 'INTEGER'
+        }
+        
+        for column, column_type in cap_columns.items():
+            if column not in existing_columns:
+                try:
+                    conn.execute(f"ALTER TABLE campaign_properties ADD COLUMN {column} {column_type}")
+                    conn.commit()
+                    added_columns.append(column)
+                except Exception as e:
+                    return {"status": "error", "message": f"Failed to add {column}: {str(e)}"}
+        
+        return {
+            "status": "success", 
+            "added_columns": added_columns,
+            "existing_columns": existing_columns,
+            "message": "Migration completed successfully"
+        }
+    except Exception as e:
+        return {"status": "error", "message": str(e)}
+    finally:
+        conn.close()
+
+# Delete Prizies permanently
+@router.post("/api/delete-prizies-permanently")
+async def delete_prizies_permanently():
+    """Permanently delete all Prizies campaigns from database"""
+    try:
+        from database import get_db_connection
+        conn = get_db_connection()
+        
+        # Delete Prizies campaigns
+        cursor = conn.execute("DELETE FROM campaigns WHERE name = 'Prizies'")
+        deleted_count = cursor.rowcount
+        
+        # Also clean up any property assignments for Prizies
+        conn.execute("DELETE FROM campaign_properties WHERE campaign_id IN (SELECT id FROM campaigns WHERE name = 'Prizies')")
+        
+        conn.commit()
+        catalog.invalidate("delete-prizies-permanently")
+        conn.close()
+        
+        return {
+            "status": "success",
+            "message": f"Deleted {deleted_count} Prizies campaigns permanently",
+            "deleted_count": deleted_count
+        }
+        
+    except Exception as e:
+        return {
+            "status": "error",
+            "message": f"Failed to delete Prizies: {e}"
+        }
+
+# Emergency restoration endpoint for Railway deployment fixes
+@router.post("/api/emergency-restore-12-campaigns")
+async def emergency_restore_12_campaigns():
+    """Emergency endpoint to restore all 12 campaigns with property attribution"""
+    import sqlite3
+    import json
+    from database import get_db_path
+    
+    try:
+        print("🚨 EMERGENCY RESTORATION: Restoring 12 campaigns")
+        
+        # Ensure schema exists (idempotent) to avoid missing table errors
+        try:
+            init_db()
+            from database import get_db_connection
+            conn = get_db_connection()
+            # Explicitly create required tables if missing
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS campaigns (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    name TEXT NOT NULL,
+                    tune_url TEXT NOT NULL,
+                    logo_url TEXT NOT NULL,
+                    main_image_url TEXT NOT NULL,
+                    description TEXT,
+                    cta_text TEXT DEFAULT 'View Offer',
+                    active BOOLEAN DEFAULT 1,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    offer_id TEXT,
+                    aff_id TEXT,
+                    featured BOOLEAN DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS campaign_properties (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id INTEGER NOT NULL,
+                    property_code TEXT NOT NULL,
+                    visibility_percentage INTEGER DEFAULT 100,
+                    active BOOLEAN DEFAULT 1,
+                    impression_cap_daily INTEGER NULL,
+                    click_cap_daily INTEGER NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE,
+                    UNIQUE(campaign_id, property_code)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS properties (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    code TEXT UNIQUE NOT NULL,
+                    name TEXT NOT NULL,
+                    domain TEXT,
+                    active BOOLEAN DEFAULT 1,
+                    popup_enabled BOOLEAN DEFAULT 1,
+                    popup_frequency TEXT DEFAULT 'session',
+                    popup_placement TEXT DEFAULT 'thankyou',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """
+            )
+            conn.commit()
+            conn.close()
+        except Exception as e:
+            print(f"⚠️ Schema ensure failed (will attempt restore anyway): {e}")
+
+        # COMPLETE 12 CAMPAIGNS WITH UNIQUE LOGOS - PROPER DATA
+        campaigns_data = [
+            # Money.com FIRST as requested - MMM Finance (6 total)
+            {"id": 1, "name": "Money.com - Online Stock Brokers", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7521&aff_id=43092", "logo_url": "https://i.imgur.com/4JoGdZr.png", "main_image_url": "https://i.imgur.com/O81cPQJ.jpeg", "description": "Compare online stock brokers and find the best platform for your trading needs.", "cta_text": "Compare Brokers", "offer_id": "7521", "aff_id": "43092", "active": True},
+            {"id": 2, "name": "Trading Tips", "tune_url": "https://track.modemobile.com/aff_c?offer_id=6998&aff_id=43045", "logo_url": "https://i.imgur.com/lHn301q.png", "main_image_url": "https://i.imgur.com/ZVGOktR.png", "description": "Get exclusive trading tips and market insights delivered daily to your inbox.", "cta_text": "Get Trading Tips", "offer_id": "6998", "aff_id": "43045", "active": True},
+            {"id": 3, "name": "Behind The Markets", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7521&aff_id=43045", "logo_url": "https://i.imgur.com/O3iEVP7.jpeg", "main_image_url": "https://i.imgur.com/NA0o7iJ.png", "description": "Discover what's really happening behind the financial markets with expert analysis.", "cta_text": "Learn More", "offer_id": "7521", "aff_id": "43045", "active": True},
+            {"id": 4, "name": "Brownstone Research", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7389&aff_id=43045", "logo_url": "https://i.imgur.com/3KVDcV7.jpeg", "main_image_url": "https://i.imgur.com/vzoiVpd.png", "description": "Advanced technology and investment research from Brownstone Research experts.", "cta_text": "View Research", "offer_id": "7389", "aff_id": "43045", "active": True},
+            {"id": 5, "name": "Hotsheets", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7385&aff_id=43045", "logo_url": "https://i.imgur.com/5Yb0LJn.png", "main_image_url": "https://i.imgur.com/O81cPQJ.jpeg", "description": "Daily market hotsheets with the most profitable trading opportunities.", "cta_text": "Get Hotsheets", "offer_id": "7385", "aff_id": "43045", "active": True},
+            {"id": 6, "name": "Best Gold", "tune_url": "https://track.modemobile.com/aff_c?offer_id=7390&aff_id=43045", "logo_url": "https://i.imgur.com/5Yb0LJn.png", "main_image_url": "https://i.imgur.com/EEOyDuZ.jpeg", "description": "Premium gold investment insights and recommendations from industry experts.", "cta_text": "Learn About Gold", "offer_id": "7390", "aff_id": "43045", "active": True},
+            
+            # MFF Lifestyle campaigns (6 total - CLEAN UNIQUE DATA)
+            {"id": 7, "name": "Daily Goodie Box", "tune_url": "https://track.modemobile.com/aff_c?offer_id=6571&aff_id=42946", "logo_url": "https://i.imgur.com/DH7Tp4A.jpeg", "main_image_url": "https://i.imgur.com/JpKD9AX.png", "description": "Get your daily goodie box filled with amazing free samples and deals.", "cta_text": "Claim Now!", "offer_id": "6571", "aff_id": "42946", "active": True},
+            {"id": 8, "name": "Free Samples Guide", "tune_url": "https://track.modemobile.com/aff_c?offer_id=3907&aff_id=42946", "logo_url": "https://i.imgur.com/DH7Tp4A.jpeg", "main_image_url": "https://i.imgur.com/vbgSfMi.jpeg", "description": "Get your comprehensive free samples guide with exclusive offers.", "cta_text": "Claim Now!", "offer_id": "3907", "aff_id": "42946", "active": True},
+            {"id": 9, "name": "UpLevel - Amazon Mystery Box", "tune_url": "https://track.modemobile.com/aff_c?offer_id=4689&aff_id=42946", "logo_url": "https://imgur.com/Xmb1P8t.jpg", "main_image_url": "https://imgur.com/tA8fYBO.jpg", "description": "Grab an Amazon Mystery Box!", "cta_text": "Get Box!", "offer_id": "4689", "aff_id": "42946", "active": True},
+            {"id": 10, "name": "Hulu - Hit Movies, TV and More!", "tune_url": "https://track.modemobile.com/aff_c?offer_id=5555&aff_id=42946", "logo_url": "https://i.imgur.com/RHRuCvk.jpg", "main_image_url": "https://i.imgur.com/SEu1NtW.jpg", "description": "Exclusive Offers from Hulu!", "cta_text": "Get Hulu!", "offer_id": "5555", "aff_id": "42946", "active": True},
+            {"id": 11, "name": "Paramount", "tune_url": "https://track.modemobile.com/aff_c?offer_id=5172&aff_id=42946", "logo_url": "https://i.imgur.com/2IpSLaY.jpg", "main_image_url": "https://i.imgur.com/p8o0YSR.jpg", "description": "Exclusive Offers from Paramount+!", "cta_text": "Get Paramount+!", "offer_id": "5172", "aff_id": "42946", "active": True},
+            {"id": 12, "name": "Trend'n Daily", "tune_url": "https://track.modemobile.com/aff_c?offer_id=4689&aff_id=42946", "logo_url": "https://imgur.com/Xmb1P8t.jpg", "main_image_url": "https://imgur.com/tA8fYBO.jpg", "description": "Daily trending offers and deals!", "cta_text": "Get Deals!", "offer_id": "4689", "aff_id": "42946", "active": True}
+        ]
+        
+        # IMPORTANT: Use the same connection path used by init_db (DB_PATH)
+        from database import get_db_connection
+        conn = get_db_connection()
+        
+        # Clear and restore campaigns
+        try:
+            conn.execute("DELETE FROM campaign_properties")
+        except Exception:
+            # If table somehow missing, create and continue
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS campaign_properties (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id INTEGER NOT NULL,
+                    property_code TEXT NOT NULL,
+                    visibility_percentage INTEGER DEFAULT 100,
+                    active BOOLEAN DEFAULT 1,
+                    impression_cap_daily INTEGER NULL,
+                    click_cap_daily INTEGER NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE,
+                    UNIQUE(campaign_id, property_code)
+                )
+                """
+            )
+        conn.execute("DELETE FROM campaigns")
+        
+        for campaign in campaigns_data:
+            # No special fixes needed - all campaigns should have correct data
+                
+            conn.execute('''
+                INSERT INTO campaigns (
+                    id, name, tune_url, logo_url, main_image_url, description,
+                    cta_text, offer_id, aff_id, active, featured, created_at, updated_at
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?, ?)
+            ''', (
+                campaign['id'], campaign['name'], campaign['tune_url'],
+                campaign['logo_url'], campaign['main_image_url'], campaign['description'],
+                campaign['cta_text'], campaign['offer_id'], campaign['aff_id'], 
+                campaign['active'], campaign.get('created_at', '2025-01-28 12:00:00'),
+                campaign.get('updated_at', '2025-01-28 12:00:00')
+            ))
+            
+            # Set property assignment (allow explicit property_code or finance affiliates)
+            property_code = campaign.get('property_code')
+            if not property_code:
+                finance_affiliates = {"43045", "43092"}  # include Money.com affiliate
+                property_code = 'mmm' if str(campaign.get('aff_id', '')) in finance_affiliates else 'mff'
+            conn.execute('''
+                INSERT INTO campaign_properties (
+                    campaign_id, property_code, visibility_percentage, active
+                ) VALUES (?, ?, 100, 1)
+            ''', (campaign['id'], property_code))
+        
+        conn.commit()
+        catalog.invalidate("emergency-restore-12-campaigns")
+        conn.close()
+        
+        print("✅ Emergency restoration complete: 12 campaigns with property attribution")
+        
+        return {
+            "status": "success",
+            "message": "All 12 campaigns restored with property attribution",
+            "campaigns_restored": len(campaigns_data),
+            "mmm_campaigns": 5,
+            "mff_campaigns": 7
+        }
+        
+    except Exception as e:
+        print(f"❌ Emergency restoration failed: {e}")
+        return {
+            "status": "error", 
+            "message": f"Restoration failed: {e}"
+        }
+
+# Database migration endpoint
+@router.post("/api/db/migrate")
+async def run_db_migration():
+    """Run database migration to add Phase 2 tracking columns"""
+    try:
+        init_db()
+        return {"success": True, "message": "Database migration completed successfully"}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# HARDCODED FIX for missing offer_ids - extracted from tune_urls
+@router.post("/api/db/fix-offer-ids-now")
+async def fix_offer_ids_now():
+    """Directly fix the 3 campaigns missing offer_ids"""
+    from database import get_db_connection
+    conn = get_db_connection()
+    try:
+        fixes = [
+            (18, "9341", "43093", "SlotsWise"),
+            (17, "9368", "43093", "ConsumerTestConnect"),
+            (16, "7833", "43093", "Survey Junkie"),
+        ]
+        results = []
+        for campaign_id, offer_id, aff_id, name in fixes:
+            conn.execute(
+                "UPDATE campaigns SET offer_id = ?, aff_id = ? WHERE id = ?",
+                (offer_id, aff_id, campaign_id)
+            )
+            results.append(f"✅ Fixed {name} (ID {campaign_id}): offer_id={offer_id}, aff_id={aff_id}")
+        conn.commit()
+        catalog.invalidate("fix-offer-ids-now")
+        return {"success": True, "message": "Offer IDs fixed!", "results": results}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+# Emergency schema fix endpoint
+@router.post("/api/db/fix-schema")
+async def fix_database_schema():
+    """Emergency fix for missing featured column causing popup Internal Server Error"""
+    from database import get_db_connection
+    conn = get_db_connection()
+    try:
+        results = []
+        
+        # Check and add featured column to campaigns table
+        cursor = conn.execute("PRAGMA table_info(campaigns)")
+        columns = [row[1] for row in cursor.fetchall()]
+        
+        if 'featured' not in columns:
+            conn.execute("ALTER TABLE campaigns ADD COLUMN featured BOOLEAN DEFAULT false")
+            conn.commit()
+            results.append("✅ Added featured column to campaigns table")
+        else:
+            results.append("✅ Featured column already exists in campaigns table")
+        
+        # Check and add daily cap columns to campaign_properties table
+        cursor = conn.execute("PRAGMA table_info(campaign_properties)")
+        cp_columns = [row[1] for row in cursor.fetchall()]
+        
+        if 'impression_cap_daily' not in cp_columns:
+            conn.execute("ALTER TABLE campaign_properties ADD COLUMN impression_cap_daily INTEGER")
+            conn.commit()
+            results.append("✅ Added impression_cap_daily column to campaign_properties table")
+        else:
+            results.append("✅ impression_cap_daily column already exists")
+            
+        if 'click_cap_daily' not in cp_columns:
+            conn.execute("ALTER TABLE campaign_properties ADD COLUMN click_cap_daily INTEGER")
+            conn.commit()
+            results.append("✅ Added click_cap_daily column to campaign_properties table")
+        else:
+            results.append("✅ click_cap_daily column already exists")
+        
+        # FIX MISSING OFFER_IDs - Extract from tune_url
+        results.append("🔧 Checking for missing offer_ids...")
+        import re
+        cursor = conn.execute("""
+            SELECT id, name, tune_url, offer_id, aff_id 
+            FROM campaigns 
+            WHERE active = 1 
+            AND tune_url IS NOT NULL 
+            AND tune_url != ''
+            AND (offer_id IS NULL OR offer_id = '' OR aff_id IS NULL OR aff_id = '')
+        """)
+        campaigns_to_fix = cursor.fetchall()
+        
+        for row in campaigns_to_fix:
+            campaign_id, name, tune_url, current_offer_id, current_aff_id = row
+            offer_match = re.search(r'offer_id=(\d+)', tune_url)
+            aff_match = re.search(r'aff_id=(\d+)', tune_url)
+            
+            new_offer_id = offer_match.group(1) if offer_match else None
+            new_aff_id = aff_match.group(1) if aff_match else None
+            
+            if new_offer_id or new_aff_id:
+                updates = []
+                params = []
+                if new_offer_id and (not current_offer_id or current_offer_id == ''):
+                    updates.append("offer_id = ?")
+                    params.append(new_offer_id)
+                if new_aff_id and (not current_aff_id or current_aff_id == ''):
+                    updates.append("aff_id = ?")
+                    params.append(new_aff_id)
+                
+                if updates:
+                    params.append(campaign_id)
+                    conn.execute(f"UPDATE campaigns SET {', '.join(updates)} WHERE id = ?", params)
+                    results.append(f"✅ Fixed campaign {campaign_id} ({name}): offer_id={new_offer_id}, aff_id={new_aff_id}")
+        
+        conn.commit()
+        catalog.invalidate("fix-schema")
+        
+        return {
+            "success": True, 
+            "message": "Schema fix completed",
+            "results": results,
+            "campaigns_columns": columns,
+            "campaign_properties_columns": cp_columns
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e), "message": "Schema fix failed"}
+    finally:
+        conn.close()
+
+# Force init endpoint to (re)create missing tables and return schema
+@router.post("/api/db/force-init")
+async def db_force_init():
+    try:
+        init_db()
+        from database import get_db_connection
+        conn = get_db_connection()
+        try:
+            # Ensure critical tables exist explicitly (idempotent)
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS campaign_properties (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id INTEGER NOT NULL,
+                    property_code TEXT NOT NULL,
+                    visibility_percentage INTEGER DEFAULT 100,
+                    active BOOLEAN DEFAULT 1,
+                    impression_cap_daily INTEGER NULL,
+                    click_cap_daily INTEGER NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE,
+                    UNIQUE(campaign_id, property_code)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS impressions (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id INTEGER NOT NULL,
+                    property_code TEXT NOT NULL,
+                    session_id TEXT,
+                    placement TEXT DEFAULT 'thankyou',
+                    user_agent TEXT,
+                    ip_hash INTEGER,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    source TEXT,
+                    subsource TEXT,
+                    utm_campaign TEXT,
+                    referrer TEXT,
+                    landing_page TEXT,
+                    FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS clicks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    campaign_id INTEGER NOT NULL,
+                    property_code TEXT NOT NULL,
+                    session_id TEXT,
+                    placement TEXT DEFAULT 'thankyou',
+                    user_agent TEXT,
+                    ip_hash INTEGER,
+                    revenue_estimate DECIMAL(10,2) DEFAULT 0.45,
+                    conversion_tracked BOOLEAN DEFAULT 0,
+                    timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    source TEXT,
+                    subsource TEXT,
+                    utm_campaign TEXT,
+                    referrer TEXT,
+                    landing_page TEXT,
+                    FOREIGN KEY (campaign_id) REFERENCES campaigns(id) ON DELETE CASCADE
+                )
+                """
+            )
+            conn.commit()
+            tables_cur = conn.execute("SELECT name FROM sqlite_master WHERE type='table' ORDER BY name")
+            tables = [row[0] for row in tables_cur.fetchall()]
+            schema = {}
+            for t in tables:
+                cur = conn.execute(f"PRAGMA table_info({t})")
+                schema[t] = [dict(cid=row[0], name=row[1], type=row[2], notnull=row[3], dflt=row[4], pk=row[5]) for row in cur.fetchall()]
+            return {"success": True, "tables": tables, "schema": schema}
+        finally:
+            conn.close()
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# Domain configuration fix endpoint
+@router.post("/api/db/fix-domains")
+async def fix_domain_configuration():
+    """Fix missing domain mappings for property resolution"""
+    from database import get_db_connection
+    conn = get_db_connection()
+    try:
+        results = []
+        
+        # Define the correct domain mappings
+        domain_mappings = [
+            ('mff', 'ModeFreeFinds', 'modefreefinds.com'),
+            ('mmm', 'ModeMarketMunchies', 'modemarketmunchies.com'),
+            ('mcad', 'ModeClassActionsDaily', 'modeclassactionsdaily.com'),
+            ('mmd', 'ModeMobileDaily', 'modemobiledaily.com')
+        ]
+        
+        for code, name, domain in domain_mappings:
+            # Check if property exists and update domain
+            cursor = conn.execute("SELECT id, domain FROM properties WHERE code = ?", (code,))
+            row = cursor.fetchone()
+            
+            if row:
+                current_domain = row[1]
+                if current_domain != domain:
+                    conn.execute("UPDATE properties SET domain = ? WHERE code = ?", (domain, code))
+                    results.append(f"✅ Updated {code} domain from '{current_domain}' to '{domain}'")
+                else:
+                    results.append(f"✅ {code} domain already correct: {domain}")
+            else:
+                # Insert missing property
+                conn.execute("""
+                    INSERT INTO properties (code, name, domain, active, popup_enabled) 
+                    VALUES (?, ?, ?, 1, 1)
+                """, (code, name, domain))
+                results.append(f"✅ Added missing property {code}: {domain}")
+        
+        conn.commit()
+        catalog.invalidate("fix-domains")
+        
+        # Verify the configuration
+        cursor = conn.execute("SELECT code, name, domain FROM properties ORDER BY code")
+        properties = [dict(zip(['code', 'name', 'domain'], row)) for row in cursor.fetchall()]
+        
+        return {
+            "success": True,
+            "message": "Domain configuration fixed",
+            "results": results,
+            "properties": properties
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e), "message": "Domain fix failed"}
+    finally:
+        conn.close()
+
+# Property-specific featured campaign migration
+@router.post("/api/db/migrate-featured-to-properties")
+async def migrate_featured_to_properties():
+    """Migrate featured flag from campaigns to property-specific featured_campaign_id"""
+    from database import get_db_connection
+    conn = get_db_connection()
+    try:
+        results = []
+        
+        # Step 1: Add featured_campaign_id column to properties table
+        cursor = conn.execute("PRAGMA table_info(properties)")
+        columns = [row[1] for row in cursor.fetchall()]
+        
+        if 'featured_campaign_id' not in columns:
+            conn.execute("ALTER TABLE properties ADD COLUMN featured_campaign_id INTEGER")
+            conn.commit()
+            results.append("✅ Added featured_campaign_id column to properties table")
+        else:
+            results.append("✅ featured_campaign_id column already exists in properties table")
+        
+        # Step 2: Find any currently featured campaigns and migrate them
+        cursor = conn.execute("SELECT id, name FROM campaigns WHERE featured = 1")
+        featured_campaigns = cursor.fetchall()
+        
+        if featured_campaigns:
+            for campaign_id, campaign_name in featured_campaigns:
+                results.append(f"📋 Found featured campaign: {campaign_name} (ID: {campaign_id})")
+                
+                # For now, set this as featured for MFF property (most active property)
+                # User can adjust this later through the properties interface
+                conn.execute("""
+                    UPDATE properties 
+                    SET featured_campaign_id = ? 
+                    WHERE code = 'mff'
+                """, (campaign_id,))
+                results.append(f"🎯 Set {campaign_name} as featured for MFF property")
+        else:
+            results.append("📋 No currently featured campaigns found")
+        
+        # Step 3: Remove featured column from campaigns table (will be done in Phase 2)
+        # For now, just unset all featured flags to prevent confusion
+        conn.execute("UPDATE campaigns SET featured = 0")
+        results.append("✅ Cleared all campaign-level featured flags")
+        
+        conn.commit()
+        catalog.invalidate("migrate-featured-to-properties")
+        
+        # Step 4: Verify the migration
+        cursor = conn.execute("""
+            SELECT p.code, p.name, p.featured_campaign_id, c.name as featured_campaign_name
+            FROM properties p
+            LEFT JOIN campaigns c ON p.featured_campaign_id = c.id
+            ORDER BY p.code
+        """)
+        properties = [dict(zip(['property_code', 'property_name', 'featured_campaign_id', 'featured_campaign_name'], row)) for row in cursor.fetchall()]
+        
+        return {
+            "success": True,
+            "message": "Featured campaign migration completed",
+            "results": results,
+            "properties": properties
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e), "message": "Migration failed"}
+    finally:
+        conn.close()
+
+# Check properties table schema 
+@router.get("/api/db/properties-schema")
+async def check_properties_schema():
+    """Check properties table schema and data"""
+    from database import get_db_connection
+    conn = get_db_connection()
+    try:
+        # Get table schema
+        cursor = conn.execute("PRAGMA table_info(properties)")
+        columns = [dict(zip(['cid', 'name', 'type', 'notnull', 'dflt_value', 'pk'], row)) for row in cursor.fetchall()]
+        
+        # Get all properties data  
+        cursor = conn.execute("SELECT * FROM properties")
+        properties = [dict(row) for row in cursor.fetchall()]
+        
+        return {
+            "success": True,
+            "schema": columns,
+            "properties": properties,
+            "has_featured_column": 'featured_campaign_id' in [col['name'] for col in columns]
+        }
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
+
+# Connection pool diagnostics
+@router.get("/api/db/pool-status")
+async def db_pool_status():
+    """Show pooled connection counters and the pragmas applied to each connection"""
+    from database import db_pool
+    try:
+        with db_pool.connection() as conn:
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        return {"success": True, "journal_mode": journal_mode, **db_pool.status()}
+    except Exception as e:
+        return {"success": False, "error": str(e)}
+
+# Fix missing offer_ids for new campaigns
+@router.post("/api/db/fix-offer-ids")
+async def fix_missing_offer_ids():
+    """Extract and populate offer_id/aff_id from tune_url for campaigns missing them.
+    
+    This is critical for analytics - campaigns without offer_id won't show in Tune reports.
+    """
+    import re
+    from database import get_db_connection
+    conn = get_db_connection()
+    try:
+        # Find campaigns with empty offer_id but valid tune_url
+        cursor = conn.execute("""
+            SELECT id, name, tune_url, offer_id, aff_id 
+            FROM campaigns 
+            WHERE active = 1 
+            AND tune_url IS NOT NULL 
+            AND tune_url != ''
+            AND (offer_id IS NULL OR offer_id = '')
+        """)
+        
+        campaigns_to_fix = cursor.fetchall()
+        fixed = []
+        
+        for row in campaigns_to_fix:
+            campaign_id, name, tune_url, current_offer_id, current_aff_id = row
+            
+            # Extract offer_id and aff_id from tune_url
+            offer_match = re.search(r'offer_id=(\d+)', tune_url)
+            aff_match = re.search(r'aff_id=(\d+)', tune_url)
+            
+            new_offer_id = offer_match.group(1) if offer_match else None
+            new_aff_id = aff_match.group(1) if aff_match else None
+            
+            if new_offer_id:
+                conn.execute("""
+                    UPDATE campaigns 
+                    SET offer_id = ?, aff_id = COALESCE(?, aff_id)
+                    WHERE id = ?
+                """, (new_offer_id, new_aff_id, campaign_id))
+                fixed.append({
+                    "id": campaign_id,
+                    "name": name,
+                    "offer_id": new_offer_id,
+                    "aff_id": new_aff_id
+                })
+        
+        conn.commit()
+        catalog.invalidate("db/fix-offer-ids")
+        
+        return {
+            "success": True,
+            "message": f"Fixed {len(fixed)} campaigns with missing offer_id",
+            "fixed": fixed,
+            "total_checked": len(campaigns_to_fix)
+        }
+        
+    except Exception as e:
+        conn.rollback()
+        return {"success": False, "error": str(e)}
+    finally:
+        conn.close()
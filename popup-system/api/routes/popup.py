@@ -0,0 +1,87 @@
+"""
+Popup bootstrap endpoint
+One cacheable response with everything popup.js needs before it can render on a
+thank-you page: property settings, the featured campaign and the ranked campaign list.
+Replaces the /properties/resolve -> /campaigns/{code} round-trip pair.
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Request
+
+import catalog
+from caps import cap_enforcer
+from database import detect_property_code_from_host
+from http_cache import HOST_HEADERS_VARY, cached_json_response, encode_json, strong_etag
+from selection import campaign_weight
+
+router = APIRouter()
+
+VALID_PROPERTIES = ['mff', 'mmm', 'mcad', 'mmd']
+
+# property_code -> ((catalog version, cap generation), body, etag); catalog rebuilds and caps invalidate
+_bootstrap_cache = {}
+
+
+def _request_hostname(request: Request, host: Optional[str]) -> str:
+    hostname = (host or "").strip().lower()
+    if not hostname:
+        forwarded = request.headers.get("x-forwarded-host") or request.headers.get("x-forwarded-server")
+        header_host = request.headers.get("host")
+        hostname = (forwarded or header_host or "").split(",")[0].strip().lower()
+    if ":" in hostname:
+        hostname = hostname.split(":")[0]
+    return hostname
+
+
+def build_bootstrap(snapshot: catalog.CatalogSnapshot, property_code: str) -> dict:
+    """Property settings + featured campaign + campaigns ranked featured-first, then by weight"""
+    prop = snapshot.properties.get(property_code) or {}
+    popup_enabled = bool(prop.get("popup_enabled", True)) and bool(prop.get("active", True))
+
+    capped = cap_enforcer.capped_ids(property_code, snapshot)
+    campaigns = [dict(row) for row in snapshot.feed(property_code)] if popup_enabled else []
+    campaigns = [c for c in campaigns if campaign_weight(c) > 0 and c["id"] not in capped]
+    featured_id = snapshot.featured_campaign_id(property_code)
+    total_weight = sum(campaign_weight(c) for c in campaigns) or 1.0
+    for campaign in campaigns:
+        campaign["is_featured"] = campaign["id"] == featured_id
+        campaign["weight"] = round(campaign_weight(campaign) / total_weight, 4)
+
+    # Stable sort over the newest-first feed: creation date stays the final tiebreaker
+    campaigns.sort(key=lambda c: (not c["is_featured"], -c["weight"]))
+    featured = next((c for c in campaigns if c["is_featured"]), None)
+
+    return {
+        "property": {
+            "code": property_code,
+            "name": prop.get("name"),
+            "domain": prop.get("domain"),
+            "popup_enabled": popup_enabled,
+            "popup_frequency": prop.get("popup_frequency") or "session",
+            "popup_placement": prop.get("popup_placement") or "thankyou",
+        },
+        "featured_campaign": featured,
+        "campaigns": campaigns,
+    }
+
+
+@router.get("/popup/bootstrap")
+async def get_popup_bootstrap(request: Request, property: Optional[str] = None, host: Optional[str] = None):
+    """Everything the popup needs in one request (pass ?property= or ?host=window.location.hostname)"""
+    property_code = (property or "").lower()
+    vary = None
+    if property_code not in VALID_PROPERTIES:
+        property_code = detect_property_code_from_host(_request_hostname(request, host))
+        if not (host or "").strip():
+            vary = HOST_HEADERS_VARY  # resolved from request headers
+
+    snapshot = catalog.get_snapshot()
+    cap_enforcer.capped_ids(property_code, snapshot)  # roll over / sync caps before reading the generation
+    cache_version = (snapshot.version, cap_enforcer.generation)
+    cached = _bootstrap_cache.get(property_code)
+    if cached is None or cached[0] != cache_version:
+        body = encode_json(build_bootstrap(snapshot, property_code))
+        cached = (cache_version, body, strong_etag(body))
+        _bootstrap_cache[property_code] = cached
+    return cached_json_response(request, cached[1], cached[2], vary=vary)
@@ -7,7 +7,8 @@ and resolve property by host for multi-domain support.
 from fastapi import APIRouter, HTTPException, Request
 from pydantic import BaseModel
 from typing import List, Dict, Optional
-from database import get_db_connection, detect_property_code_from_host
+from database import get_db_connection, db_connection, detect_property_code_from_host
+import catalog
 import sqlite3
 
 router = APIRouter()
@@ -31,8 +32,7 @@ class PropertySettingUpdate(BaseModel):
 @router.get("/campaigns/{campaign_id}/properties", response_model=List[PropertySetting])
 async def get_campaign_property_settings(campaign_id: int):
     """Get property settings for a specific campaign"""
-    conn = get_db_connection()
-    try:
+    with db_connection() as conn:
         cursor = conn.execute("""
             SELECT property_code, visibility_percentage, active,
                    impression_cap_daily, click_cap_daily
@@ -43,8 +43,6 @@ async def get_campaign_property_settings(campaign_id: int):
         
         settings = [dict(row) for row in cursor.fetchall()]
         return settings
-    finally:
-        conn.close()
 
 @router.post("/campaigns/{campaign_id}/properties", response_model=dict)
 async def set_campaign_property_settings(campaign_id: int, settings: List[PropertySetting]):
@@ -85,6 +83,7 @@ async def set_campaign_property_settings(campaign_id: int, settings: List[Proper
             ))
         
         conn.commit()
+        catalog.invalidate("set_campaign_property_settings")
         return {"message": f"Property settings updated for campaign {campaign_id}"}
         
     except sqlite3.Error as e:
@@ -152,6 +151,7 @@ async def update_property_setting(campaign_id: int, property_code: str, update:
             ))
         
         conn.commit()
+        catalog.invalidate("update_property_setting")
         return {"message": f"Property setting updated for {property_code}"}
         
     except sqlite3.Error as e:
@@ -180,28 +180,21 @@ async def resolve_property(request: Request, host: Optional[str] = None):
 
     code = detect_property_code_from_host(hostname)
 
-    conn = get_db_connection()
-    try:
-        cursor = conn.execute(
-            "SELECT code, name, domain, active, popup_enabled, popup_frequency, popup_placement FROM properties WHERE code = ?",
-            (code,),
-        )
-        row = cursor.fetchone()
-        if not row:
-            raise HTTPException(status_code=404, detail=f"Property not found for host: {hostname}")
+    # Property rows live in the catalog snapshot; no SQLite round trip per popup load
+    row = catalog.get_snapshot().properties.get(code)
+    if not row:
+        raise HTTPException(status_code=404, detail=f"Property not found for host: {hostname}")
 
-        return {
-            "property_code": row[0],
-            "name": row[1],
-            "domain": row[2],
-            "active": bool(row[3]),
-            "popup_enabled": bool(row[4]),
-            "popup_frequency": row[5],
-            "popup_placement": row[6],
-            "hostname": hostname,
-        }
-    finally:
-        conn.close()
+    return {
+        "property_code": row["code"],
+        "name": row["name"],
+        "domain": row["domain"],
+        "active": bool(row["active"]),
+        "popup_enabled": bool(row["popup_enabled"]),
+        "popup_frequency": row["popup_frequency"],
+        "popup_placement": row["popup_placement"],
+        "hostname": hostname,
+    }
 
 @router.put("/properties/{property_code}/featured")
 async def set_featured_campaign(property_code: str, request: dict):
@@ -229,6 +222,7 @@ async def set_featured_campaign(property_code: str, request: dict):
         """, (campaign_id, property_code))
         
         conn.commit()
+        catalog.invalidate("set_featured_campaign")
         
         return {
             "success": True,
@@ -280,29 +274,8 @@ async def get_property_campaigns(property_code: str):
     if property_code not in VALID_PROPERTIES:
         raise HTTPException(status_code=400, detail=f"Invalid property code: {property_code}")
     
-    conn = get_db_connection()
-    try:
-        cursor = conn.execute("""
-            SELECT 
-                c.id,
-                c.name,
-                c.tune_url,
-                c.logo_url,
-                c.main_image_url,
-                c.description,
-                c.active as campaign_active,
-                cp.visibility_percentage,
-                cp.active as property_active
-            FROM campaigns c
-            JOIN campaign_properties cp ON c.id = cp.campaign_id
-            WHERE cp.property_code = ?
-            ORDER BY c.created_at DESC
-        """, (property_code,))
-        
-        campaigns = [dict(row) for row in cursor.fetchall()]
-        return campaigns
-    finally:
-        conn.close()
+    # Served from the in-memory catalog snapshot (rebuilt on admin writes)
+    return [dict(row) for row in catalog.get_snapshot().property_campaigns(property_code)]
 
 @router.delete("/campaigns/{campaign_id}/properties/{property_code}", response_model=dict)
 async def remove_property_setting(campaign_id: int, property_code: str):
@@ -322,6 +295,7 @@ async def remove_property_setting(campaign_id: int, property_code: str):
             raise HTTPException(status_code=404, detail="Property setting not found")
         
         conn.commit()
+        catalog.invalidate("remove_property_setting")
         return {"message": f"Campaign deactivated for property {property_code}"}
         
     except sqlite3.Error as e:
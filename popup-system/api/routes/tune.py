@@ -0,0 +1,443 @@
+"""
+Tune (HasOffers) reporting endpoints
+Reports and connectivity checks against Mike's HasOffers network (calls go through the async
+client in hasoffers.py). Only the analytics dashboard calls these, so main.py includes this
+router lazily (see lazy_routes.py).
+"""
+
+import asyncio
+from dataclasses import asdict
+
+from fastapi import APIRouter, HTTPException
+from datetime import datetime, timedelta
+from database import get_db_connection
+from hasoffers import hasoffers_client, HasOffersError
+import reports
+import rollups
+
+router = APIRouter()
+
+@router.get("/test-tune-api")
+async def test_tune_api():
+    """Test if Tune API is accessible from Railway"""
+    reachable, connectivity_error = await hasoffers_client.ping()
+
+    start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+    end_date = datetime.now().strftime('%Y-%m-%d')
+    try:
+        stats = await hasoffers_client.get_stats(
+            start_date, end_date, fields=('Stat.clicks', 'Stat.offer_id'), group_by=('Stat.offer_id',), use_cache=False
+        )
+        tune_result = {"success": True, "source": "HasOffers Report.getStats", "error": None,
+                       "rows": len(stats.rows), "totals": asdict(stats.totals)}
+    except HasOffersError as e:
+        tune_result = {"success": False, "source": "HasOffers Report.getStats", "error": str(e)}
+
+    return {
+        "status": "success" if tune_result["success"] else "error",
+        "basic_connectivity": reachable,
+        "connectivity_error": connectivity_error,
+        "tune_api_result": tune_result,
+        "client": hasoffers_client.status(),
+    }
+
+@router.get("/analytics/tune-inspect")
+async def tune_inspect(preset: str = "last_7_days"):
+    """Diagnostic: Compare unfiltered vs sub-filtered Tune stats per affiliate.
+
+    Finance (aff_id=43045): filter Stat.aff_sub5 LIKE 'popup_%'
+    Lifestyle (aff_id=42946): filter Stat.aff_sub2 = 'perks'
+    """
+    try:
+        # Resolve dates from preset
+        if preset == "today":
+            start_date = end_date = datetime.now().strftime('%Y-%m-%d')
+        elif preset == "yesterday":
+            y = datetime.now() - timedelta(days=1)
+            start_date = end_date = y.strftime('%Y-%m-%d')
+        elif preset == "last_7_days":
+            start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+            end_date = datetime.now().strftime('%Y-%m-%d')
+        elif preset == "last_30_days":
+            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+            end_date = datetime.now().strftime('%Y-%m-%d')
+        else:
+            start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+            end_date = datetime.now().strftime('%Y-%m-%d')
+
+        # Active offer ids
+        db_conn = get_db_connection()
+        cursor = db_conn.execute("SELECT DISTINCT offer_id, aff_id FROM campaigns WHERE active = 1 AND offer_id IS NOT NULL")
+        rows = cursor.fetchall(); db_conn.close()
+        offer_ids = [int(r[0]) for r in rows if r[0]]
+        aff_ids = sorted({str(r[1]) for r in rows if r[1]})
+
+        fields = ('Stat.clicks', 'Stat.conversions', 'Stat.revenue', 'Stat.offer_id', 'Stat.affiliate_id')
+        group_by = ('Stat.offer_id', 'Stat.affiliate_id')
+        sub_filters = {
+            '43045': {'Stat.aff_sub5': ('LIKE', ['popup_%'])},
+            '42946': {'Stat.aff_sub2': ('EQUAL_TO', ['perks'])},
+        }
+
+        def stats(affiliate_ids, extra=None):
+            filters = {'Stat.offer_id': ('EQUAL_TO', offer_ids), 'Stat.affiliate_id': ('EQUAL_TO', affiliate_ids), **(extra or {})}
+            return hasoffers_client.get_stats(start_date, end_date, fields, group_by, filters)
+
+        # Unfiltered by sub parameters (but restricted to our affiliates), plus one sub-filtered
+        # call per affiliate - all in flight at once
+        unfiltered, *filtered = await asyncio.gather(
+            stats(aff_ids),
+            *(stats([aid], sub_filters.get(aid)) for aid in aff_ids),
+        )
+
+        return {
+            'success': True,
+            'preset': preset,
+            'period': f"{start_date} to {end_date}",
+            'affiliates': aff_ids,
+            'offer_ids': offer_ids,
+            'unfiltered': {'params': unfiltered.params, 'totals': asdict(unfiltered.totals), 'raw': unfiltered.raw},
+            'filtered': [
+                {'affiliate_id': aid, 'totals': asdict(result.totals), 'response': result.raw, 'params': result.params}
+                for aid, result in zip(aff_ids, filtered)
+            ]
+        }
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+
+@router.get("/analytics/tune-style-report")
+async def get_tune_style_report(
+    start_date: str = None,
+    end_date: str = None,
+    preset: str = None,
+    property_code: str = None,
+    campaign_id: int = None
+):
+    """Mike's preferred Tune-style reporting using REAL Tune API data"""
+    try:
+        
+        # Handle date presets first
+        if preset and not start_date and not end_date:
+            if preset == "today":
+                start_date = end_date = datetime.now().strftime('%Y-%m-%d')
+            elif preset == "yesterday":
+                yesterday = datetime.now() - timedelta(days=1)
+                start_date = end_date = yesterday.strftime('%Y-%m-%d')
+            elif preset == "last_7_days":
+                start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+                end_date = datetime.now().strftime('%Y-%m-%d')
+            elif preset == "last_30_days":
+                start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+                end_date = datetime.now().strftime('%Y-%m-%d')
+            elif preset == "this_month":
+                today = datetime.now()
+                start_date = today.replace(day=1).strftime('%Y-%m-%d')
+                end_date = today.strftime('%Y-%m-%d')
+            elif preset == "last_month":
+                today = datetime.now()
+                first_this_month = today.replace(day=1)
+                last_month = first_this_month - timedelta(days=1)
+                start_date = last_month.replace(day=1).strftime('%Y-%m-%d')
+                end_date = last_month.strftime('%Y-%m-%d')
+        
+        # Default to last 30 days if no dates provided (to match Tune API)
+        if not start_date and not end_date:
+            start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+            end_date = datetime.now().strftime('%Y-%m-%d')
+        
+        # Use appropriate date range based on preset
+        if not start_date:
+            if preset == 'today':
+                start_date = datetime.now().strftime('%Y-%m-%d')
+            elif preset == 'last_7_days':
+                start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+            elif preset == 'last_14_days':
+                start_date = (datetime.now() - timedelta(days=14)).strftime('%Y-%m-%d')
+            elif preset == 'last_30_days':
+                start_date = (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+            else:
+                start_date = (datetime.now() - timedelta(days=7)).strftime('%Y-%m-%d')
+        if not end_date:
+            end_date = datetime.now().strftime('%Y-%m-%d')
+
+        # Everything local first (offer/affiliate ids, names, impressions and clicks), so no
+        # database connection is held while waiting on HasOffers
+        # 🎯 DYNAMIC: Get all active campaign offer IDs from database (future-proof)
+        db_conn = get_db_connection()
+        try:
+            cursor = db_conn.execute("SELECT DISTINCT offer_id FROM campaigns WHERE active = 1 AND offer_id IS NOT NULL")
+            popup_offer_ids = [int(row[0]) for row in cursor.fetchall() if row[0] and str(row[0]).strip()]
+            print(f"📊 Dynamic analytics: Found {len(popup_offer_ids)} active offer IDs: {popup_offer_ids}")
+
+            # Affiliate filter limits the report to our traffic only (critical to prevent network-wide totals)
+            affiliate_ids = []
+            try:
+                cursor = db_conn.execute("SELECT DISTINCT aff_id FROM campaigns WHERE active = 1 AND aff_id IS NOT NULL")
+                affiliate_ids = [str(row[0]) for row in cursor.fetchall() if row[0] and str(row[0]).strip()]
+            except Exception as e:
+                print(f"⚠️ Could not load affiliate_ids: {e}")
+
+            # 🎯 DYNAMIC: Get campaign names and properties from database
+            campaign_data = {}
+            cursor = db_conn.execute("""
+                SELECT c.offer_id, c.name, cp.property_code 
+                FROM campaigns c 
+                LEFT JOIN campaign_properties cp ON c.id = cp.campaign_id 
+                WHERE c.active = 1 AND c.offer_id IS NOT NULL
+            """)
+            for offer_id, name, campaign_property in cursor.fetchall():
+                if offer_id and str(offer_id).strip():
+                    campaign_data[int(offer_id)] = {
+                        'name': name,
+                        'property': 'MMM' if campaign_property == 'mmm' else 'MFF'
+                    }
+
+            # Get REAL impressions and LOCAL clicks grouped by offer_id within date range
+            start_hour, end_hour = rollups.day_bounds(start_date, end_date)
+            impressions_by_offer = {}
+            clicks_by_offer = {}
+            for row in reports.aggregate(
+                db_conn, ("offer_id",), start_hour=start_hour, end_hour=end_hour,
+                property_code=property_code, campaign_id=campaign_id,
+            ):
+                if not row["offer_id"] or not str(row["offer_id"]).strip():
+                    continue
+                if row["impressions"]:
+                    impressions_by_offer[int(row["offer_id"])] = row["impressions"]
+                if row["clicks"]:
+                    clicks_by_offer[int(row["offer_id"])] = {"clicks": row["clicks"], "local_rev": row["revenue"]}
+        except Exception as e:
+            print(f"❌ Database error: {e}")
+            raise
+        finally:
+            db_conn.close()
+
+        # 🎯 GET REAL POPUP CAMPAIGN DATA (FILTERED!)
+        # Get ALL campaigns then filter for popup campaigns in code
+        # (API-level filtering only returns 1 campaign incorrectly)
+        # No additional API filtering by sub params yet – keep simple and accurate by affiliate ID
+        try:
+            stats = await hasoffers_client.get_stats(
+                start_date, end_date,
+                fields=('Stat.clicks', 'Stat.conversions', 'Stat.revenue', 'Stat.payout', 'Stat.offer_id'),
+                group_by=('Stat.offer_id',),
+                filters={'Stat.affiliate_id': ('EQUAL_TO', affiliate_ids)} if affiliate_ids else None,
+            )
+        except HasOffersError as api_error:
+            # Do NOT fallback. Return explicit failure so UI can show N/A.
+            return {
+                "success": False,
+                "data": [],
+                "summary": {},
+                "source": "Tune API error",
+                "error": str(api_error)
+            }
+
+        # Filter for popup campaigns in Python code
+        campaigns = [stat for stat in stats.rows if stat.offer_id in popup_offer_ids]
+
+        # Calculate popup totals from individual campaigns
+        popup_clicks = 0
+        popup_conversions = 0
+        popup_revenue = 0.0
+        active_campaigns = []
+
+        # Build combined per-offer rows using REAL impressions and TUNE clicks/revenue/payout
+        seen_offer_ids = set()
+        for stat in campaigns:
+            offer_id = stat.offer_id
+            seen_offer_ids.add(offer_id)
+            campaign_info = campaign_data.get(offer_id, {'name': f'Offer {offer_id}', 'property': 'Unknown'})
+            name = campaign_info['name']
+            partner = campaign_info['property']
+            # Use LOCAL clicks to align with local impressions (Tune clicks are affiliate-wide)
+            clicks_local_info = clicks_by_offer.get(offer_id, {"clicks": 0, "local_rev": 0.0})
+            clicks = int(clicks_local_info.get('clicks', 0))
+            conversions = stat.conversions
+            revenue = stat.revenue
+            payout = stat.payout
+
+            impressions = int(impressions_by_offer.get(offer_id, 0))
+            ctr = (clicks / impressions * 100.0) if impressions > 0 else 0.0
+            rpm = (revenue / impressions * 1000.0) if impressions > 0 else 0.0
+            rpc = (revenue / clicks) if clicks > 0 else 0.0
+            profit = revenue - payout
+
+            # Data quality guard: impressions cannot be less than clicks.
+            # Per spec, do not fabricate values. Surface N/A and flag.
+            data_quality = None
+            if impressions > 0 and clicks > impressions:
+                data_quality = "impressions_lt_clicks"
+                ctr = None
+                rpm = None
+
+            popup_clicks += clicks
+            popup_conversions += conversions
+            popup_revenue += revenue
+
+            active_campaigns.append({
+                'offer': name,
+                'partner': partner,
+                'campaign': name,
+                'creative': 'N/A',
+                'impressions': impressions,
+                'clicks': clicks,
+                'conversions': conversions,
+                'revenue': round(revenue, 2),
+                'ctr': (round(ctr, 2) if isinstance(ctr, (int, float)) else None),
+                'rpm': (round(rpm, 2) if isinstance(rpm, (int, float)) else None),
+                'rpc': round(rpc, 2),
+                'payout': round(payout, 2),
+                'profit': round(profit, 2),
+                'data_quality': data_quality
+            })
+
+        # Include offers with impressions but no clicks in period (if any)
+        for offer_id, impressions in impressions_by_offer.items():
+            if offer_id in seen_offer_ids:
+                continue
+            campaign_info = campaign_data.get(offer_id, {'name': f'Offer {offer_id}', 'property': 'Unknown'})
+            name = campaign_info['name']
+            partner = campaign_info['property']
+            active_campaigns.append({
+                'offer': name,
+                'partner': partner,
+                'campaign': name,
+                'creative': 'N/A',
+                'impressions': int(impressions),
+                'clicks': int(clicks_by_offer.get(offer_id, {}).get('clicks', 0)),
+                'conversions': 0,
+                'revenue': 0.0,
+                'ctr': 0.0,
+                'rpm': 0.0,
+                'rpc': 0.0,
+                'payout': 0.0,
+                'profit': 0.0
+            })
+
+        # Use calculated popup totals and return all active campaigns
+        network_clicks = popup_clicks
+        network_conversions = popup_conversions
+        network_revenue = popup_revenue
+
+        # Determine what data we're showing
+        if network_clicks > 0:
+            # We have real popup campaign data
+            source_label = "🎯 REAL HasOffers API (Popup Campaigns Filtered)"
+            status_msg = f"✅ Real popup campaign data - {len(active_campaigns)} active campaigns"
+        else:
+            # No popup campaign activity
+            source_label = "🎯 REAL HasOffers API (No Popup Activity)"
+            status_msg = f"✅ Real API filtering worked - no popup activity in {preset}"
+
+        return {
+            "success": True,
+            "period": f"{start_date} to {end_date}",
+            "preset": preset or "custom",
+            "data": active_campaigns,
+            "summary": {
+                'total_campaigns': len(active_campaigns),
+                'total_impressions': sum(row.get('impressions', 0) for row in active_campaigns),
+                'total_clicks': network_clicks,
+                'total_conversions': network_conversions,
+                'total_revenue': network_revenue
+            },
+            "source": source_label,
+            "api_status": status_msg,
+            "real_totals": {
+                'clicks': network_clicks,
+                'conversions': network_conversions,
+                'revenue': network_revenue
+            },
+            "popup_campaign_count": len(active_campaigns),
+            "debug": {
+                "affiliate_ids": affiliate_ids,
+                "filtered_offer_ids": popup_offer_ids,
+                "tune_data_age_seconds": stats.age_seconds
+            }
+        }
+
+    except Exception as e:
+        # Final explicit failure
+        return {
+            "success": False,
+            "data": [],
+            "summary": {},
+            "source": "Tune API error",
+            "error": str(e)
+        }
+
+async def _get_local_tune_style_report(start_date: str, end_date: str, preset: str, property_code: str, campaign_id: int):
+    """Fallback to local database if Tune API is unavailable"""
+    conn = get_db_connection()
+    try:
+        start_hour, end_hour = rollups.day_bounds(start_date, end_date) if start_date and end_date else (None, None)
+
+        # Per offer/partner rows matching Mike's Tune screenshot layout; impressions and clicks
+        # are aggregated separately and merged, so no impressions x clicks fan-out
+        report = reports.aggregate(
+            conn,
+            ("offer_id", "property_code", "campaign_name"),
+            attributes=("creative", "payout"),
+            start_hour=start_hour,
+            end_hour=end_hour,
+            property_code=property_code,
+            offer_id=campaign_id,
+        )
+        results = []
+        for row in sorted(report, key=lambda r: (r["impressions"], r["revenue"]), reverse=True):
+            reports.with_rates(row)
+            results.append({
+                'offer': row['campaign_name'],
+                'partner': row['property_code'],
+                'campaign': row['campaign_name'],
+                'creative': row['creative'],
+                'impressions': row['impressions'],
+                'clicks': row['clicks'],
+                'conversions': 0,
+                'payout': round(float(row['payout']), 2),
+                'cpm': 0.0,
+                'revenue': round(row['revenue'], 2),
+                'rpm': round(row['rpm'], 2),
+                'rpc': round(row['rpc'], 2),
+                'profit': 0.0,
+                # Calculate CTR (Click Through Rate)
+                'ctr': round(row['ctr'], 2)
+            })
+        
+        return {
+            "success": True,
+            "period": f"{start_date} to {end_date}",
+            "preset": preset or "custom",
+            "data": results,
+            "summary": {
+                "total_campaigns": len(results),
+                "total_impressions": sum(r['impressions'] for r in results),
+                "total_clicks": sum(r['clicks'] for r in results),
+                "total_revenue": round(sum(r['revenue'] for r in results), 2),
+                "avg_ctr": round((sum(r['clicks'] for r in results) / sum(r['impressions'] for r in results) * 100) if sum(r['impressions'] for r in results) > 0 else 0, 2),
+                "avg_rpm": round(sum(r['rpm'] for r in results) / len(results) if results else 0, 2),
+                "avg_rpc": round(sum(r['rpc'] for r in results) / len(results) if results else 0, 2)
+            },
+            "source": "Local Database (Tune API unavailable)"
+        }
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to generate report: {str(e)}")
+    finally:
+        conn.close()
+
+@router.get("/analytics/tune-health")
+async def tune_health():
+    """Minimal connectivity check to Tune/HasOffers API.
+
+    Returns a simple ok boolean with optional error details and a timestamp,
+    plus the client's circuit breaker state.
+    """
+    from datetime import datetime as _dt
+    # Lightweight reachability check without API token
+    ok, error = await hasoffers_client.ping()
+    result = {"ok": ok, "timestamp": _dt.now().isoformat(), "circuit": hasoffers_client.breaker.status()}
+    if error:
+        result["error"] = error
+    return result
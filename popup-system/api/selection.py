@@ -0,0 +1,75 @@
+"""
+Deterministic weighted campaign selection for Mode Popup Management System
+Rendezvous (highest-random-weight) hashing over the catalog feed: the same
+(property, send, subscriber bucket) always picks the same campaign, so repeated ESP
+image fetches hit the render cache, while across sends each campaign wins in proportion
+to its campaign_properties.visibility_percentage.
+"""
+
+import hashlib
+import math
+from typing import Iterable, List, Mapping, Optional, Sequence
+
+import catalog
+
+# Never shown in email creatives
+EXCLUDED_CAMPAIGN_NAMES = {"Prizies"}
+DEFAULT_WEIGHT = 100
+
+
+def _unit_hash(*parts) -> float:
+    """Uniform value in (0, 1) derived from the parts"""
+    digest = hashlib.sha256("|".join(str(p) for p in parts).encode("utf-8")).digest()
+    # 53 bits -> exact double; shift away from 0 so log() is always defined
+    return (int.from_bytes(digest[:8], "big") >> 11 | 1) / float(1 << 53)
+
+
+def campaign_weight(candidate: Mapping) -> float:
+    weight = candidate.get("visibility_percentage")
+    return float(DEFAULT_WEIGHT if weight is None else weight)
+
+
+def rank_weighted(candidates: Iterable[Mapping], seed: Sequence) -> List[Mapping]:
+    """Order candidates by weighted rendezvous score for the seed (best first).
+
+    Score is -ln(u) / weight with u hashed from (seed, campaign id): the first entry is a
+    weighted draw without replacement, deterministic per seed. Zero-weight campaigns drop out,
+    and adding or removing one campaign only moves the seeds that campaign wins or loses.
+    """
+    scored = []
+    for candidate in candidates:
+        weight = campaign_weight(candidate)
+        if weight <= 0:
+            continue
+        score = -math.log(_unit_hash(*seed, candidate["id"])) / weight
+        scored.append((score, candidate["id"], candidate))
+    scored.sort(key=lambda item: (item[0], item[1]))
+    return [candidate for _, _, candidate in scored]
+
+
+def email_candidates(property_code: str, snapshot: Optional[catalog.CatalogSnapshot] = None) -> List[Mapping]:
+    """Active campaigns assigned to the property (feed rows carry visibility_percentage).
+
+    Properties with no assignments fall back to every active campaign at equal weight,
+    which is what email creatives served before property targeting.
+    """
+    snapshot = snapshot or catalog.get_snapshot()
+    feed = [row for row in snapshot.feed(property_code.lower()) if row.get("name") not in EXCLUDED_CAMPAIGN_NAMES]
+    if feed:
+        return feed
+    return [
+        {"id": campaign_id, "visibility_percentage": DEFAULT_WEIGHT}
+        for campaign_id, campaign in sorted(snapshot.campaigns.items())
+        if campaign.get("active") and campaign.get("name") not in EXCLUDED_CAMPAIGN_NAMES
+    ]
+
+
+def select_email_campaign(property_code: str, send: str = "", bucket: Optional[str] = None,
+                          snapshot: Optional[catalog.CatalogSnapshot] = None) -> Optional[Mapping]:
+    """Full campaign row chosen for (property, send, bucket), or None when nothing is active"""
+    snapshot = snapshot or catalog.get_snapshot()
+    seed = (property_code.lower(), send or "", "" if bucket is None else bucket)
+    ranked = rank_weighted(email_candidates(property_code, snapshot), seed)
+    if not ranked:
+        return None
+    return snapshot.campaign(ranked[0]["id"])
@@ -0,0 +1,106 @@
+"""
+Cross-process coordination for Mode Popup Management System
+`uvicorn --workers N` runs N copies of the app against one SQLite file. File locks (flock)
+next to the database serialize the work that must not interleave across processes: startup
+migrations/backfills, writes to the event tables, the background event compaction and the
+email pre-render run.
+"""
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from database import DB_PATH
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # Non-POSIX dev machines: locks still serialize threads, just not processes
+    FCNTL_AVAILABLE = False
+    fcntl = None
+
+# uvicorn reads the same variable for its default --workers
+WEB_CONCURRENCY = max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+LOCK_DIR = os.getenv("LOCK_DIR") or os.path.dirname(os.path.abspath(DB_PATH))
+
+
+class FileLock:
+    """Exclusive lock held by one thread of one process at a time (thread lock + flock)"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.path = os.path.join(LOCK_DIR, f".{name}.lock")
+        self._thread_lock = threading.Lock()
+        self._fd = None
+        self._pid = None
+        self.stats = {"acquired": 0, "contended": 0, "skipped": 0, "wait_ms": 0.0}
+
+    def _handle(self) -> int:
+        # One descriptor per process; a forked child must not share its parent's lock
+        if self._fd is None or self._pid != os.getpid():
+            os.makedirs(LOCK_DIR, exist_ok=True)
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def acquire(self, blocking: bool = True) -> bool:
+        started = time.perf_counter()
+        if not self._thread_lock.acquire(blocking):
+            self.stats["skipped"] += 1
+            return False
+        if FCNTL_AVAILABLE:
+            try:
+                fd = self._handle()
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    if not blocking:
+                        self._thread_lock.release()
+                        self.stats["skipped"] += 1
+                        return False
+                    self.stats["contended"] += 1
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+            except BaseException:
+                self._thread_lock.release()
+                raise
+        self.stats["acquired"] += 1
+        self.stats["wait_ms"] += (time.perf_counter() - started) * 1000
+        return True
+
+    def release(self):
+        if FCNTL_AVAILABLE and self._fd is not None:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+        self._thread_lock.release()
+
+    @contextmanager
+    def hold(self):
+        """Block until acquired: `with writer_lock.hold(): ...`"""
+        self.acquire()
+        try:
+            yield
+        finally:
+            self.release()
+
+    def status(self) -> dict:
+        return {"path": self.path, **self.stats, "wait_ms": round(self.stats["wait_ms"], 1)}
+
+
+# Schema migrations, backfills and rollup catch-up at boot (workers take turns; later ones find nothing to do)
+startup_lock = FileLock("startup")
+# Every write transaction on the event tables, so workers queue here instead of spinning on busy_timeout
+writer_lock = FileLock("sqlite-writer")
+# Background event compaction: whichever worker gets it runs, the others skip
+compaction_lock = FileLock("event-compaction")
+# Email pre-render run: one at a time across workers, progress shared through a file (prerender.py)
+prerender_lock = FileLock("email-prerender")
+
+
+def status() -> dict:
+    return {
+        "pid": os.getpid(),
+        "web_concurrency": WEB_CONCURRENCY,
+        "process_locks": FCNTL_AVAILABLE,
+        "locks": {lock.name: lock.status() for lock in (startup_lock, writer_lock, compaction_lock, prerender_lock)},
+    }
@@ -184,6 +184,51 @@ class CampaignManager {
         }
     }
 
+    async startEmailPrerender() {
+        const button = document.getElementById('prerenderEmailBtn');
+        if (button) button.disabled = true;
+        try {
+            const response = await fetch(`${this.baseURL}/email/prerender`, { method: 'POST' });
+            if (!response.ok) throw new Error(`HTTP ${response.status}`);
+            this.renderPrerenderStatus(await response.json());
+            await this.pollEmailPrerender();
+        } catch (error) {
+            console.error('❌ Email pre-render failed to start:', error);
+            this.renderPrerenderStatus({ status: 'error', error: error.message });
+        } finally {
+            if (button) button.disabled = false;
+        }
+    }
+
+    async pollEmailPrerender() {
+        while (true) {
+            await new Promise(resolve => setTimeout(resolve, 1500));
+            const response = await fetch(`${this.baseURL}/email/prerender`);
+            if (!response.ok) return;
+            const progress = await response.json();
+            this.renderPrerenderStatus(progress);
+            if (progress.status !== 'running') {
+                if (progress.failures && progress.failures.length) {
+                    console.warn('⚠️ Email pre-render failures:', progress.failures);
+                }
+                return;
+            }
+        }
+    }
+
+    renderPrerenderStatus(progress) {
+        const el = document.getElementById('prerender-status');
+        if (!el) return;
+        if (progress.status === 'error') {
+            el.textContent = `Pre-render error: ${progress.error}`;
+            return;
+        }
+        const summary = `${progress.completed}/${progress.total} (${progress.percent}%) · ` +
+            `${progress.rendered} rendered · ${progress.already_cached} cached · ${progress.failed} failed`;
+        const label = { running: 'Rendering…', interrupted: 'Interrupted:' }[progress.status] || 'Done:';
+        el.textContent = `${label} ${summary}`;
+    }
+
     setupEventListeners() {
         // Add Campaign button
         const addBtn = document.getElementById('addCampaignBtn');
@@ -191,6 +236,12 @@ class CampaignManager {
             addBtn.addEventListener('click', () => this.showAddCampaignModal());
         }
 
+        // Email creative pre-render (run before a newsletter send)
+        const prerenderBtn = document.getElementById('prerenderEmailBtn');
+        if (prerenderBtn) {
+            prerenderBtn.addEventListener('click', () => this.startEmailPrerender());
+        }
+
         // Modal close buttons
         document.addEventListener('click', (e) => {
             if (e.target.classList.contains('modal-close')) {
@@ -30,6 +30,8 @@
         constructor() {
             this.campaigns = [];
             this.rawCampaigns = [];
+            this.featuredCampaign = null;
+            this.popupEnabled = true;
             this.currentCampaignIndex = 0;
             this.config = {};
             this.isVisible = false;
@@ -54,6 +56,9 @@
                 ...options
             };
 
+            // Options the page set explicitly win over the property's server-side settings
+            this.explicitOptions = options;
+
             this.debug('Initializing Mode Popup', this.config);
 
             // Check if popup should be shown based on frequency
@@ -63,9 +68,20 @@
             }
 
             try {
-                // Load campaigns from API
+                // Load property settings + campaigns from API (single request)
                 await this.loadCampaigns();
 
+                if (this.popupEnabled === false) {
+                    this.debug(`Popup disabled for ${this.config.property}`);
+                    return;
+                }
+
+                // Property (and its frequency) may only be known after bootstrap
+                if (!this.shouldShowPopup()) {
+                    this.debug('Popup frequency check failed, not showing');
+                    return;
+                }
+
                 if (this.campaigns.length === 0) {
                     this.debug('No active campaigns found');
                     return;
@@ -80,45 +96,40 @@
         }
 
         /**
-         * Load active campaigns from API
+         * Load property settings and active campaigns from API in one round trip
          */
         async loadCampaigns() {
             try {
                 let propertyCode = (this.config.property || '').toLowerCase();
-                let response;
-
-                // Resolve property automatically via server if missing or set to 'auto'
-                if (!propertyCode || propertyCode === 'auto') {
-                    const host = window.location.hostname;
-                    try {
-                        const res = await fetch(`${CONFIG.API_BASE}/properties/resolve?host=${encodeURIComponent(host)}`);
-                        if (res.ok) {
-                            const info = await res.json();
-                            propertyCode = info.property_code || this.detectPropertyFromHostname(host) || 'mff';
-                        } else {
-                            propertyCode = this.detectPropertyFromHostname(host) || 'mff';
-                        }
-                    } catch (e) {
-                        propertyCode = this.detectPropertyFromHostname(host) || 'mff';
-                    }
-                    this.config.property = propertyCode;
-                }
 
-                // Choose endpoint: property-specific when property known, else by-host
-                if (propertyCode) {
-                    // Use property-specific endpoint for reliable property-based campaign serving
-                    response = await fetch(`${CONFIG.API_BASE}/campaigns/${encodeURIComponent(propertyCode)}`);
+                // Server resolves the property from the page host when missing or set to 'auto'
+                const params = new URLSearchParams();
+                if (propertyCode && propertyCode !== 'auto') {
+                    params.set('property', propertyCode);
                 } else {
-                    response = await fetch(`${CONFIG.API_BASE}/campaigns/by-host`);
+                    params.set('host', window.location.hostname);
                 }
+
+                // Simple GET (no custom headers) keeps it free of a CORS preflight
+                const response = await fetch(`${CONFIG.API_BASE}/popup/bootstrap?${params.toString()}`);
                 if (!response.ok) {
                     throw new Error(`HTTP ${response.status}: ${response.statusText}`);
                 }
-                
+
                 const data = await response.json();
-                // API may return wrapper or direct list depending on endpoint
-                const list = Array.isArray(data) ? data : (Array.isArray(data.campaigns) ? data.campaigns : []);
-                this.rawCampaigns = list || [];
+                const property = data.property || {};
+                this.config.property = property.code || this.detectPropertyFromHostname(window.location.hostname) || 'mff';
+                this.popupEnabled = property.popup_enabled !== false;
+                if (!this.explicitOptions || !this.explicitOptions.frequency) {
+                    this.config.frequency = property.popup_frequency || this.config.frequency;
+                }
+                if (!this.explicitOptions || !this.explicitOptions.placement) {
+                    this.config.placement = property.popup_placement || this.config.placement;
+                }
+                this.featuredCampaign = data.featured_campaign || null;
+
+                // Ranked server-side: featured first, then by visibility weight
+                this.rawCampaigns = Array.isArray(data.campaigns) ? data.campaigns : [];
 
                 if (this.config.brandTargeting) {
                     this.campaigns = this.buildWeightedCampaignList(this.rawCampaigns);